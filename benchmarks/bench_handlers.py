@@ -0,0 +1,329 @@
+"""
+Load test of the bot's request paths.
+
+Feeds synthetic updates into the update queue of an application built like the bot's (the
+handlers of main.py, PerUserUpdateProcessor and PostgresPersistence) against a local Postgres and
+reports p50/p95/p99 latency and updates/sec per scenario. A sample is the time from putting an
+update into the queue until the application finished processing it. Bot API calls are answered
+by an in-process fake, optionally after an artificial delay, so the numbers show the bot's own cost.
+
+Scenarios:
+    start_new        /start of users the bot has never seen (registration)
+    start_returning  /start of the same users again, while their request is pending
+    admin_pages      the admin opening the request list and paging through it
+    single_review    the "Одобрить"/"Отклонить" buttons of single requests, alternating
+    bulk_approve     /approve with batches of user IDs
+    start_approved   /start of approved users (user menu)
+
+The database settings come from the usual POSTGRES_* and USER_DB_NAME variables. Use a scratch
+database: the admin scenarios page through every pending request in it, and the admin's
+conversation state and user_data are reset. The benchmark users are taken from a dedicated ID
+range and deleted, with their persisted data, before and after the run. The updates of the admin
+are processed one after another, like in the bot, so the admin scenarios run one flow at a time.
+
+Usage:
+    python -m benchmarks.bench_handlers --users 2000 --pending 10000 --concurrency 32
+    python -m benchmarks.bench_handlers --json results.json   # keep results to compare runs
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable
+
+# Значения, обязательные для config.py, но не используемые обработчиками в бенчмарке
+for name, value in {
+    "BOT_TOKEN": "1:bench",
+    "ADMIN_CHAT_ID": "1",
+    "JELLYFIN_API_KEY": "bench",
+    "JELLYFIN_API_URL": "http://127.0.0.1:1",
+    "VIDEOS_DIR": "/tmp",
+}.items():
+    os.environ.setdefault(name, value)
+
+from telegram import Update  # noqa: E402
+from telegram.ext import Application, ContextTypes  # noqa: E402
+from telegram.request import BaseRequest, RequestData  # noqa: E402
+
+from config import ADMIN_CHAT_ID, PERSISTENCE_UPDATE_INTERVAL, USER_DB_CONFIG  # noqa: E402
+from main import add_handlers  # noqa: E402
+from services.migrations import migrate_database  # noqa: E402
+from services.persistence import PostgresPersistence  # noqa: E402
+from services.service_factory import ServiceFactory  # noqa: E402
+from services.update_processor import PerUserUpdateProcessor  # noqa: E402
+
+# Диапазон ID пользователей бенчмарка; реальные ID Telegram сюда не попадают
+USER_ID_BASE = 9_000_000_000_000
+
+
+class FakeBotRequest(BaseRequest):
+    def __init__(self, latency: float = 0.0):
+        """
+        Answers Bot API calls locally with minimal valid results.
+
+        Parameters:
+            latency (float): Seconds to wait before answering, to simulate the round trip to Telegram.
+        """
+        self.latency = latency
+        self.calls = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: RequestData | None = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None,
+                         pool_timeout=None) -> tuple[int, bytes]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        endpoint = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        if endpoint == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        elif endpoint in ("sendMessage", "editMessageText"):
+            result = {"message_id": 1, "date": int(time.time()), "text": params.get("text", ""),
+                      "chat": {"id": int(params.get("chat_id", 1)), "type": "private"}}
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+class TrackingUpdateProcessor(PerUserUpdateProcessor):
+    """PerUserUpdateProcessor that tells the benchmark when each update has been processed."""
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._done: dict[int, asyncio.Future] = {}
+
+    def expect(self, update_id: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._done[update_id] = future
+        return future
+
+    def fail(self, update: object, error: Exception) -> None:
+        future = self._done.get(update.update_id) if isinstance(update, Update) else None
+        if future is not None and not future.done():
+            future.set_exception(error)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        try:
+            await super().do_process_update(update, coroutine)
+        finally:
+            future = self._done.pop(update.update_id, None) if isinstance(update, Update) else None
+            if future is not None and not future.done():
+                future.set_result(None)
+
+
+@dataclass
+class ScenarioResult:
+    scenario: str
+    updates: int
+    concurrency: int
+    seconds: float
+    updates_per_second: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+class Session:
+    # update_id is unique per bot, not per user
+    _update_ids = itertools.count(1)
+
+    def __init__(self, app: Application, processor: TrackingUpdateProcessor, user_id: int):
+        self.app = app
+        self.processor = processor
+        self.user_id = user_id
+        self._message_id = 100
+
+    def _user(self) -> dict:
+        return {"id": self.user_id, "is_bot": False, "first_name": "bench"}
+
+    def _message(self, text: str, from_bot: bool = False) -> dict:
+        self._message_id += 1
+        message = {"message_id": self._message_id, "date": int(time.time()), "text": text,
+                   "chat": {"id": self.user_id, "type": "private"},
+                   "from": {"id": 1, "is_bot": True, "first_name": "bench"} if from_bot else self._user()}
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return message
+
+    async def _send(self, data: dict) -> None:
+        update_id = next(self._update_ids)
+        done = self.processor.expect(update_id)
+        await self.app.update_queue.put(Update.de_json({"update_id": update_id, **data}, self.app.bot))
+        await done
+
+    async def command(self, text: str) -> None:
+        await self._send({"message": self._message(text)})
+
+    async def callback(self, data: str) -> None:
+        await self._send({"callback_query": {
+            "id": str(self._message_id), "from": self._user(), "chat_instance": "bench", "data": data,
+            "message": self._message("Ожидающие заявки", from_bot=True),
+        }})
+
+
+Step = Callable[[], Awaitable[None]]
+
+
+async def run_scenario(name: str, flows: list[list[Step]], concurrency: int) -> ScenarioResult:
+    """
+    Run flows of updates with at most `concurrency` flows at a time.
+
+    The steps of one flow run one after another, like the updates of one user; every step is one
+    latency sample.
+    """
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_flow(flow: list[Step]) -> None:
+        async with semaphore:
+            for step in flow:
+                started = time.perf_counter()
+                await step()
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_flow(flow) for flow in flows))
+    seconds = time.perf_counter() - started
+
+    ms = sorted(latency * 1000 for latency in latencies)
+    cuts = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else ms * 99
+    return ScenarioResult(
+        scenario=name, updates=len(ms), concurrency=concurrency, seconds=round(seconds, 3),
+        updates_per_second=round(len(ms) / seconds, 1),
+        p50_ms=round(cuts[49], 2), p95_ms=round(cuts[94], 2), p99_ms=round(cuts[98], 2),
+        max_ms=round(ms[-1], 2),
+    )
+
+
+async def cleanup(first_id: int, last_id: int) -> None:
+    user_service = ServiceFactory.get_async_user_service(USER_DB_CONFIG, ADMIN_CHAT_ID)
+    async with user_service.get_connection("bench_cleanup") as conn:
+        async with conn.transaction():
+            await conn.execute("DELETE FROM users_hist WHERE user_id BETWEEN $1 AND $2", first_id, last_id)
+            await conn.execute("DELETE FROM users WHERE user_id BETWEEN $1 AND $2", first_id, last_id)
+            await conn.execute(
+                "DELETE FROM bot_user_data WHERE user_id BETWEEN $1 AND $2 OR user_id = $3",
+                first_id, last_id, ADMIN_CHAT_ID)
+            await conn.execute(
+                "DELETE FROM bot_conversations WHERE key[1] BETWEEN $1 AND $2 OR key[1] = $3",
+                first_id, last_id, ADMIN_CHAT_ID)
+    user_service.status_cache.clear()
+
+
+async def seed_pending(first_id: int, count: int) -> list[int]:
+    user_service = ServiceFactory.get_async_user_service(USER_DB_CONFIG, ADMIN_CHAT_ID)
+    async with user_service.get_connection("bench_seed") as conn:
+        await conn.execute(
+            """
+            INSERT INTO users (user_id, approved, pending, row_added_timestamp)
+            SELECT id, FALSE, TRUE, CURRENT_TIMESTAMP - make_interval(secs => $2 - (id - $1))
+            FROM generate_series($1::bigint, $1::bigint + $2 - 1) AS id
+            """,
+            first_id, count
+        )
+    return list(range(first_id, first_id + count))
+
+
+async def main(args: argparse.Namespace) -> list[ScenarioResult]:
+    user_service = ServiceFactory.get_async_user_service(USER_DB_CONFIG, ADMIN_CHAT_ID)
+    await migrate_database(USER_DB_CONFIG)
+
+    users = [USER_ID_BASE + i for i in range(args.users)]
+    pending_base = USER_ID_BASE + args.users
+    last_id = pending_base + args.pending
+    # До initialize: persistence загружает состояния диалогов при запуске
+    await cleanup(USER_ID_BASE, last_id)
+
+    processor = TrackingUpdateProcessor(args.concurrency)
+    app = (
+        Application.builder()
+        .token(os.environ["BOT_TOKEN"])
+        .request(FakeBotRequest(args.bot_latency / 1000))
+        .get_updates_request(FakeBotRequest())
+        .concurrent_updates(processor)
+        .persistence(PostgresPersistence(USER_DB_CONFIG, PERSISTENCE_UPDATE_INTERVAL))
+        .build()
+    )
+    add_handlers(app)
+
+    async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+        processor.fail(update, context.error)
+
+    app.add_error_handler(on_error)
+
+    results = []
+    try:
+        await app.initialize()
+        await app.start()
+        try:
+            sessions = [Session(app, processor, user_id) for user_id in users]
+            start_flows = [[lambda s=s: s.command("/start")] for s in sessions]
+            results.append(await run_scenario("start_new", start_flows, args.concurrency))
+            results.append(await run_scenario("start_returning", start_flows, args.concurrency))
+
+            pending = await seed_pending(pending_base, args.pending)
+            admin = Session(app, processor, ADMIN_CHAT_ID)
+            page_flow = ([lambda: admin.command("/list_requests")]
+                         + [lambda: admin.callback("admin:next_page")] * args.pages)
+            results.append(await run_scenario("admin_pages", [page_flow], 1))
+
+            # Диалог админа остаётся в состоянии списка заявок, кнопки обрабатывает он же
+            reviewed, pending = pending[:args.single], pending[args.single:]
+            review_flow = [
+                lambda data=f"admin:{'approve' if i % 2 else 'reject'}:{user_id}": admin.callback(data)
+                for i, user_id in enumerate(reviewed)
+            ]
+            results.append(await run_scenario("single_review", [review_flow], 1))
+
+            batches = [pending[i:i + args.batch] for i in range(0, len(pending), args.batch)] + [users]
+            approve_flow = [lambda batch=batch: admin.command("/approve " + " ".join(map(str, batch)))
+                            for batch in batches]
+            results.append(await run_scenario("bulk_approve", [approve_flow], 1))
+            results.append(await run_scenario("start_approved", start_flows, args.concurrency))
+        finally:
+            await app.stop()
+    finally:
+        # shutdown записывает накопленные persistence изменения, поэтому очистка после него
+        await app.shutdown()
+        await cleanup(USER_ID_BASE, last_id)
+        await user_service.close()
+    return results
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=2000, help="users sending /start")
+    parser.add_argument("--pending", type=int, default=10000, help="pending requests for the admin scenarios")
+    parser.add_argument("--concurrency", type=int, default=32, help="updates processed at the same time")
+    parser.add_argument("--pages", type=int, default=100, help="pages the admin turns")
+    parser.add_argument("--single", type=int, default=200, help="requests approved or rejected one by one")
+    parser.add_argument("--batch", type=int, default=100, help="user IDs per /approve command")
+    parser.add_argument("--bot-latency", type=float, default=0.0, help="simulated Bot API latency, ms")
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    scenario_results = asyncio.run(main(arguments))
+
+    header = f"{'scenario':<16}{'updates':>9}{'conc':>6}{'upd/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in scenario_results:
+        print(f"{r.scenario:<16}{r.updates:>9}{r.concurrency:>6}{r.updates_per_second:>10}"
+              f"{r.p50_ms:>10}{r.p95_ms:>10}{r.p99_ms:>10}{r.max_ms:>10}")
+    if arguments.json:
+        with open(arguments.json, "w") as f:
+            json.dump({"args": vars(arguments), "results": [asdict(r) for r in scenario_results]}, f, indent=2)
@@ -0,0 +1,241 @@
+"""
+End-to-end throughput of the link -> download -> Jellyfin refresh -> notification path.
+
+Starts the fake Telegram, media and Jellyfin servers (benchmarks/fake_servers.py), runs the bot
+(main.py) and the download workers (worker.py, wrapped by benchmarks/bench_worker.py to fetch from
+the fake media server) as subprocesses pointed at them, and lets synthetic users register, get
+approved and send one link each. Reports links/sec, download MB/s and the latency from sending a
+link to the "download finished" message.
+
+The database settings come from the usual POSTGRES_* and USER_DB_NAME variables; use a scratch
+database. Every run downloads new random video IDs, and its users are deleted afterwards.
+
+Usage:
+    python -m benchmarks.bench_pipeline --users 50 --workers 2 --media-size-mb 5 --latency-ms 30
+
+Faults (--rate-limit-rate, --error-rate) are injected only while the links are processed; links
+that fail because of them are left out of the latency figures.
+"""
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+for name, value in {
+    "BOT_TOKEN": "1:bench",
+    "ADMIN_CHAT_ID": "1",
+    "JELLYFIN_API_KEY": "bench",
+    "JELLYFIN_API_URL": "http://127.0.0.1:1",
+    "VIDEOS_DIR": "/tmp",
+}.items():
+    os.environ.setdefault(name, value)
+
+from benchmarks.fake_servers import (FakeJellyfinServer, FakeMediaServer,  # noqa: E402
+                                     FakeTelegramServer, FaultConfig,
+                                     add_fault_arguments, fault_config)
+from config import ADMIN_CHAT_ID, USER_DB_CONFIG  # noqa: E402
+from services.service_factory import ServiceFactory  # noqa: E402
+
+USER_ID_BASE = 9_100_000_000_000
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FINISHED_PREFIX = "Загрузка завершена"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": "bench"}
+
+
+def message(user_id: int, text: str, message_id: int = 1) -> dict:
+    payload = {"message_id": message_id, "date": int(time.time()), "text": text,
+               "chat": {"id": user_id, "type": "private"}, "from": user(user_id)}
+    if text.startswith("/"):
+        payload["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"message": payload}
+
+
+def callback(user_id: int, data: str) -> dict:
+    return {"callback_query": {
+        "id": secrets.token_hex(4), "from": user(user_id), "chat_instance": "bench", "data": data,
+        "message": {"message_id": 1, "date": int(time.time()), "text": "menu",
+                    "chat": {"id": user_id, "type": "private"}},
+    }}
+
+
+def video_id() -> str:
+    return secrets.token_urlsafe(8)[:11].ljust(11, "A")
+
+
+def wait_for(condition, timeout: float, what: str) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Timed out after {timeout}s waiting for {what}")
+        time.sleep(0.2)
+
+
+def wait_healthy(port: int, timeout: float) -> None:
+    def healthy():
+        try:
+            return urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=1).status == 200
+        except OSError:
+            return False
+    wait_for(healthy, timeout, f"the process with metrics port {port}")
+
+
+def messages_to(telegram: FakeTelegramServer, chat_ids: set[int], prefix: str = "") -> dict[int, float]:
+    first = {}
+    for sent in telegram.stats()["messages"]:
+        if sent["method"] == "sendMessage" and sent["chat_id"] in chat_ids and sent["text"].startswith(prefix):
+            first.setdefault(sent["chat_id"], sent["time"])
+    return first
+
+
+async def cleanup(first_id: int, last_id: int, video_ids: list[str]) -> None:
+    user_service = ServiceFactory.get_async_user_service(USER_DB_CONFIG, ADMIN_CHAT_ID)
+    try:
+        async with user_service.get_connection("bench_cleanup") as conn:
+            async with conn.transaction():
+                await conn.execute("DELETE FROM users_hist WHERE user_id BETWEEN $1 AND $2", first_id, last_id)
+                await conn.execute("DELETE FROM users WHERE user_id BETWEEN $1 AND $2", first_id, last_id)
+                await conn.execute("DELETE FROM bot_user_data WHERE user_id BETWEEN $1 AND $2", first_id, last_id)
+                await conn.execute("DELETE FROM bot_conversations WHERE key[1] BETWEEN $1 AND $2", first_id, last_id)
+                await conn.execute("DELETE FROM download_jobs WHERE video_id = ANY($1::text[])", video_ids)
+    finally:
+        await user_service.close()
+
+
+def run(args: argparse.Namespace) -> dict:
+    # Сбои имитируются только на измеряемом этапе, подготовка идёт без них
+    no_faults = FaultConfig()
+    media_size = int(args.media_size_mb * 1024 ** 2)
+    telegram = FakeTelegramServer(0, no_faults).start()
+    media = FakeMediaServer(0, no_faults, media_size, args.bandwidth_mbps * 1024 ** 2).start()
+    jellyfin = FakeJellyfinServer(0, no_faults).start()
+    videos_dir = tempfile.mkdtemp(prefix="bench-videos-")
+
+    env = {
+        **os.environ,
+        "BOT_MODE": "polling",
+        "TELEGRAM_BASE_URL": f"{telegram.url}/bot",
+        "BENCH_MEDIA_URL": media.url,
+        "JELLYFIN_API_URL": jellyfin.url,
+        "JELLYFIN_API_MEDIA_ID": "",
+        "JELLYFIN_REFRESH_DELAY": str(args.refresh_delay),
+        "VIDEOS_DIR": videos_dir,
+        "DOWNLOAD_WORKERS": str(args.slots),
+        "DOWNLOAD_MIN_FREE_SPACE_MB": "0",
+        "DOWNLOAD_POLL_INTERVAL": "1",
+        "PYTHONPATH": ROOT,
+    }
+    processes = []
+    users = [USER_ID_BASE + i for i in range(args.users)]
+    videos = [video_id() for _ in users]
+    try:
+        bot_port = free_port()
+        processes.append(subprocess.Popen([sys.executable, "main.py"], cwd=ROOT,
+                                          env={**env, "METRICS_PORT": str(bot_port)}))
+        ports = [bot_port]
+        for _ in range(args.workers):
+            ports.append(free_port())
+            processes.append(subprocess.Popen([sys.executable, "-m", "benchmarks.bench_worker"], cwd=ROOT,
+                                              env={**env, "METRICS_PORT": str(ports[-1])}))
+        for port in ports:
+            wait_healthy(port, args.timeout)
+
+        chats = set(users)
+        # Регистрация, одобрение администратором и открытие меню — вне измерения
+        telegram.queue_updates([message(u, "/start") for u in users])
+        wait_for(lambda: len(messages_to(telegram, chats)) == len(users), args.timeout, "registrations")
+        telegram.queue_updates([message(ADMIN_CHAT_ID, "/approve " + " ".join(map(str, users)))])
+        wait_for(lambda: messages_to(telegram, {ADMIN_CHAT_ID}, "Одобрено"), args.timeout, "the approval")
+        telegram.reset()
+        telegram.queue_updates([u for user_id in users for u in (message(user_id, "/start"),
+                                                                 callback(user_id, "user:download"))])
+        wait_for(lambda: len(messages_to(telegram, chats, "Что вы хотите")) == len(users), args.timeout, "menus")
+
+        for server in (telegram, media, jellyfin):
+            server.faults = fault_config(args)
+        sent_at = time.time()
+        telegram.queue_updates([message(u, f"https://youtu.be/{v}", 2) for u, v in zip(users, videos)])
+        try:
+            wait_for(lambda: len(messages_to(telegram, chats, FINISHED_PREFIX)) == len(users), args.timeout,
+                     "finished downloads")
+        except TimeoutError as e:
+            # С имитацией ошибок часть ссылок может не дойти до конца — считаем по завершённым
+            print(e, file=sys.stderr)
+        finished = messages_to(telegram, chats, FINISHED_PREFIX)
+        if not finished:
+            raise RuntimeError("No download finished")
+        seconds = max(finished.values()) - sent_at
+        # Отложенное обновление библиотеки Jellyfin после последней загрузки
+        try:
+            wait_for(lambda: jellyfin.refreshes > 0, args.refresh_delay + 10, "a Jellyfin refresh")
+        except TimeoutError as e:
+            print(e, file=sys.stderr)
+
+        latencies = sorted((t - sent_at) * 1000 for t in finished.values())
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+        stats = telegram.stats()
+        return {
+            "links": len(users),
+            "finished": len(finished),
+            "workers": args.workers,
+            "slots_per_worker": args.slots,
+            "seconds": round(seconds, 3),
+            "links_per_second": round(len(finished) / seconds, 2),
+            "download_mb_per_second": round(len(finished) * media_size / 1024 ** 2 / seconds, 1),
+            "p50_ms": round(cuts[49], 1),
+            "p95_ms": round(cuts[94], 1),
+            "p99_ms": round(cuts[98], 1),
+            "telegram_calls": sum(stats["calls"].values()),
+            "telegram_faults": stats["faults"],
+            "media_downloads": media.downloads,
+            "jellyfin_refreshes": jellyfin.refreshes,
+        }
+    finally:
+        for process in processes:
+            process.send_signal(signal.SIGTERM)
+        for process in processes:
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        asyncio.run(cleanup(USER_ID_BASE, USER_ID_BASE + args.users, videos))
+        shutil.rmtree(videos_dir, ignore_errors=True)
+        for server in (telegram, media, jellyfin):
+            server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=50, help="users sending one link each")
+    parser.add_argument("--workers", type=int, default=2, help="download worker processes")
+    parser.add_argument("--slots", type=int, default=2, help="DOWNLOAD_WORKERS of every worker process")
+    parser.add_argument("--refresh-delay", type=float, default=1.0, help="JELLYFIN_REFRESH_DELAY, s")
+    parser.add_argument("--timeout", type=float, default=120.0, help="limit for every phase, s")
+    parser.add_argument("--json", help="also write the results to this file")
+    add_fault_arguments(parser)
+    arguments = parser.parse_args()
+
+    result = run(arguments)
+    for key, value in result.items():
+        print(f"{key:<24}{value}")
+    if arguments.json:
+        with open(arguments.json, "w") as f:
+            json.dump({"args": vars(arguments), "result": result}, f, indent=2)
@@ -0,0 +1,28 @@
+"""
+Download worker (worker.py) that fetches videos from the fake media server instead of YouTube.
+
+The jobs keep their canonical YouTube URLs; only the URL yt-dlp downloads from is replaced by
+<BENCH_MEDIA_URL>/videos/<video_id>.mp4 (see benchmarks/fake_servers.py). All other settings come
+from the usual environment variables of worker.py.
+
+Usage:
+    BENCH_MEDIA_URL=http://127.0.0.1:8082 python -m benchmarks.bench_worker
+"""
+import os
+
+import worker
+from config import DOWNLOAD_CONFIG, JELLYFIN_CONFIG, USER_DB_CONFIG
+from services.download_job_service import DownloadJob
+from services.service_factory import ServiceFactory
+
+MEDIA_URL = os.environ["BENCH_MEDIA_URL"].rstrip("/")
+
+
+def media_url(job: DownloadJob) -> str:
+    return f"{MEDIA_URL}/videos/{job.video_id}.mp4" if job.video_id else job.url
+
+
+if __name__ == "__main__":
+    # worker.py takes the download service from the factory and gets this instance
+    ServiceFactory.get_download_service(DOWNLOAD_CONFIG, USER_DB_CONFIG, JELLYFIN_CONFIG, media_url)
+    worker.main()
@@ -0,0 +1,367 @@
+"""
+Local stand-ins for the Telegram Bot API, YouTube media and Jellyfin.
+
+Point the bot and the workers at them to exercise the whole link -> download -> refresh ->
+notify path without network access; run the workers as benchmarks/bench_worker.py:
+
+    TELEGRAM_BASE_URL=http://127.0.0.1:8081/bot
+    BENCH_MEDIA_URL=http://127.0.0.1:8082
+    JELLYFIN_API_URL=http://127.0.0.1:8096
+
+Every server takes a FaultConfig: a fixed latency added to each request, and the share of
+requests answered with 429 Too Many Requests or a server error. Only calls the bot makes while
+processing updates are subject to faults; getMe, getUpdates and webhook setup always succeed.
+
+The fake Telegram serves updates queued through POST /fake/updates to getUpdates and records
+every other call; GET /fake/stats returns per-method counts and the messages sent. The fake
+media server answers /videos/<id>.mp4 with a fixed-size payload, optionally throttled. The fake
+Jellyfin reports an idle library scan and counts refresh requests.
+
+Usage:
+    python -m benchmarks.fake_servers --latency-ms 50 --rate-limit-rate 0.02 --media-size-mb 5
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Методы, которые бот вызывает при запуске и при получении обновлений; сбои для них не имитируются
+TELEGRAM_CONTROL_METHODS = {"getMe", "getUpdates", "setWebhook", "deleteWebhook", "getWebhookInfo", "close", "logOut"}
+
+
+@dataclass
+class FaultConfig:
+    latency: float = 0.0
+    rate_limit_rate: float = 0.0
+    error_rate: float = 0.0
+    retry_after: int = 1
+
+
+class FakeServer:
+    def __init__(self, port: int, faults: FaultConfig, host: str = "127.0.0.1"):
+        """
+        HTTP server running in a daemon thread; subclasses implement handle().
+
+        Parameters:
+            port (int): Port to listen on; 0 picks a free one.
+            faults (FaultConfig): Latency and fault injection applied by inject_fault().
+            host (str): Address to listen on.
+        """
+        self.faults = faults
+        self.lock = threading.Lock()
+        self._random = random.Random(0)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.handle(self, "GET")
+
+            def do_HEAD(self):
+                server.handle(self, "HEAD")
+
+            def do_POST(self):
+                server.handle(self, "POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.url = f"http://{host}:{self.port}"
+
+    def start(self) -> "FakeServer":
+        threading.Thread(target=self.httpd.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def handle(self, request: BaseHTTPRequestHandler, method: str) -> None:
+        raise NotImplementedError
+
+    def inject_fault(self) -> str | None:
+        """
+        Sleep for the configured latency and pick the fault for this request.
+
+        Returns:
+            str | None: "rate_limit", "error" or None for a normal answer.
+        """
+        if self.faults.latency:
+            time.sleep(self.faults.latency)
+        with self.lock:
+            roll = self._random.random()
+        if roll < self.faults.rate_limit_rate:
+            return "rate_limit"
+        if roll < self.faults.rate_limit_rate + self.faults.error_rate:
+            return "error"
+        return None
+
+    @staticmethod
+    def read_body(request: BaseHTTPRequestHandler) -> bytes:
+        return request.rfile.read(int(request.headers.get("Content-Length") or 0))
+
+    @staticmethod
+    def send(request: BaseHTTPRequestHandler, status: int, body: bytes = b"",
+             content_type: str = "application/json", headers: dict | None = None) -> None:
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(body)
+
+    def send_json(self, request: BaseHTTPRequestHandler, status: int, payload) -> None:
+        self.send(request, status, json.dumps(payload).encode())
+
+
+class FakeTelegramServer(FakeServer):
+    def __init__(self, port: int, faults: FaultConfig, host: str = "127.0.0.1"):
+        """
+        Fake Bot API under /bot<token>/<method>, plus a control API under /fake.
+
+        Control API:
+            POST /fake/updates  JSON list of Update objects without update_id, served by getUpdates
+            GET  /fake/stats    {"calls": {method: count}, "faults": {kind: count}, "messages": [...]}
+            POST /fake/reset    forget recorded calls and messages
+        """
+        super().__init__(port, faults, host)
+        self.updates: list[dict] = []
+        self.calls: dict[str, int] = {}
+        self.fault_counts: dict[str, int] = {}
+        self.messages: list[dict] = []
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self._updates_ready = threading.Condition(self.lock)
+
+    def queue_updates(self, updates: list[dict]) -> None:
+        """
+        Queue updates for getUpdates; update IDs are assigned in order.
+        """
+        with self._updates_ready:
+            for update in updates:
+                self.updates.append({**update, "update_id": self._next_update_id})
+                self._next_update_id += 1
+            self._updates_ready.notify_all()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"calls": dict(self.calls), "faults": dict(self.fault_counts), "messages": list(self.messages)}
+
+    def reset(self) -> None:
+        with self.lock:
+            self.calls.clear()
+            self.fault_counts.clear()
+            self.messages.clear()
+
+    @staticmethod
+    def _parameters(request: BaseHTTPRequestHandler, body: bytes) -> dict:
+        content_type = request.headers.get("Content-Type", "")
+        if content_type.startswith("application/json"):
+            return json.loads(body or b"{}")
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return {key: values[-1] for key, values in parse_qs(body.decode()).items()}
+        # multipart/form-data, as sent by python-telegram-bot
+        params = {}
+        for name, value in re.findall(rb'name="([^"]+)"\r\n(?:[^\r\n]+\r\n)*\r\n(.*?)\r\n--', body, re.S):
+            params[name.decode()] = value.decode()
+        return params
+
+    def handle(self, request: BaseHTTPRequestHandler, method: str) -> None:
+        path = urlparse(request.path).path
+        body = self.read_body(request) if method == "POST" else b""
+        if path.startswith("/fake/"):
+            self._handle_control(request, path, body)
+            return
+
+        endpoint = path.rsplit("/", 1)[-1]
+        params = self._parameters(request, body)
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+        if endpoint == "getUpdates":
+            self.send_json(request, 200, {"ok": True, "result": self._get_updates(params)})
+            return
+        if endpoint not in TELEGRAM_CONTROL_METHODS:
+            fault = self.inject_fault()
+            if fault is not None:
+                with self.lock:
+                    self.fault_counts[fault] = self.fault_counts.get(fault, 0) + 1
+                if fault == "rate_limit":
+                    self.send_json(request, 429, {
+                        "ok": False, "error_code": 429,
+                        "description": f"Too Many Requests: retry after {self.faults.retry_after}",
+                        "parameters": {"retry_after": self.faults.retry_after},
+                    })
+                else:
+                    self.send_json(request, 500, {"ok": False, "error_code": 500,
+                                                  "description": "Internal Server Error"})
+                return
+        self.send_json(request, 200, {"ok": True, "result": self._result(endpoint, params)})
+
+    def _get_updates(self, params: dict) -> list[dict]:
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        deadline = time.monotonic() + timeout
+        with self._updates_ready:
+            # Подтверждённые обновления больше не нужны
+            self.updates = [u for u in self.updates if u["update_id"] >= offset]
+            while not self.updates and (remaining := deadline - time.monotonic()) > 0:
+                self._updates_ready.wait(remaining)
+            return self.updates[:int(params.get("limit") or 100)]
+
+    def _result(self, endpoint: str, params: dict):
+        if endpoint == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "fake", "username": "fake_bot"}
+        if endpoint in ("sendMessage", "editMessageText"):
+            chat_id = int(params.get("chat_id") or 0)
+            with self.lock:
+                message_id = int(params.get("message_id") or self._next_message_id)
+                self._next_message_id += endpoint == "sendMessage"
+                self.messages.append({"method": endpoint, "chat_id": chat_id, "text": params.get("text", ""),
+                                      "time": time.time()})
+            return {"message_id": message_id, "date": int(time.time()), "text": params.get("text", ""),
+                    "chat": {"id": chat_id, "type": "private"}}
+        if endpoint == "getWebhookInfo":
+            return {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        return True
+
+    def _handle_control(self, request: BaseHTTPRequestHandler, path: str, body: bytes) -> None:
+        if path == "/fake/updates":
+            self.queue_updates(json.loads(body or b"[]"))
+            self.send_json(request, 200, {"ok": True})
+        elif path == "/fake/stats":
+            self.send_json(request, 200, self.stats())
+        elif path == "/fake/reset":
+            self.reset()
+            self.send_json(request, 200, {"ok": True})
+        else:
+            self.send_json(request, 404, {"ok": False})
+
+
+class FakeMediaServer(FakeServer):
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, port: int, faults: FaultConfig, media_size: int, bandwidth: float = 0.0,
+                 host: str = "127.0.0.1"):
+        """
+        Serves /videos/<video_id>.mp4 as a payload of `media_size` bytes.
+
+        Parameters:
+            media_size (int): Size of every video in bytes.
+            bandwidth (float): Bytes per second per download; 0 sends as fast as possible.
+        """
+        super().__init__(port, faults, host)
+        self.media_size = media_size
+        self.bandwidth = bandwidth
+        self.downloads = 0
+        self._chunk = bytes(range(256)) * (self.CHUNK_SIZE // 256)
+
+    def handle(self, request: BaseHTTPRequestHandler, method: str) -> None:
+        path = urlparse(request.path).path
+        if not re.fullmatch(r"/videos/[A-Za-z0-9_-]{11}\.mp4", path):
+            self.send(request, 404, b"not found", "text/plain")
+            return
+        fault = self.inject_fault()
+        if fault == "rate_limit":
+            self.send(request, 429, b"too many requests", "text/plain",
+                      {"Retry-After": str(self.faults.retry_after)})
+            return
+        if fault == "error":
+            self.send(request, 503, b"unavailable", "text/plain")
+            return
+
+        request.send_response(200)
+        request.send_header("Content-Type", "video/mp4")
+        request.send_header("Content-Length", str(self.media_size))
+        request.end_headers()
+        if method == "HEAD":
+            return
+        remaining = self.media_size
+        started = time.monotonic()
+        try:
+            while remaining > 0:
+                chunk = self._chunk[:min(remaining, self.CHUNK_SIZE)]
+                request.wfile.write(chunk)
+                remaining -= len(chunk)
+                if self.bandwidth:
+                    ahead = (self.media_size - remaining) / self.bandwidth - (time.monotonic() - started)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            # yt-dlp читает только начало файла, определяя его тип, и закрывает соединение
+            return
+        with self.lock:
+            self.downloads += 1
+
+
+class FakeJellyfinServer(FakeServer):
+    def __init__(self, port: int, faults: FaultConfig, host: str = "127.0.0.1"):
+        """
+        Answers the Jellyfin calls of JellyfinService: the scheduled task list and library refreshes.
+        """
+        super().__init__(port, faults, host)
+        self.refreshes = 0
+
+    def handle(self, request: BaseHTTPRequestHandler, method: str) -> None:
+        path = urlparse(request.path).path
+        if method == "POST":
+            self.read_body(request)
+        fault = self.inject_fault()
+        if fault is not None:
+            self.send(request, 429 if fault == "rate_limit" else 500, b"", "text/plain")
+            return
+        if method == "GET" and path == "/ScheduledTasks":
+            self.send_json(request, 200, [{"Key": "RefreshLibrary", "Name": "Scan Media Library", "State": "Idle"}])
+        elif method == "POST" and (path == "/Library/Refresh" or re.fullmatch(r"/Items/[^/]+/Refresh", path)):
+            with self.lock:
+                self.refreshes += 1
+            self.send(request, 204)
+        else:
+            self.send(request, 404, b"", "text/plain")
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every request")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 5xx")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after of injected 429 answers, s")
+    parser.add_argument("--media-size-mb", type=float, default=5.0, help="size of every fake video")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0, help="per-download throttle, MB/s; 0 = none")
+
+
+def fault_config(args: argparse.Namespace) -> FaultConfig:
+    return FaultConfig(latency=args.latency_ms / 1000, rate_limit_rate=args.rate_limit_rate,
+                       error_rate=args.error_rate, retry_after=args.retry_after)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--telegram-port", type=int, default=8081)
+    parser.add_argument("--media-port", type=int, default=8082)
+    parser.add_argument("--jellyfin-port", type=int, default=8096)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    faults = fault_config(args)
+    telegram = FakeTelegramServer(args.telegram_port, faults, args.host).start()
+    media = FakeMediaServer(args.media_port, faults, int(args.media_size_mb * 1024 ** 2),
+                            args.bandwidth_mbps * 1024 ** 2, args.host).start()
+    jellyfin = FakeJellyfinServer(args.jellyfin_port, faults, args.host).start()
+    print(f"TELEGRAM_BASE_URL={telegram.url}/bot")
+    print(f"BENCH_MEDIA_URL={media.url}")
+    print(f"JELLYFIN_API_URL={jellyfin.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
@@ -1,15 +1,117 @@
 import os
 
 from services.db import DBConfig
+from services.direct_play import DirectPlayProfile
+from services.download_service import DownloadConfig
+from services.history_retention import HistoryRetentionConfig
+from services.jellyfin_service import JellyfinConfig
+from services.metrics import MetricsConfig
+from services.subscription_scheduler import SubscriptionConfig
+from services.telegram_sender import TelegramConfig
 
 BOT_TOKEN = os.environ["BOT_TOKEN"]
 ADMIN_CHAT_ID = int(os.environ["ADMIN_CHAT_ID"])
 JELLYFIN_API_KEY = os.environ["JELLYFIN_API_KEY"]
 
+# "polling" (по умолчанию) или "webhook"
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET_TOKEN = os.environ.get("WEBHOOK_SECRET_TOKEN", "")
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# Сколько обновлений разных пользователей обрабатывается одновременно
+MAX_CONCURRENT_UPDATES = int(os.environ.get("MAX_CONCURRENT_UPDATES", "16"))
+
+# Как часто (в секундах) состояние диалогов и user_data сохраняется в базу
+PERSISTENCE_UPDATE_INTERVAL = float(os.environ.get("PERSISTENCE_UPDATE_INTERVAL", "30"))
+
 USER_DB_CONFIG = DBConfig(
     host=os.environ["POSTGRES_HOST"],
     port=int(os.environ["POSTGRES_PORT"]),
     user=os.environ["POSTGRES_USER"],
     password=os.environ["POSTGRES_PASSWORD"],
     database=os.environ["USER_DB_NAME"],
+    pool_min_size=int(os.environ.get("POSTGRES_POOL_MIN_SIZE", "1")),
+    pool_max_size=int(os.environ.get("POSTGRES_POOL_MAX_SIZE", "10")),
+    pool_timeout=float(os.environ.get("POSTGRES_POOL_TIMEOUT", "30")),
+    pool_health_check_interval=float(os.environ.get("POSTGRES_POOL_HEALTH_CHECK_INTERVAL", "30")),
+    status_cache_size=int(os.environ.get("USER_STATUS_CACHE_SIZE", "1024")),
+    status_cache_ttl=float(os.environ.get("USER_STATUS_CACHE_TTL", "60")),
+)
+
+
+def _codec_list(name: str, default: str) -> tuple[str, ...]:
+    return tuple(c.strip() for c in os.environ.get(name, default).split(",") if c.strip())
+
+
+DOWNLOAD_CONFIG = DownloadConfig(
+    videos_dir=os.environ["VIDEOS_DIR"],
+    video_format=os.environ.get("DOWNLOAD_VIDEO_FORMAT") or None,
+    # Кодеки, которые клиенты Jellyfin воспроизводят без перекодирования; пусто — без предпочтений
+    direct_play=DirectPlayProfile(
+        video_codecs=_codec_list("DOWNLOAD_DIRECT_PLAY_VIDEO_CODECS", "avc1"),
+        audio_codecs=_codec_list("DOWNLOAD_DIRECT_PLAY_AUDIO_CODECS", "mp4a"),
+        container=os.environ.get("DOWNLOAD_DIRECT_PLAY_CONTAINER", "mp4"),
+    ),
+    remux_workers=int(os.environ.get("DOWNLOAD_REMUX_WORKERS", "1")),
+    max_workers=int(os.environ.get("DOWNLOAD_WORKERS", "2")),
+    poll_interval=float(os.environ.get("DOWNLOAD_POLL_INTERVAL", "30")),
+    heartbeat_interval=float(os.environ.get("DOWNLOAD_HEARTBEAT_INTERVAL", "30")),
+    stale_timeout=float(os.environ.get("DOWNLOAD_STALE_TIMEOUT", "300")),
+    max_attempts=int(os.environ.get("DOWNLOAD_MAX_ATTEMPTS", "3")),
+    progress_interval=float(os.environ.get("DOWNLOAD_PROGRESS_INTERVAL", "3")),
+    collection_max_entries=int(os.environ.get("DOWNLOAD_COLLECTION_MAX_ENTRIES", "1000")),
+    min_free_space=int(os.environ.get("DOWNLOAD_MIN_FREE_SPACE_MB", "10240")) * 1024 ** 2,
+    disk_wait_timeout=float(os.environ.get("DOWNLOAD_DISK_WAIT_TIMEOUT", "3600")),
+    disk_check_interval=float(os.environ.get("DOWNLOAD_DISK_CHECK_INTERVAL", "60")),
+    unknown_size=int(os.environ.get("DOWNLOAD_UNKNOWN_SIZE_MB", "2048")) * 1024 ** 2,
+)
+
+JELLYFIN_CONFIG = JellyfinConfig(
+    api_url=os.environ["JELLYFIN_API_URL"],
+    api_key=JELLYFIN_API_KEY,
+    media_id=os.environ.get("JELLYFIN_API_MEDIA_ID", ""),
+    refresh_delay=float(os.environ.get("JELLYFIN_REFRESH_DELAY", "30")),
+)
+
+USERS_HIST_CONFIG = HistoryRetentionConfig(
+    # Сколько дней хранить историю статусов; 0 — хранить всё. Удаляются целые месяцы
+    retention_days=int(os.environ.get("USERS_HIST_RETENTION_DAYS", "0")),
+    # Схема, куда переносятся устаревшие секции вместо удаления; пусто — удалять
+    archive_schema=os.environ.get("USERS_HIST_ARCHIVE_SCHEMA") or None,
+    premake_months=int(os.environ.get("USERS_HIST_PREMAKE_MONTHS", "2")),
+    interval=float(os.environ.get("USERS_HIST_MAINTENANCE_INTERVAL", "86400")),
+)
+
+SUBSCRIPTION_CONFIG = SubscriptionConfig(
+    # Значения по умолчанию для новых подписок; интервалы в секундах
+    check_interval=float(os.environ.get("SUBSCRIPTION_CHECK_INTERVAL", "3600")),
+    min_check_interval=float(os.environ.get("SUBSCRIPTION_MIN_CHECK_INTERVAL", "600")),
+    max_downloads=int(os.environ.get("SUBSCRIPTION_MAX_DOWNLOADS", "2")),
+    scheduler_interval=float(os.environ.get("SUBSCRIPTION_SCHEDULER_INTERVAL", "60")),
+    max_checks_per_run=int(os.environ.get("SUBSCRIPTION_MAX_CHECKS_PER_RUN", "20")),
+    stagger=float(os.environ.get("SUBSCRIPTION_STAGGER", "5")),
+    check_concurrency=int(os.environ.get("SUBSCRIPTION_CHECK_CONCURRENCY", "2")),
+    max_entries=int(os.environ.get("SUBSCRIPTION_MAX_ENTRIES", "50")),
+    backlog_check_interval=float(os.environ.get("SUBSCRIPTION_BACKLOG_CHECK_INTERVAL", "600")),
+)
+
+TELEGRAM_CONFIG = TelegramConfig(
+    base_url=os.environ.get("TELEGRAM_BASE_URL", "https://api.telegram.org/bot"),
+    connection_pool_size=int(os.environ.get("TELEGRAM_CONNECTION_POOL_SIZE", "16")),
+    global_rate=float(os.environ.get("TELEGRAM_GLOBAL_RATE", "30")),
+    chat_rate=float(os.environ.get("TELEGRAM_CHAT_RATE", "1")),
+    chat_burst=int(os.environ.get("TELEGRAM_CHAT_BURST", "3")),
+    group_rate=float(os.environ.get("TELEGRAM_GROUP_RATE", str(20 / 60))),
+    max_retries=int(os.environ.get("TELEGRAM_MAX_RETRIES", "3")),
+)
+
+METRICS_CONFIG = MetricsConfig(
+    port=int(os.environ.get("METRICS_PORT", "9100")),
+    listen=os.environ.get("METRICS_LISTEN", "0.0.0.0"),
+    # /healthz отвечает 503, если цикл событий не отзывался дольше этого времени (в секундах)
+    liveness_timeout=float(os.environ.get("METRICS_LIVENESS_TIMEOUT", "60")),
 )
@@ -1,12 +1,17 @@
+import shutil
 from enum import Enum, auto
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (CallbackQueryHandler, CommandHandler, ContextTypes,
                           ConversationHandler)
 
-from config import ADMIN_CHAT_ID, USER_DB_CONFIG
+from config import ADMIN_CHAT_ID, DOWNLOAD_CONFIG, USER_DB_CONFIG
+from services.metrics import timed_handler
 from services.service_factory import ServiceFactory
 
+# Наибольший user_id, который помещается в BIGINT
+MAX_USER_ID = 2**63 - 1
+
 # Состояния разговора
 
 
@@ -30,7 +35,7 @@ async def admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     Raises:
         No explicit exceptions raised, but handles unauthorized access by ending the conversation
     """
-    user_service = ServiceFactory.get_user_service(
+    user_service = ServiceFactory.get_async_user_service(
         USER_DB_CONFIG, ADMIN_CHAT_ID)
 
     if not user_service.is_admin(update.effective_user.id):
@@ -45,6 +50,7 @@ async def admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return AdminStates.SHOWING_REQUESTS
 
 
+@timed_handler
 async def list_requests(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Handles the display of pending user requests with pagination.
@@ -63,12 +69,14 @@ async def list_requests(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         Sends a message indicating no pending requests if the list is empty
     
     Notes:
-        - Supports pagination with configurable page size (default 10)
-        - Provides direct profile links and action buttons for each pending request
+        - Supports keyset pagination with configurable page size (default 10); the start cursor of
+          every visited page is kept in context.user_data['page_cursors']
+        - Provides direct profile links and action buttons for each pending request, plus
+          buttons acting on the whole page (IDs kept in context.user_data['page_user_ids'])
         - Calculates total pages based on request count
         - Adds navigation buttons for multi-page scenarios
     """
-    user_service = ServiceFactory.get_user_service(
+    user_service = ServiceFactory.get_async_user_service(
         USER_DB_CONFIG, ADMIN_CHAT_ID)
     callback_query = update.callback_query
 
@@ -76,20 +84,30 @@ async def list_requests(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         await update.message.reply_text("Вы не авторизованы.")
         return ConversationHandler.END
 
-    page = context.user_data.get('page', 1)
+    # Курсоры начала каждой просмотренной страницы; последний — текущая страница
+    page_cursors = context.user_data.setdefault('page_cursors', [None])
     page_size = 10
-    pending_requests, total_count = user_service.get_pending_users(
-        page, page_size)
+    pending_requests, total_count, next_cursor = await user_service.get_pending_users(
+        page_size, page_cursors[-1])
+
+    # Последняя страница могла опустеть после одобрения заявок — возвращаемся назад
+    while not pending_requests and len(page_cursors) > 1:
+        page_cursors.pop()
+        pending_requests, total_count, next_cursor = await user_service.get_pending_users(
+            page_size, page_cursors[-1])
 
     if not pending_requests:
         text = "Нет ожидающих заявок."
         if callback_query:
-            await callback_query.message.edit_text(text, reply_markup=keyboard)
+            await callback_query.message.edit_text(text)
         else:
-            await update.message.reply_text(text, reply_markup=keyboard)
+            await update.message.reply_text(text)
         return ConversationHandler.END
 
-    total_pages = (total_count + page_size - 1) // page_size
+    context.user_data['next_cursor'] = next_cursor
+    context.user_data['page_user_ids'] = pending_requests
+    page = len(page_cursors)
+    total_pages = max(page, (total_count + page_size - 1) // page_size)
 
     buttons = []
     for user_id in pending_requests:
@@ -103,14 +121,21 @@ async def list_requests(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
             ]
         ])
 
-    if total_pages > 1:
-        nav_buttons = []
-        if page > 1:
-            nav_buttons.append(InlineKeyboardButton("◀️ Назад",
-                                                    callback_data="admin:prev_page"))
-        if page < total_pages:
-            nav_buttons.append(InlineKeyboardButton("Вперёд ▶️",
-                                                    callback_data="admin:next_page"))
+    buttons.append([
+        InlineKeyboardButton("Одобрить все на странице",
+                             callback_data="admin:approve_page"),
+        InlineKeyboardButton("Отклонить все на странице",
+                             callback_data="admin:reject_page")
+    ])
+
+    nav_buttons = []
+    if page > 1:
+        nav_buttons.append(InlineKeyboardButton("◀️ Назад",
+                                                callback_data="admin:prev_page"))
+    if next_cursor is not None:
+        nav_buttons.append(InlineKeyboardButton("Вперёд ▶️",
+                                                callback_data="admin:next_page"))
+    if nav_buttons:
         buttons.append(nav_buttons)
 
     keyboard = InlineKeyboardMarkup(buttons)
@@ -122,6 +147,7 @@ async def list_requests(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     return AdminStates.SHOWING_REQUESTS
 
 
+@timed_handler
 async def admin_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Handles administrative callback queries for user management and pagination.
@@ -129,6 +155,7 @@ async def admin_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
     This function processes callback queries from the admin interface, supporting:
     - Approving pending users
     - Rejecting pending users
+    - Approving or rejecting every request on the current page in one database statement
     - Navigating through pages of pending requests
     
     Parameters:
@@ -144,7 +171,7 @@ async def admin_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
     
     Side Effects:
         - Modifies user approval status in the user service
-        - Updates pagination context
+        - Updates pagination cursors in the context
         - Sends callback query answers to the user
         - Refreshes the list of pending requests
     """
@@ -153,38 +180,193 @@ async def admin_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
         try:
             action, user_id_str = data.split(":", 2)[1:]
             user_id = int(user_id_str)
-            if user_id <= 0:
+            if not 0 < user_id <= MAX_USER_ID:
                 raise ValueError("Invalid user_id")
             return action, user_id
         except (ValueError, IndexError) as e:
             raise ValueError(f"Invalid callback data: {e}")
 
 
-    user_service = ServiceFactory.get_user_service(
+    user_service = ServiceFactory.get_async_user_service(
         USER_DB_CONFIG, ADMIN_CHAT_ID)
     query = update.callback_query
     data = query.data
 
     if data.startswith("admin:approve:"):
         _, user_id = parse_callback_data(data)
-        user_service.set_approved(user_id)
+        await user_service.set_approved(user_id)
         await query.answer("Пользователь одобрен!")
 
     elif data.startswith("admin:reject:"):
         _, user_id = parse_callback_data(data)
-        user_service.remove_pending(user_id)
+        await user_service.remove_pending(user_id)
         await query.answer("Пользователь отклонён!")
 
+    elif data in ["admin:approve_page", "admin:reject_page"]:
+        page_user_ids = context.user_data.get('page_user_ids', [])
+        if data == "admin:approve_page":
+            updated = await user_service.set_approved_many(page_user_ids)
+            text = f"Одобрено заявок: {len(updated)}"
+        else:
+            updated = await user_service.remove_pending_many(page_user_ids)
+            text = f"Отклонено заявок: {len(updated)}"
+        # Заявки, которые успели рассмотреть после показа страницы, не меняются
+        skipped = len(set(page_user_ids)) - len(updated)
+        if skipped:
+            text += f", уже рассмотрено: {skipped}"
+        await query.answer(text)
+
     elif data in ["admin:prev_page", "admin:next_page"]:
-        context.user_data['page'] = (max(1, context.user_data.get('page', 1) - 1)
-                                     if data == "admin:prev_page"
-                                     else context.user_data.get('page', 1) + 1)
+        page_cursors = context.user_data.setdefault('page_cursors', [None])
+        if data == "admin:prev_page":
+            if len(page_cursors) > 1:
+                page_cursors.pop()
+        elif context.user_data.get('next_cursor') is not None:
+            page_cursors.append(context.user_data['next_cursor'])
         await query.answer()
 
     await list_requests(update, context)
     return AdminStates.SHOWING_REQUESTS
 
 
+async def _bulk_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE, approve: bool) -> None:
+    user_service = ServiceFactory.get_async_user_service(
+        USER_DB_CONFIG, ADMIN_CHAT_ID)
+
+    if not user_service.is_admin(update.effective_user.id):
+        await update.message.reply_text("Вы не авторизованы.")
+        return
+
+    command = "approve" if approve else "reject"
+    try:
+        user_ids = list(dict.fromkeys(int(arg) for arg in context.args))
+    except ValueError:
+        user_ids = []
+    # ID вне диапазона BIGINT отклоняются здесь, а не ошибкой в базе
+    if not user_ids or any(not 0 < user_id <= MAX_USER_ID for user_id in user_ids):
+        await update.message.reply_text(f"Использование: /{command} <user_id> [<user_id> ...]")
+        return
+
+    if approve:
+        updated = await user_service.set_approved_many(user_ids)
+        text = f"Одобрено заявок: {len(updated)}"
+    else:
+        updated = await user_service.remove_pending_many(user_ids)
+        text = f"Отклонено заявок: {len(updated)}"
+
+    updated_ids = set(updated)
+    rest = [user_id for user_id in user_ids if user_id not in updated_ids]
+    if rest:
+        existing = set(await user_service.get_existing_users(rest))
+        not_pending = [str(user_id) for user_id in rest if user_id in existing]
+        missing = [str(user_id) for user_id in rest if user_id not in existing]
+        if not_pending:
+            text += f"\nЗаявка уже рассмотрена: {', '.join(not_pending)}"
+        if missing:
+            text += f"\nНе найдены: {', '.join(missing)}"
+    await update.message.reply_text(text)
+
+
+async def approve_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handles the /approve command, approving one or more users given by ID.
+    
+    Example: /approve 123 456 789. All listed users are updated in one database statement.
+    
+    Parameters:
+        update (Update): Telegram update object containing message information
+        context (ContextTypes.DEFAULT_TYPE): Context with the command arguments in context.args
+    """
+    await _bulk_status_command(update, context, approve=True)
+
+
+async def reject_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handles the /reject command, rejecting one or more users given by ID.
+    
+    Example: /reject 123 456 789. All listed users are updated in one database statement.
+    
+    Parameters:
+        update (Update): Telegram update object containing message information
+        context (ContextTypes.DEFAULT_TYPE): Context with the command arguments in context.args
+    """
+    await _bulk_status_command(update, context, approve=False)
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handles the /stats command, reporting database pool and user status cache counters to the admin.
+    
+    Parameters:
+        update (Update): Telegram update object containing message information
+        context (ContextTypes.DEFAULT_TYPE): Context for the current bot interaction
+    
+    Notes:
+        - Intended for sizing POSTGRES_POOL_* and USER_STATUS_CACHE_* settings
+        - Non-admin users receive an authorization error
+    """
+    user_service = ServiceFactory.get_async_user_service(
+        USER_DB_CONFIG, ADMIN_CHAT_ID)
+
+    if not user_service.is_admin(update.effective_user.id):
+        await update.message.reply_text("Вы не авторизованы.")
+        return
+
+    pool = user_service.get_pool_stats()
+    cache = user_service.get_cache_stats()
+    await update.message.reply_text(
+        "Пул соединений:\n"
+        f"  размер: {pool.size}, занято: {pool.in_use}, свободно: {pool.idle}, ожидают: {pool.waiting}\n"
+        f"  ожидание: среднее {pool.avg_wait_time * 1000:.1f} мс, максимум {pool.max_wait_time * 1000:.1f} мс\n"
+        "Кэш статусов:\n"
+        f"  записей: {cache.size}/{cache.max_size}, попадания: {cache.hits}, промахи: {cache.misses} "
+        f"({cache.hit_ratio:.0%})"
+    )
+
+
+def _format_gb(size: int) -> str:
+    return f"{size / 1024 ** 3:.1f} ГБ"
+
+
+async def disk_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handles the /disk command, reporting free space of the videos volume and the space reserved by running downloads.
+    
+    Parameters:
+        update (Update): Telegram update object containing message information
+        context (ContextTypes.DEFAULT_TYPE): Context for the current bot interaction
+    
+    Notes:
+        - Downloads start only while free space minus all reservations stays above DOWNLOAD_MIN_FREE_SPACE_MB
+        - Non-admin users receive an authorization error
+    """
+    user_service = ServiceFactory.get_async_user_service(
+        USER_DB_CONFIG, ADMIN_CHAT_ID)
+
+    if not user_service.is_admin(update.effective_user.id):
+        await update.message.reply_text("Вы не авторизованы.")
+        return
+
+    job_service = ServiceFactory.get_download_job_service(USER_DB_CONFIG)
+    usage = shutil.disk_usage(DOWNLOAD_CONFIG.videos_dir)
+    reservations = await job_service.get_reservations()
+    reserved = sum(r.reserved_bytes for r in reservations)
+    available = usage.free - reserved - DOWNLOAD_CONFIG.min_free_space
+
+    lines = [
+        f"Диск {DOWNLOAD_CONFIG.videos_dir}:",
+        f"  всего: {_format_gb(usage.total)}, свободно: {_format_gb(usage.free)}",
+        f"  зарезервировано загрузками: {_format_gb(reserved)}, неприкосновенный запас: "
+        f"{_format_gb(DOWNLOAD_CONFIG.min_free_space)}",
+        f"  доступно для новых загрузок: {_format_gb(max(available, 0))}",
+    ]
+    if reservations:
+        lines.append("Резервирования:")
+        lines += [f"  #{r.job_id} {r.title or r.url}: {_format_gb(r.reserved_bytes)} ({r.worker_id})"
+                  for r in reservations]
+    await update.message.reply_text("\n".join(lines))
+
+
 def get_admin_conversation_handler() -> ConversationHandler:
     """
     Returns a ConversationHandler configured for admin-related commands and interactions.
@@ -209,4 +391,6 @@ def get_admin_conversation_handler() -> ConversationHandler:
             ],
         },
         fallbacks=[],
+        name="admin_conversation",
+        persistent=True,
     )
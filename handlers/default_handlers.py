@@ -8,12 +8,17 @@ from services.service_factory import ServiceFactory
 COMMON_COMMANDS = """
 Доступные команды:
 /start — Отобразить главное меню.
+/subscribe <ссылка на канал> [интервал в минутах] [одновременных загрузок] — Загружать новые видео канала.
+/subscriptions — Показать подписки.
+/unsubscribe <id> — Отменить подписку.
 """
 ADMIN_COMMANDS = """
 Администраторские команды:
 /list_requests — Показать все заявки.
-/approve <user_id> — Подтвердить заявку.
-/reject <user_id> — Отклонить заявку.
+/approve <user_id> [<user_id> ...] — Подтвердить заявки.
+/reject <user_id> [<user_id> ...] — Отклонить заявки.
+/stats — Статистика пула соединений и кэша.
+/disk — Свободное место и резервирования загрузок.
 """
 
 async def unknown_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -61,7 +66,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         - Uses user's chat ID to determine command access
         - Dynamically generates command list based on user role
     """
-    user_service = ServiceFactory.get_user_service(
+    user_service = ServiceFactory.get_async_user_service(
         USER_DB_CONFIG, ADMIN_CHAT_ID)
     user_id = update.effective_chat.id
 
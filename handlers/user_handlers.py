@@ -1,13 +1,15 @@
 import logging
-import shlex
-import subprocess
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
 from telegram.ext import (CallbackQueryHandler, CommandHandler, ContextTypes,
                           ConversationHandler, MessageHandler, filters)
 
-from config import ADMIN_CHAT_ID, USER_DB_CONFIG
+from config import ADMIN_CHAT_ID, SUBSCRIPTION_CONFIG, USER_DB_CONFIG
+from services.metrics import timed_handler
 from services.service_factory import ServiceFactory
+from services.youtube_urls import (canonical_video_url, extract_collection_url,
+                                   extract_video_id)
 
 WAITING_FOR_LINK = 1
 
@@ -19,6 +21,7 @@ logging.basicConfig(
 logger = logging.getLogger()
 
 
+@timed_handler
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Handles the /start command for user interaction with the Telegram bot.
@@ -28,6 +31,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     - If the user is already pending, informs them about the pending status
     - If the user is new, adds them to the system and sets their status to pending
     
+    The status lookup and registration happen in a single database round trip via get_or_register.
+    
     Parameters:
         update (Update): Telegram update object containing user and message information
         context (ContextTypes.DEFAULT_TYPE): Telegram context for handling the update
@@ -38,18 +43,18 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     Raises:
         No explicit exceptions are raised within this method
     """
-    user_service = ServiceFactory.get_user_service(
+    user_service = ServiceFactory.get_async_user_service(
         USER_DB_CONFIG, ADMIN_CHAT_ID)
     user_id = update.effective_chat.id
 
-    if user_service.is_approved_user(user_id):
+    approved, _, was_created = await user_service.get_or_register(user_id)
+
+    if approved:
         await user_menu(update, context)
-    elif user_service.is_pending_user(user_id):
-        await update.message.reply_text("Ваша заявка на рассмотрении у администратора.")
-    else:
-        user_service.add_user(user_id)
-        user_service.set_pending(user_id)
+    elif was_created:
         await update.message.reply_text("Заявка на доступ отправлена администратору.")
+    else:
+        await update.message.reply_text("Ваша заявка на рассмотрении у администратора.")
     return ConversationHandler.END
 
 
@@ -72,11 +77,11 @@ async def user_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     the appropriate callback data for the button. It also stores the message ID in the 
     user's context data for potential future reference.
     """
-    user_service = ServiceFactory.get_user_service(
+    user_service = ServiceFactory.get_async_user_service(
         USER_DB_CONFIG, ADMIN_CHAT_ID)
     user_id = update.effective_chat.id
 
-    is_approved = user_service.is_approved_user(user_id)
+    is_approved = await user_service.is_approved_user(user_id)
     buttons = [[InlineKeyboardButton(
         "Скачать видео" if is_approved else "Отправить заявку",
         callback_data="user:download" if is_approved else "user:request_access"
@@ -134,6 +139,7 @@ async def user_callback_handler(update: Update, context: ContextTypes.DEFAULT_TY
         return ConversationHandler.END
 
 
+@timed_handler
 async def handle_youtube_link(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Handles a YouTube link submitted by the user.
@@ -153,23 +159,24 @@ async def handle_youtube_link(update: Update, context: ContextTypes.DEFAULT_TYPE
     url = update.message.text.strip()
     await update.message.delete()
     try:
-        message = await context.bot.edit_message_text(
+        await context.bot.edit_message_text(
             chat_id=update.effective_chat.id,
             message_id=context.user_data['message_id'],
             text="Обрабатываю ссылку..."
         )
-        return await process_youtube_link(update, context, url)
-    except:
-        message = await update.message.reply_text("Обрабатываю ссылку...")
+    except (KeyError, BadRequest) as e:
+        # Сообщение бота не найдено или уже не редактируется — отправляем новое
+        logger.info(f"Status message of user {update.effective_user.id} is not editable: {e!r}")
+        message = await update.effective_chat.send_message("Обрабатываю ссылку...")
         context.user_data['message_id'] = message.message_id
-        return await process_youtube_link(update, context, url)
+    return await process_youtube_link(update, context, url)
 
 
 async def process_youtube_link(update: Update, context: ContextTypes.DEFAULT_TYPE, url: str) -> int:
     """
-    Process a YouTube video download link and initiate the download script.
+    Process a YouTube video download link and queue it for download.
     
-    This function validates the provided URL, confirms it is a YouTube link, and triggers a download process for the specified video. It handles user interaction by updating messages and managing the conversation state.
+    This function validates the provided URL, confirms it is a YouTube link, and submits a job for the specified video to the download service. It handles user interaction by updating messages and managing the conversation state.
     
     Args:
         update (Update): The Telegram update object containing user interaction details.
@@ -179,18 +186,21 @@ async def process_youtube_link(update: Update, context: ContextTypes.DEFAULT_TYP
     Returns:
         int: The next state of the ConversationHandler, either continuing to wait for a link or ending the conversation.
     
-    Raises:
-        Exception: If there is an error launching the download script.
-    
     Notes:
-        - Checks if the URL contains YouTube domain variations
-        - Provides user feedback during the download process
-        - Uses a subprocess to run an external download script
-        - Handles potential script execution errors
+        - Extracts the video ID from any common YouTube link form
+        - Playlist and channel links are queued as a whole and expanded into individual videos by a worker
+        - Links to a video that is already queued, downloading or downloaded are not downloaded again;
+          the user is subscribed to the running job's notifications or told the video is in the library
+        - Tells the user their position in the download queue
+        - Jobs are stored in the durable download queue and executed by separate worker
+          processes (worker.py), which notify the user themselves
+        - Handles errors while queueing the job
     """
     user_id = update.effective_chat.id
 
-    if "youtube.com" not in url and "youtu.be" not in url:
+    video_id = extract_video_id(url)
+    collection_url = extract_collection_url(url) if video_id is None else None
+    if video_id is None and collection_url is None:
         await context.bot.edit_message_text(
             chat_id=update.effective_chat.id,
             message_id=context.user_data['message_id'],
@@ -201,26 +211,140 @@ async def process_youtube_link(update: Update, context: ContextTypes.DEFAULT_TYP
         )
         return WAITING_FOR_LINK
 
-    await context.bot.edit_message_text(
-        chat_id=update.effective_chat.id,
-        message_id=context.user_data['message_id'],
-        text=f"Ссылка принята, начинаю загрузку: {url}"
-    )
-
+    job_service = ServiceFactory.get_download_job_service(USER_DB_CONFIG)
     try:
-        safe_url = shlex.quote(url)
-        subprocess.Popen(
-            ['./scripts/download_and_refresh.sh', safe_url, str(user_id)])
+        if collection_url is not None:
+            result = await job_service.enqueue_collection(
+                collection_url, user_id, context.user_data.get('message_id'))
+        else:
+            result = await job_service.enqueue(
+                canonical_video_url(video_id), video_id, user_id, context.user_data.get('message_id'))
     except Exception as e:
         await context.bot.edit_message_text(
             chat_id=update.effective_chat.id,
             message_id=context.user_data['message_id'],
-            text=f"Ошибка при запуске скрипта: {e}"
+            text=f"Ошибка при постановке загрузки в очередь: {e}"
         )
+        return ConversationHandler.END
+
+    if collection_url is not None:
+        text = (f"Плейлист принят: {collection_url}\n"
+                f"Место в очереди: {result.position}. Уже загруженные видео будут пропущены.")
+    elif result.state == 'done':
+        text = f"Это видео уже есть в библиотеке: {result.title or url}"
+    elif not result.created:
+        text = f"Это видео уже загружается, я сообщу, когда загрузка завершится: {result.title or url}"
+    elif result.position == 1:
+        text = f"Ссылка принята, загрузка скоро начнётся: {url}"
+    else:
+        text = f"Ссылка принята: {url}\nМесто в очереди загрузок: {result.position}"
+    await context.bot.edit_message_text(
+        chat_id=update.effective_chat.id,
+        message_id=context.user_data['message_id'],
+        text=text
+    )
 
     return ConversationHandler.END
 
 
+async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handles the /subscribe command, subscribing the user to new uploads of a YouTube channel.
+    
+    Example: /subscribe https://www.youtube.com/@handle 120 3 checks the channel every 120 minutes
+    and keeps at most 3 of its videos in the download queue. Both numbers are optional and default
+    to SUBSCRIPTION_CHECK_INTERVAL and SUBSCRIPTION_MAX_DOWNLOADS. Repeating the command for the same
+    channel changes the settings of the existing subscription.
+    
+    Parameters:
+        update (Update): Telegram update object containing message information
+        context (ContextTypes.DEFAULT_TYPE): Context with the command arguments in context.args
+    
+    Notes:
+        - Only approved users can subscribe
+        - The channel is listed right away in the background; the videos it already has are not downloaded
+    """
+    user_service = ServiceFactory.get_async_user_service(USER_DB_CONFIG, ADMIN_CHAT_ID)
+    user_id = update.effective_chat.id
+    if not await user_service.is_approved_user(user_id):
+        await update.message.reply_text("Подписки доступны только пользователям с одобренной заявкой.")
+        return
+
+    usage = ("Использование: /subscribe <ссылка на канал> [интервал в минутах] [одновременных загрузок]\n"
+             f"Интервал не меньше {int(SUBSCRIPTION_CONFIG.min_check_interval // 60)} мин.")
+    url = extract_collection_url(context.args[0]) if context.args else None
+    if url is None or len(context.args) > 3:
+        await update.message.reply_text(usage)
+        return
+    try:
+        check_interval = int(context.args[1]) * 60 if len(context.args) > 1 else int(SUBSCRIPTION_CONFIG.check_interval)
+        max_downloads = int(context.args[2]) if len(context.args) > 2 else SUBSCRIPTION_CONFIG.max_downloads
+    except ValueError:
+        await update.message.reply_text(usage)
+        return
+    if check_interval < SUBSCRIPTION_CONFIG.min_check_interval or max_downloads < 1:
+        await update.message.reply_text(usage)
+        return
+
+    scheduler = ServiceFactory.get_subscription_scheduler(SUBSCRIPTION_CONFIG, USER_DB_CONFIG)
+    subscription, created = await scheduler.subscription_service.subscribe(
+        user_id, url, check_interval, max_downloads)
+    if created:
+        scheduler.check_soon(context.job_queue, subscription)
+        await update.message.reply_text(f"Подписка #{subscription.subscription_id} на {url} принята, "
+                                        f"получаю список видео канала...")
+    else:
+        await update.message.reply_text(
+            f"Настройки подписки #{subscription.subscription_id} обновлены: проверка каждые "
+            f"{check_interval // 60} мин., одновременных загрузок не больше {max_downloads}.")
+
+
+async def subscriptions_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handles the /subscriptions command, listing the user's channel subscriptions.
+    
+    Parameters:
+        update (Update): Telegram update object containing message information
+        context (ContextTypes.DEFAULT_TYPE): Context for the current bot interaction
+    """
+    subscription_service = ServiceFactory.get_subscription_service(USER_DB_CONFIG)
+    subscriptions = await subscription_service.get_subscriptions(update.effective_chat.id)
+    if not subscriptions:
+        await update.message.reply_text("Подписок нет. Оформить: /subscribe <ссылка на канал>")
+        return
+    lines = [
+        f"#{s.subscription_id} {s.title or s.url} — каждые {s.check_interval // 60} мин., "
+        f"загрузок: {s.max_downloads}"
+        for s in subscriptions
+    ]
+    await update.message.reply_text("Ваши подписки:\n" + "\n".join(lines) + "\n\nОтменить: /unsubscribe <id>")
+
+
+async def unsubscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handles the /unsubscribe command, deleting one of the user's subscriptions by its ID.
+    
+    Videos of the channel that are already queued are still downloaded.
+    
+    Parameters:
+        update (Update): Telegram update object containing message information
+        context (ContextTypes.DEFAULT_TYPE): Context with the command arguments in context.args
+    """
+    try:
+        subscription_id = int(context.args[0].lstrip("#")) if len(context.args) == 1 else None
+    except ValueError:
+        subscription_id = None
+    if subscription_id is None:
+        await update.message.reply_text("Использование: /unsubscribe <id>. Список подписок: /subscriptions")
+        return
+
+    subscription_service = ServiceFactory.get_subscription_service(USER_DB_CONFIG)
+    if await subscription_service.unsubscribe(update.effective_chat.id, subscription_id):
+        await update.message.reply_text(f"Подписка #{subscription_id} отменена.")
+    else:
+        await update.message.reply_text(f"Подписка #{subscription_id} не найдена.")
+
+
 def get_conversation_handler() -> ConversationHandler:
     """
     Returns a ConversationHandler for managing user interactions in the Telegram bot.
@@ -249,5 +373,7 @@ def get_conversation_handler() -> ConversationHandler:
             CommandHandler('menu', user_menu),
             CommandHandler('help', lambda u, c: ConversationHandler.END),
             CallbackQueryHandler(user_callback_handler, pattern='^user:cancel')
-        ]
+        ],
+        name="user_conversation",
+        persistent=True,
     )
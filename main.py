@@ -1,12 +1,22 @@
+import asyncio
 import logging
 from datetime import datetime as dt
 
-from telegram.ext import (ApplicationBuilder, CommandHandler, MessageHandler,
-                          filters)
+from telegram.ext import (Application, ApplicationBuilder, CommandHandler,
+                          MessageHandler, filters)
 
-from config import ADMIN_CHAT_ID, BOT_TOKEN, USER_DB_CONFIG
+from config import (ADMIN_CHAT_ID, BOT_MODE, BOT_TOKEN, MAX_CONCURRENT_UPDATES,
+                    METRICS_CONFIG, PERSISTENCE_UPDATE_INTERVAL, SUBSCRIPTION_CONFIG,
+                    TELEGRAM_CONFIG, USER_DB_CONFIG, USERS_HIST_CONFIG, WEBHOOK_LISTEN,
+                    WEBHOOK_MAX_CONNECTIONS, WEBHOOK_PATH, WEBHOOK_PORT,
+                    WEBHOOK_SECRET_TOKEN, WEBHOOK_URL)
 from handlers import admin_handlers, default_handlers, user_handlers
+from services.metrics import MetricsServer
+from services.migrations import migrate_database
+from services.persistence import PostgresPersistence
 from services.service_factory import ServiceFactory
+from services.telegram_sender import TelegramRateLimiter, build_request
+from services.update_processor import PerUserUpdateProcessor
 
 # Настраиваем логирование
 logging.basicConfig(
@@ -14,17 +24,86 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
+# Метрики Prometheus и проверка живости для healthcheck контейнера
+metrics_server = MetricsServer(METRICS_CONFIG)
+
+
+async def on_startup(app: Application) -> None:
+    """
+    Starts the metrics endpoint, the subscription scheduler and the history retention job
+    inside the bot's event loop.
+
+    Parameters:
+        app (Application): The application being started.
+    """
+    metrics_server.start()
+
+    # Периодическая проверка подписок на каналы
+    ServiceFactory.get_subscription_scheduler(SUBSCRIPTION_CONFIG, USER_DB_CONFIG).start(app.job_queue)
+    # Секции истории статусов на будущие месяцы и удаление устаревших
+    ServiceFactory.get_history_retention(USERS_HIST_CONFIG, USER_DB_CONFIG, ADMIN_CHAT_ID).start(app.job_queue)
+
+
+async def on_shutdown(app: Application) -> None:
+    """
+    Closes the database pools and the metrics endpoint after the bot has stopped processing updates.
+
+    Parameters:
+        app (Application): The application being stopped.
+    """
+    await ServiceFactory.get_subscription_service(USER_DB_CONFIG).close()
+    await ServiceFactory.get_download_job_service(USER_DB_CONFIG).close()
+    await ServiceFactory.get_async_user_service(USER_DB_CONFIG, ADMIN_CHAT_ID).close()
+    await metrics_server.stop()
+
+
+def add_handlers(app: Application) -> None:
+    """
+    Registers the user, admin and default handlers on the application.
+
+    Shared with benchmarks/bench_handlers.py, which measures the bot with the same handlers.
+
+    Parameters:
+        app (Application): The application to register the handlers on.
+    """
+    # ---------- Хендлеры универсальные ----------
+    app.add_handler(CommandHandler("help", default_handlers.help_command))
+
+    # ---------- Хендлеры для пользователей ----------
+    app.add_handler(user_handlers.get_conversation_handler())
+    app.add_handler(CommandHandler("subscribe", user_handlers.subscribe_command))
+    app.add_handler(CommandHandler("subscriptions", user_handlers.subscriptions_command))
+    app.add_handler(CommandHandler("unsubscribe", user_handlers.unsubscribe_command))
+
+    # ---------- Хендлеры для админа ----------
+    app.add_handler(admin_handlers.get_admin_conversation_handler())
+    app.add_handler(CommandHandler("approve", admin_handlers.approve_command))
+    app.add_handler(CommandHandler("reject", admin_handlers.reject_command))
+    app.add_handler(CommandHandler("stats", admin_handlers.stats_command))
+    app.add_handler(CommandHandler("disk", admin_handlers.disk_command))
+
+    # ---------- Обработка некорректных сообщений ----------
+    app.add_handler(MessageHandler(filters.COMMAND,
+                    default_handlers.unknown_command))
+    app.add_handler(MessageHandler(
+        filters.TEXT & ~filters.COMMAND, default_handlers.unknown_message))
+
 
 def main() -> None:
     """
     Initializes and starts the Telegram bot application with user, admin, and default handlers.
     
     This function sets up the bot by:
-    - Creating a user service using configuration parameters
-    - Building the Telegram application with the bot token
+    - Applying pending schema migrations before anything touches the database
+    - Registering startup/shutdown hooks that open and close the async user service
+    - Building the Telegram application with the bot token, an HTTP connection pool and flood control
+    - Processing updates of different users concurrently, keeping each user's updates in order
+    - Persisting conversation states and user_data in Postgres so they survive restarts
+    - Checking subscribed channels for new uploads on the application's job queue
+    - Maintaining the monthly partitions of the user status history and its retention
     - Adding conversation handlers for help, user interactions, and admin functions
     - Configuring handlers for unknown commands and messages
-    - Starting the bot's polling mechanism to receive updates
+    - Receiving updates by long polling, or through an embedded webhook server when BOT_MODE=webhook
     
     Parameters:
         None
@@ -36,28 +115,44 @@ def main() -> None:
         Exception: Potential exceptions during bot initialization or polling
     """
 
-    # Инициализация сервисов
-    user_service = ServiceFactory.get_user_service(USER_DB_CONFIG, ADMIN_CHAT_ID)
+    # Миграции схемы до запуска: persistence читает свои таблицы ещё до post_init.
+    # Цикл событий остаётся текущим, run_polling/run_webhook продолжают работу в нём
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(migrate_database(USER_DB_CONFIG))
 
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
-
-    # ---------- Хендлеры универсальные ----------
-    app.add_handler(CommandHandler("help", default_handlers.help_command))
+    app = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .base_url(TELEGRAM_CONFIG.base_url)
+        .request(build_request(TELEGRAM_CONFIG))
+        .rate_limiter(TelegramRateLimiter(TELEGRAM_CONFIG))
+        .concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .persistence(PostgresPersistence(USER_DB_CONFIG, PERSISTENCE_UPDATE_INTERVAL))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
 
-    # ---------- Хендлеры для пользователей ----------
-    app.add_handler(user_handlers.get_conversation_handler())
-
-    # ---------- Хендлеры для админа ----------
-    app.add_handler(admin_handlers.get_admin_conversation_handler())
-
-    # ---------- Обработка некорректных сообщений ----------
-    app.add_handler(MessageHandler(filters.COMMAND,
-                    default_handlers.unknown_command))
-    app.add_handler(MessageHandler(
-        filters.TEXT & ~filters.COMMAND, default_handlers.unknown_message))
+    add_handlers(app)
 
-    # Запуск Polling
-    app.run_polling()
+    if BOT_MODE == "webhook":
+        if not WEBHOOK_URL or not WEBHOOK_SECRET_TOKEN:
+            raise ValueError("BOT_MODE=webhook requires WEBHOOK_URL and WEBHOOK_SECRET_TOKEN")
+        # Запуск встроенного веб-сервера; Telegram отправляет обновления на WEBHOOK_URL/WEBHOOK_PATH
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+    elif BOT_MODE == "polling":
+        # Запуск Polling
+        app.run_polling()
+    else:
+        raise ValueError(f"Unknown BOT_MODE: {BOT_MODE}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,447 @@
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from services.cache import CacheStats, TTLCache
+from services.db import AsyncConnectionPool, DBConfig, PoolStats
+from services.metrics import USER_QUERY_LATENCY, register_pool
+
+# Позиция в списке заявок: (row_added_timestamp, user_id) последней показанной строки
+PendingCursor = tuple[datetime, int]
+
+
+class AsyncUserService:
+    def __init__(self, config: DBConfig, admin_chat_id: int):
+        """
+        Initialize the AsyncUserService with database configuration and admin settings.
+
+        User statuses are stored in the 'users' table, with every status change archived in
+        'users_hist'; the schema is created by the migrations in services.migrations. The asyncpg
+        connection pool is created lazily on first use, so it is bound to the event loop the bot
+        is running on.
+
+        Parameters:
+            config (DBConfig): Database configuration parameters, including pool sizing.
+            admin_chat_id (int): Unique identifier for the administrative user or chat.
+        """
+        self.config = config
+        self.admin_chat_id = admin_chat_id
+        self.logger = logging.getLogger(__name__)
+        self.status_cache = TTLCache(config.status_cache_size, config.status_cache_ttl)
+        self.pool = AsyncConnectionPool(config)
+        register_pool("users", self.pool)
+
+    @asynccontextmanager
+    async def get_connection(self, query: str = "other"):
+        """
+        Provides an async context manager that borrows a connection from the pool.
+
+        The time from borrowing to releasing the connection is recorded per `query`.
+
+        Parameters:
+            query (str): Name of the query for the user_service_query_duration_seconds metric.
+
+        Yields:
+            asyncpg.Connection: A pooled connection, released back to the pool on exit.
+
+        Raises:
+            asyncio.TimeoutError: If no connection became available within `pool_timeout`.
+        """
+        with USER_QUERY_LATENCY.labels(query).time():
+            async with self.pool.connection() as conn:
+                yield conn
+
+    def get_pool_stats(self) -> PoolStats:
+        """
+        Return usage statistics of the service's connection pool.
+
+        Returns:
+            PoolStats: Connections in use and idle, borrowers waiting and cumulative wait times.
+        """
+        return self.pool.stats()
+
+    def get_cache_stats(self) -> CacheStats:
+        """
+        Return hit/miss counters of the user status cache.
+
+        Returns:
+            CacheStats: Current cache size and cumulative hits, misses and evictions.
+        """
+        return self.status_cache.stats()
+
+    async def close(self) -> None:
+        """
+        Gracefully close the service's connection pool.
+        """
+        await self.pool.close()
+
+    def is_admin(self, user_id: int) -> bool:
+        """
+        Check if the given user is an admin based on their user ID.
+
+        Does not touch the database, so unlike the other methods it is a plain synchronous call.
+
+        Args:
+            user_id (int): The unique identifier of the user to check.
+
+        Returns:
+            bool: True if the user is an admin (matches the admin chat ID), False otherwise.
+        """
+        return user_id == self.admin_chat_id
+
+    async def get_user_status(self, user_id: int) -> tuple[bool, bool]:
+        """
+        Return the approval and pending flags of a user, served from the status cache when possible.
+
+        Unknown users are reported (and cached) as neither approved nor pending. Cached entries are
+        refreshed by the status setters and dropped by add_user, and expire after `status_cache_ttl`.
+
+        Parameters:
+            user_id (int): The unique identifier of the user to look up.
+
+        Returns:
+            tuple[bool, bool]: The (approved, pending) flags of the user.
+
+        Raises:
+            asyncpg.PostgresError: If a database error occurs during the query execution.
+        """
+        status = self.status_cache.get(user_id)
+        if status is not None:
+            return status
+
+        async with self.get_connection("get_user_status") as conn:
+            row = await conn.fetchrow(
+                "SELECT approved, pending FROM users WHERE user_id = $1",
+                user_id
+            )
+        status = (bool(row["approved"]), bool(row["pending"])) if row else (False, False)
+        self.status_cache.set(user_id, status)
+        return status
+
+    async def is_approved_user(self, user_id: int) -> bool:
+        """
+        Check if a user is approved in the system.
+
+        Parameters:
+            user_id (int): The unique identifier of the user to check for approval status.
+
+        Returns:
+            bool: True if the user is approved, False otherwise. Returns False if no user record is found.
+
+        Raises:
+            asyncpg.PostgresError: If a database error occurs during the query execution.
+        """
+        return (await self.get_user_status(user_id))[0]
+
+    async def is_pending_user(self, user_id: int) -> bool:
+        """
+        Check if a user is currently in a pending status awaiting access approval.
+
+        Parameters:
+            user_id (int): The unique identifier of the user to check.
+
+        Returns:
+            bool: True if the user is pending, False otherwise.
+
+        Raises:
+            asyncpg.PostgresError: If a database error occurs during the query.
+        """
+        return (await self.get_user_status(user_id))[1]
+
+    async def get_or_register(self, user_id: int) -> tuple[bool, bool, bool]:
+        """
+        Look up a user's status, filing an access request for them if they have none, in one round trip.
+
+        New users are inserted as pending, and previously rejected users are set back to pending,
+        atomically inside the 'get_or_register_user' database function. Approved and pending users
+        already in the status cache are answered without a database call.
+
+        Parameters:
+            user_id (int): The unique identifier of the user.
+
+        Returns:
+            tuple[bool, bool, bool]: The (approved, pending, was_created) flags, where `was_created`
+            is True if this call filed a new access request.
+
+        Raises:
+            Exception: If an error occurs while querying or updating the user.
+        """
+        status = self.status_cache.get(user_id)
+        if status is not None and any(status):
+            return status[0], status[1], False
+
+        async with self.get_connection("get_or_register") as conn:
+            try:
+                row = await conn.fetchrow(
+                    "SELECT approved, pending, was_created FROM get_or_register_user($1);",
+                    user_id
+                )
+            except Exception as e:
+                self.logger.error(f"Failed to register user {user_id}: {e}")
+                raise
+
+        self.status_cache.set(user_id, (row["approved"], row["pending"]))
+        return row["approved"], row["pending"], row["was_created"]
+
+    async def add_user(self, user_id: int) -> None:
+        """
+        Add a new user to the database with default status flags.
+
+        If the user already exists, the insertion is silently ignored due to the ON CONFLICT clause.
+        The user's status cache entry is invalidated.
+
+        Parameters:
+            user_id (int): The unique identifier of the user to be added.
+
+        Raises:
+            Exception: If an error occurs during the database insertion process.
+        """
+        async with self.get_connection("add_user") as conn:
+            try:
+                await conn.execute(
+                    """
+                    INSERT INTO users (user_id)
+                    VALUES ($1)
+                    ON CONFLICT (user_id) DO NOTHING;
+                    """,
+                    user_id
+                )
+                self.status_cache.invalidate(user_id)
+            except Exception as e:
+                self.logger.error(f"Failed to add user {user_id}: {e}")
+                raise
+
+    async def _update_user_status(self, user_id: int, approved: bool, pending: bool) -> None:
+        async with self.get_connection("update_user_status") as conn:
+            await conn.execute(
+                "SELECT update_user_status($1, $2, $3);",
+                user_id, approved, pending
+            )
+        self.status_cache.set(user_id, (approved, pending))
+
+    async def set_pending(self, user_id: int) -> None:
+        """
+        Set a user's status to pending, archiving the previous status in 'users_hist'.
+        The new status is written through to the status cache.
+
+        Parameters:
+            user_id (int): The unique identifier of the user to be set as pending.
+
+        Raises:
+            Exception: If there is an error updating the user's status in the database.
+        """
+        try:
+            await self._update_user_status(user_id, False, True)
+        except Exception as e:
+            self.logger.error(
+                f"Failed to set user {user_id} as pending: {e}")
+            raise
+
+    async def set_approved(self, user_id: int) -> None:
+        """
+        Update the status of a user to approved, archiving the previous status in 'users_hist'.
+        The new status is written through to the status cache.
+
+        Parameters:
+            user_id (int): The unique identifier of the user to be approved.
+
+        Raises:
+            Exception: If there is an error during the database update process.
+        """
+        try:
+            await self._update_user_status(user_id, True, False)
+        except Exception as e:
+            self.logger.error(f"Failed to approve user {user_id}: {e}")
+            raise
+
+    async def remove_pending(self, user_id: int) -> None:
+        """
+        Remove a user's pending status, archiving the previous status in 'users_hist'.
+        The new status is written through to the status cache.
+
+        Parameters:
+            user_id (int): The unique identifier of the user whose pending status will be removed.
+
+        Raises:
+            Exception: If there is an error updating the user's status in the database.
+        """
+        try:
+            await self._update_user_status(user_id, False, False)
+        except Exception as e:
+            self.logger.error(
+                f"Failed to remove pending status for user {user_id}: {e}")
+            raise
+
+    async def _update_users_status(self, user_ids: list[int], approved: bool, pending: bool) -> list[int]:
+        async with self.get_connection("update_users_status") as conn:
+            rows = await conn.fetch(
+                "SELECT update_users_status($1::bigint[], $2, $3) AS user_id;",
+                list(user_ids), approved, pending
+            )
+        updated = [row["user_id"] for row in rows]
+        for user_id in updated:
+            self.status_cache.set(user_id, (approved, pending))
+        return updated
+
+    async def set_approved_many(self, user_ids: list[int]) -> list[int]:
+        """
+        Approve several pending users at once, archiving their previous statuses in one statement and transaction.
+
+        Users whose request is not pending (already approved or rejected) are left unchanged.
+
+        Parameters:
+            user_ids (list[int]): Unique identifiers of the users to approve.
+
+        Returns:
+            list[int]: IDs of the pending users that were approved.
+
+        Raises:
+            Exception: If there is an error during the database update process.
+        """
+        try:
+            return await self._update_users_status(user_ids, True, False)
+        except Exception as e:
+            self.logger.error(f"Failed to approve users {user_ids}: {e}")
+            raise
+
+    async def remove_pending_many(self, user_ids: list[int]) -> list[int]:
+        """
+        Reject several pending users at once, archiving their previous statuses in one statement and transaction.
+
+        Users whose request is not pending (already approved or rejected) are left unchanged.
+
+        Parameters:
+            user_ids (list[int]): Unique identifiers of the users to reject.
+
+        Returns:
+            list[int]: IDs of the pending users that were rejected.
+
+        Raises:
+            Exception: If there is an error during the database update process.
+        """
+        try:
+            return await self._update_users_status(user_ids, False, False)
+        except Exception as e:
+            self.logger.error(f"Failed to remove pending status for users {user_ids}: {e}")
+            raise
+
+    async def get_existing_users(self, user_ids: list[int]) -> list[int]:
+        """
+        Return which of the given users are known to the bot.
+
+        Parameters:
+            user_ids (list[int]): Unique identifiers of the users to look up.
+
+        Returns:
+            list[int]: IDs of the users that have a row in 'users'.
+
+        Raises:
+            asyncpg.PostgresError: If a database error occurs during the query.
+        """
+        async with self.get_connection("get_existing_users") as conn:
+            rows = await conn.fetch(
+                "SELECT user_id FROM users WHERE user_id = ANY($1::bigint[])",
+                list(user_ids)
+            )
+        return [row["user_id"] for row in rows]
+
+    async def get_pending_users(
+        self, page_size: int, after: PendingCursor | None = None
+    ) -> tuple[list[int], int, PendingCursor | None]:
+        """
+        Retrieves one page of pending users from the database using keyset pagination.
+
+        Pending users are ordered by (row_added_timestamp, user_id) and read from the partial
+        index over pending rows, starting right after the `after` cursor. Unlike LIMIT/OFFSET,
+        every page costs the same regardless of how deep it is. The total comes from the
+        trigger-maintained counter in 'users_counters' instead of a COUNT(*) scan.
+
+        Parameters:
+            page_size (int): Number of users to return per page.
+            after (PendingCursor | None): Cursor returned for the previous page, or None for the first page.
+
+        Returns:
+            tuple: A tuple containing three elements:
+                - List[int]: User IDs of pending users on the requested page
+                - int: Total number of pending users in the database
+                - PendingCursor | None: Cursor to pass as `after` for the next page, or None on the last page
+
+        Raises:
+            asyncpg.PostgresError: If a database error occurs during query execution
+        """
+        async with self.get_connection("get_pending_users") as conn:
+            if after is None:
+                rows = await conn.fetch(
+                    """
+                    SELECT row_added_timestamp, user_id
+                    FROM users
+                    WHERE pending
+                    ORDER BY row_added_timestamp, user_id
+                    LIMIT $1
+                    """,
+                    page_size + 1
+                )
+            else:
+                rows = await conn.fetch(
+                    """
+                    SELECT row_added_timestamp, user_id
+                    FROM users
+                    WHERE pending
+                      AND (row_added_timestamp, user_id) > ($1, $2)
+                    ORDER BY row_added_timestamp, user_id
+                    LIMIT $3
+                    """,
+                    after[0], after[1], page_size + 1
+                )
+
+            total_count = await conn.fetchval(
+                "SELECT value FROM users_counters WHERE name = 'pending'"
+            )
+
+        page_rows = rows[:page_size]
+        next_cursor = (
+            (page_rows[-1]["row_added_timestamp"], page_rows[-1]["user_id"])
+            if len(rows) > page_size else None
+        )
+        return [row["user_id"] for row in page_rows], total_count or 0, next_cursor
+
+    async def maintain_history(self, premake_months: int, retention_days: int,
+                               archive_schema: str | None = None) -> tuple[int, list[str]]:
+        """
+        Create upcoming monthly partitions of 'users_hist' and remove the expired ones.
+
+        A partition expires once its whole month is older than `retention_days`. Expired partitions
+        are detached and dropped, or, with `archive_schema`, moved into that schema for archiving
+        (e.g. with pg_dump) and no longer take part in history queries.
+
+        Parameters:
+            premake_months (int): Months after the current one to create partitions for.
+            retention_days (int): Days of history to keep; 0 keeps everything.
+            archive_schema (str | None): Schema expired partitions are moved to instead of being dropped.
+
+        Returns:
+            tuple[int, list[str]]: Number of partitions created and names of the expired partitions.
+
+        Raises:
+            asyncpg.PostgresError: If a database error occurs during the maintenance.
+        """
+        async with self.get_connection("maintain_history") as conn:
+            async with conn.transaction():
+                created = await conn.fetchval(
+                    """
+                    SELECT users_hist_create_partitions(
+                        CURRENT_TIMESTAMP, CURRENT_TIMESTAMP + make_interval(months => $1))
+                    """,
+                    premake_months
+                )
+            if retention_days <= 0:
+                return created, []
+            async with conn.transaction():
+                expired = await conn.fetch(
+                    """
+                    SELECT users_hist_expire_partitions(
+                        CURRENT_TIMESTAMP - make_interval(days => $1), $2) AS name
+                    """,
+                    retention_days, archive_schema
+                )
+        return created, [row["name"] for row in expired]
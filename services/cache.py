@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Hashable
+
+
+@dataclass
+class CacheStats:
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class TTLCache:
+    _MISSING = object()
+
+    def __init__(self, max_size: int, ttl: float):
+        """
+        Bounded in-process cache with least-recently-used eviction and per-entry expiry.
+
+        Safe to share between threads and between coroutines of one event loop; no operation blocks
+        on I/O while holding the internal lock. A `max_size` of 0 disables caching entirely.
+
+        Parameters:
+            max_size (int): Maximum number of entries kept; the least recently used one is evicted first.
+            ttl (float): Seconds an entry stays valid after it was stored.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return the cached value for `key`, or `default` if it is absent or expired.
+        """
+        with self._lock:
+            entry = self._data.get(key, self._MISSING)
+            if entry is not self._MISSING:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._data[key]
+            self._misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Store `value` under `key`, evicting the least recently used entries if the cache is full.
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Drop the entry for `key` if present.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Drop all entries; counters are kept.
+        """
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> CacheStats:
+        """
+        Snapshot of the cache size and hit/miss/eviction counters.
+        """
+        with self._lock:
+            return CacheStats(
+                size=len(self._data),
+                max_size=self.max_size,
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+            )
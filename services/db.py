@@ -1,5 +1,15 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
 
+import asyncpg
+
+# Ошибки, по которым соединение считается оборванным и подлежит замене
+_BROKEN_CONNECTION_ERRORS = (
+    asyncpg.PostgresError, asyncpg.InterfaceError, asyncpg.InternalClientError, OSError, asyncio.TimeoutError,
+)
+
 
 @dataclass
 class DBConfig:
@@ -8,3 +18,196 @@ class DBConfig:
     database: str
     user: str
     password: str
+    pool_min_size: int = 1
+    pool_max_size: int = 10
+    pool_timeout: float = 30.0
+    pool_health_check_interval: float = 30.0
+    status_cache_size: int = 1024
+    status_cache_ttl: float = 60.0
+
+
+@dataclass
+class PoolStats:
+    size: int
+    in_use: int
+    idle: int
+    waiting: int
+    acquisitions: int
+    total_wait_time: float
+    max_wait_time: float
+    reconnects: int
+
+    @property
+    def avg_wait_time(self) -> float:
+        return self.total_wait_time / self.acquisitions if self.acquisitions else 0.0
+
+
+class _PooledConnection(asyncpg.Connection):
+    """asyncpg connection that remembers when it was returned to the pool and whether it was closed on purpose."""
+
+    released_at: float | None = None
+    closed_on_purpose: bool = False
+
+    async def reset(self, *, timeout=None):
+        await super().reset(timeout=timeout)
+        self.released_at = time.monotonic()
+
+    async def close(self, *, timeout=None):
+        if not self.is_closed():
+            self.closed_on_purpose = True
+        await super().close(timeout=timeout)
+
+    def terminate(self):
+        if not self.is_closed():
+            self.closed_on_purpose = True
+        super().terminate()
+
+    async def is_healthy(self, idle_interval: float, timeout: float) -> bool:
+        """
+        Ping the connection if it has been idle in the pool longer than `idle_interval`.
+
+        A connection that does not answer is terminated, so the pool opens a replacement.
+
+        Parameters:
+            idle_interval (float): Idle time in seconds after which the connection is pinged.
+            timeout (float): Ping timeout in seconds.
+
+        Returns:
+            bool: True if the connection can be handed out.
+        """
+        if self.released_at is None or time.monotonic() - self.released_at < idle_interval:
+            return True
+        try:
+            await self.fetchval("SELECT 1", timeout=timeout)
+        except _BROKEN_CONNECTION_ERRORS:
+            if not self.is_closed():
+                super().terminate()
+            return False
+        return True
+
+
+class AsyncConnectionPool:
+    def __init__(self, config: DBConfig):
+        """
+        Lazily created asyncpg pool with usage statistics and connection health checks.
+
+        The underlying pool is opened on first use, so it is bound to the event loop that uses it.
+        A connection that sat idle longer than `pool_health_check_interval` is pinged before it
+        is handed out. Connections that fail the ping or are lost while open are discarded,
+        the pool opens replacements and `PoolStats.reconnects` counts them.
+
+        Parameters:
+            config (DBConfig): Database connection and pool sizing parameters.
+        """
+        self.config = config
+        self._pool: asyncpg.Pool | None = None
+        self._lock = asyncio.Lock()
+        self._waiting = 0
+        self._acquisitions = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._reconnects = 0
+
+    async def get_pool(self) -> asyncpg.Pool:
+        """
+        Return the asyncpg pool, creating it on first call.
+
+        Returns:
+            asyncpg.Pool: Connection pool sized by `pool_min_size`/`pool_max_size` of the config.
+        """
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    self._pool = await asyncpg.create_pool(
+                        host=self.config.host,
+                        port=self.config.port,
+                        database=self.config.database,
+                        user=self.config.user,
+                        password=self.config.password,
+                        min_size=self.config.pool_min_size,
+                        max_size=self.config.pool_max_size,
+                        connection_class=_PooledConnection,
+                        init=self._watch_connection,
+                    )
+        return self._pool
+
+    async def _watch_connection(self, conn: _PooledConnection) -> None:
+        """Subscribe to termination of a newly opened connection to count lost ones."""
+        # Слушатель получает прокси, уже отвязанный от соединения, поэтому флаг читается из замыкания
+        conn.add_termination_listener(lambda _: self._on_connection_terminated(conn))
+
+    def _on_connection_terminated(self, conn: _PooledConnection) -> None:
+        # Закрытия самим пулом (простой, max_queries, close()) не считаются обрывом
+        if not conn.closed_on_purpose:
+            self._reconnects += 1
+
+    async def _acquire(self, pool: asyncpg.Pool):
+        """
+        Acquire a connection that passed the health check.
+
+        Parameters:
+            pool (asyncpg.Pool): Pool to acquire from.
+
+        Returns:
+            asyncpg.Connection: A live pooled connection.
+        """
+        while True:
+            conn = await pool.acquire(timeout=self.config.pool_timeout)
+            if await conn.is_healthy(self.config.pool_health_check_interval, self.config.pool_timeout):
+                return conn
+            # Оборванное соединение пул переоткроет при следующем acquire
+            await pool.release(conn)
+
+    @asynccontextmanager
+    async def connection(self):
+        """
+        Async context manager that borrows a live connection and always releases it back to the pool.
+
+        Yields:
+            asyncpg.Connection: A pooled database connection.
+
+        Raises:
+            asyncio.TimeoutError: If no connection became available within `pool_timeout`.
+        """
+        pool = await self.get_pool()
+        started = time.monotonic()
+        self._waiting += 1
+        try:
+            conn = await self._acquire(pool)
+        finally:
+            self._waiting -= 1
+        waited = time.monotonic() - started
+        self._acquisitions += 1
+        self._total_wait += waited
+        self._max_wait = max(self._max_wait, waited)
+        try:
+            yield conn
+        finally:
+            await pool.release(conn)
+
+    def stats(self) -> PoolStats:
+        """
+        Snapshot of pool usage counters.
+
+        Returns:
+            PoolStats: Current size, in-use/idle/waiting counts, cumulative wait times and
+                the number of broken connections that were discarded and replaced.
+        """
+        size = self._pool.get_size() if self._pool else 0
+        idle = self._pool.get_idle_size() if self._pool else 0
+        return PoolStats(
+            size=size,
+            in_use=size - idle,
+            idle=idle,
+            waiting=self._waiting,
+            acquisitions=self._acquisitions,
+            total_wait_time=self._total_wait,
+            max_wait_time=self._max_wait,
+            reconnects=self._reconnects,
+        )
+
+    async def close(self) -> None:
+        """Gracefully close the pool; it is reopened on next use."""
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
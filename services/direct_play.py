@@ -0,0 +1,110 @@
+import asyncio
+import os
+import subprocess
+from dataclasses import dataclass
+
+
+@dataclass
+class DirectPlayProfile:
+    video_codecs: tuple[str, ...] = ("avc1",)
+    audio_codecs: tuple[str, ...] = ("mp4a",)
+    container: str = "mp4"
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.video_codecs or self.audio_codecs)
+
+
+def _codec_filter(field: str, codecs: tuple[str, ...]) -> str:
+    return f"[{field}~='^({'|'.join(codecs)})']" if codecs else ""
+
+
+def format_selector(profile: DirectPlayProfile) -> str:
+    """
+    Build a yt-dlp format selector that prefers streams the clients can direct-play.
+
+    Tries the best video and audio streams with the profile's codecs first, then a single file
+    with both, and falls back to the overall best formats if YouTube offers neither.
+
+    Parameters:
+        profile (DirectPlayProfile): Codec prefixes as reported by yt-dlp (e.g. avc1, hevc, mp4a).
+
+    Returns:
+        str: Value for the yt-dlp 'format' option.
+    """
+    if not profile.enabled:
+        return "bestvideo+bestaudio/best"
+    video = _codec_filter("vcodec", profile.video_codecs)
+    audio = _codec_filter("acodec", profile.audio_codecs)
+    return f"bv*{video}+ba{audio}/b{video}{audio}/bestvideo+bestaudio/best"
+
+
+def _matches(codec: str | None, codecs: tuple[str, ...]) -> bool:
+    return not codecs or not codec or codec == "none" or codec.startswith(codecs)
+
+
+def needs_remux(info: dict, profile: DirectPlayProfile) -> bool:
+    """
+    Check whether a downloaded video has direct-playable codecs in the wrong container.
+
+    Videos with other codecs are left alone: fixing them would need a re-encode, which Jellyfin
+    does on demand anyway.
+
+    Parameters:
+        info (dict): yt-dlp info dict of the downloaded video.
+        profile (DirectPlayProfile): Target codecs and container.
+
+    Returns:
+        bool: True if a stream copy into `profile.container` makes the video direct-playable.
+    """
+    return (profile.enabled
+            and info.get("ext") != profile.container
+            and _matches(info.get("vcodec"), profile.video_codecs)
+            and _matches(info.get("acodec"), profile.audio_codecs))
+
+
+async def remux(path: str, container: str) -> str:
+    """
+    Copy the video and audio streams of `path` into a `container` file without re-encoding.
+
+    Runs ffmpeg as an asyncio subprocess, which is killed if the caller is cancelled. The source
+    file is replaced by the remuxed one only after ffmpeg succeeded.
+
+    Parameters:
+        path (str): Downloaded file.
+        container (str): Target container extension, e.g. mp4.
+
+    Returns:
+        str: Path of the remuxed file.
+
+    Raises:
+        subprocess.CalledProcessError: If ffmpeg fails; the source file is kept.
+    """
+    base = os.path.splitext(path)[0]
+    target = f"{base}.{container}"
+    partial = f"{base}.remux.{container}"
+    args = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", path,
+            "-map", "0:v?", "-map", "0:a?", "-c", "copy"]
+    if container in ("mp4", "m4v", "mov"):
+        # Index at the start of the file, so clients can start playback before reading it all
+        args += ["-movflags", "+faststart"]
+    args.append(partial)
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        try:
+            _, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        if process.returncode:
+            raise subprocess.CalledProcessError(process.returncode, args, stderr=stderr)
+        os.replace(partial, target)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    # yt-dlp may name a file by the target extension while reporting another container in 'ext'
+    if path != target:
+        os.remove(path)
+    return target
@@ -0,0 +1,594 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from services.db import AsyncConnectionPool, DBConfig, PoolStats
+from services.metrics import DOWNLOAD_JOBS, register_pool
+from services.youtube_urls import canonical_video_url
+
+JOBS_CHANNEL = "download_jobs"
+
+
+@dataclass
+class DownloadJob:
+    job_id: int
+    url: str
+    chat_id: int
+    video_id: str | None = None
+    message_id: int | None = None
+    attempts: int = 0
+    kind: str = "video"
+    parent_job_id: int | None = None
+    disk_waited: float | None = None
+    title: str | None = None
+    expected_bytes: int | None = None
+
+
+@dataclass
+class CollectionSummary:
+    job_id: int
+    chat_id: int
+    title: str | None
+    done: int
+    failed: int
+
+
+@dataclass
+class DiskReservation:
+    job_id: int
+    url: str
+    title: str | None
+    worker_id: str | None
+    reserved_bytes: int
+
+
+@dataclass
+class EnqueueResult:
+    job_id: int
+    state: str
+    created: bool
+    position: int = 0
+    title: str | None = None
+
+
+class DownloadJobService:
+    def __init__(self, config: DBConfig):
+        """
+        Durable download job queue stored in the 'download_jobs' table.
+
+        Jobs move through the states queued -> running -> done/failed. Workers claim queued jobs
+        with FOR UPDATE SKIP LOCKED, so any number of worker processes can share the queue without
+        handing out a job twice. Each video is downloaded at most once (see enqueue()).
+        Running jobs are kept alive by heartbeats; jobs of a worker that
+        died are put back in the queue by requeue_stale(). State changes of a running job only apply
+        while the calling worker still owns it, so a worker whose job was requeued and claimed by
+        another worker cannot overwrite the new owner's result. Every enqueue sends a NOTIFY on the
+        'download_jobs' channel so idle workers wake up without polling. Running jobs reserve the
+        disk space they need with reserve_space(); a job that does not fit is put back in the queue
+        for a while with defer() instead of holding its worker slot. Playlists and channels are queued as collection
+        jobs, which a worker expands into one child job per video (see enqueue_collection()).
+
+        Parameters:
+            config (DBConfig): Database configuration parameters, including pool sizing.
+        """
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self.pool = AsyncConnectionPool(config)
+        register_pool("download_jobs", self.pool)
+        self._listen_conn = None
+        self._listener = None
+
+    @asynccontextmanager
+    async def get_connection(self):
+        """
+        Provides an async context manager that borrows a connection from the pool.
+
+        Yields:
+            asyncpg.Connection: A pooled connection, released back to the pool on exit.
+        """
+        async with self.pool.connection() as conn:
+            yield conn
+
+    def get_pool_stats(self) -> PoolStats:
+        """
+        Return usage statistics of the service's connection pool.
+        """
+        return self.pool.stats()
+
+    async def close(self) -> None:
+        """
+        Stop listening for new jobs and close the service's connection pool.
+        """
+        await self.stop_listening()
+        await self.pool.close()
+
+    async def enqueue(
+        self, url: str, video_id: str, chat_id: int, message_id: int | None = None
+    ) -> EnqueueResult:
+        """
+        Queue a video for download unless it is already downloaded or being downloaded.
+
+        The 'download_jobs' table doubles as an index of videos keyed by `video_id`: a unique index
+        allows at most one queued, running or finished job per video. A request for a video that is
+        already queued or running attaches the chat as a watcher that gets notified together with
+        the original requester; a request for a finished video is answered from the index. New jobs
+        wake up idle workers with a NOTIFY. Everything happens in the 'enqueue_download' database
+        function in a single round trip.
+
+        Parameters:
+            url (str): Canonical URL of the video.
+            video_id (str): YouTube video ID used for deduplication.
+            chat_id (int): Chat to notify about the download.
+            message_id (int | None): Status message of the chat that may be edited with progress.
+
+        Returns:
+            EnqueueResult: The job the request was attached to, its state, whether it was created
+            by this call, its queue position for new jobs (1 means next to start) and the title of
+            already downloaded videos.
+        """
+        async with self.get_connection() as conn:
+            row = await conn.fetchrow(
+                """
+                SELECT e.job_id, e.state, e.title, e.created,
+                       CASE WHEN e.created THEN
+                           (SELECT COUNT(*) FROM download_jobs d
+                            WHERE d.state = 'queued' AND d.job_id < e.job_id) + 1
+                       ELSE 0 END AS position
+                FROM enqueue_download($1, $2, $3, $4) e
+                """,
+                url, video_id, chat_id, message_id
+            )
+        return EnqueueResult(**dict(row))
+
+    async def enqueue_collection(
+        self, url: str, chat_id: int, message_id: int | None = None
+    ) -> EnqueueResult:
+        """
+        Queue a playlist or channel to be expanded into individual video jobs by a worker.
+
+        Parameters:
+            url (str): Canonical URL of the playlist or channel.
+            chat_id (int): Chat to notify about the downloads.
+            message_id (int | None): Status message of the chat.
+
+        Returns:
+            EnqueueResult: The new collection job and its queue position.
+        """
+        async with self.get_connection() as conn:
+            row = await conn.fetchrow(
+                """
+                WITH job AS (
+                    INSERT INTO download_jobs (url, chat_id, message_id, kind)
+                    VALUES ($1, $2, $3, 'collection')
+                    RETURNING job_id, state
+                )
+                SELECT job.job_id, job.state, TRUE AS created,
+                       (SELECT COUNT(*) FROM download_jobs d WHERE d.state = 'queued') + 1 AS position,
+                       pg_notify($4, job.job_id::text)
+                FROM job
+                """,
+                url, chat_id, message_id, JOBS_CHANNEL
+            )
+        return EnqueueResult(job_id=row["job_id"], state=row["state"], created=True,
+                             position=row["position"])
+
+    async def expand_collection(
+        self, parent: DownloadJob, worker_id: str, title: str, video_ids: list[str]
+    ) -> int | None:
+        """
+        Queue the videos of a collection job as its children and mark the collection job as done.
+
+        Videos that are already queued, running or downloaded are skipped by the unique index on
+        `video_id`, which makes the queue an incremental download archive: expanding the same
+        playlist again only queues its new (or previously failed) videos.
+
+        Parameters:
+            parent (DownloadJob): The collection job being expanded.
+            worker_id (str): Identifier of the worker running the collection job.
+            title (str): Title of the playlist or channel.
+            video_ids (list[str]): YouTube video IDs of the collection's entries.
+
+        Returns:
+            int | None: Number of jobs queued, or None if the worker no longer owns the collection job.
+        """
+        async with self.get_connection() as conn:
+            async with conn.transaction():
+                owned = await conn.fetchval(
+                    """
+                    UPDATE download_jobs
+                    SET state = 'done', title = $3, error = NULL, finished_at = CURRENT_TIMESTAMP
+                    WHERE job_id = $1 AND worker_id = $2 AND state = 'running'
+                    RETURNING TRUE
+                    """,
+                    parent.job_id, worker_id, title
+                )
+                if not owned:
+                    self._log_lost(parent.job_id, worker_id)
+                    return None
+                queued = await conn.fetchval(
+                    """
+                    WITH inserted AS (
+                        INSERT INTO download_jobs (url, video_id, chat_id, parent_job_id)
+                        SELECT v.url, v.video_id, $3, $4
+                        FROM unnest($1::text[], $2::text[]) WITH ORDINALITY AS v (url, video_id, n)
+                        ORDER BY v.n
+                        ON CONFLICT (video_id) WHERE state <> 'failed' DO NOTHING
+                        RETURNING job_id
+                    )
+                    SELECT COUNT(*) FROM inserted
+                    """,
+                    [canonical_video_url(video_id) for video_id in video_ids], video_ids,
+                    parent.chat_id, parent.job_id
+                )
+                if queued:
+                    await conn.execute("SELECT pg_notify($1, '')", JOBS_CHANNEL)
+        return queued
+
+    async def finish_collection(self, parent_job_id: int) -> CollectionSummary | None:
+        """
+        Mark a collection as finished once none of its children is queued or running any more.
+
+        Returns the summary only to the one caller that finished the collection, so it is reported
+        exactly once even when several workers finish its last videos at the same time.
+
+        Parameters:
+            parent_job_id (int): ID of the collection job.
+
+        Returns:
+            CollectionSummary | None: Counts of downloaded and failed children, or None if the
+            collection is still in progress or was already finished.
+        """
+        async with self.get_connection() as conn:
+            row = await conn.fetchrow(
+                """
+                UPDATE download_jobs p
+                SET children_finished_at = CURRENT_TIMESTAMP
+                WHERE p.job_id = $1
+                  AND p.children_finished_at IS NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM download_jobs c
+                      WHERE c.parent_job_id = p.job_id AND c.state IN ('queued', 'running')
+                  )
+                RETURNING p.job_id, p.chat_id, p.title,
+                    (SELECT COUNT(*) FROM download_jobs c
+                     WHERE c.parent_job_id = p.job_id AND c.state = 'done') AS done,
+                    (SELECT COUNT(*) FROM download_jobs c
+                     WHERE c.parent_job_id = p.job_id AND c.state = 'failed') AS failed
+                """,
+                parent_job_id
+            )
+        return CollectionSummary(**dict(row)) if row else None
+
+    async def get_watchers(self, job_id: int) -> list[int]:
+        """
+        Return the chats that attached to a job after it was queued by someone else.
+
+        Parameters:
+            job_id (int): ID of the job.
+
+        Returns:
+            list[int]: Chat IDs to notify in addition to the job's own chat.
+        """
+        async with self.get_connection() as conn:
+            rows = await conn.fetch(
+                "SELECT chat_id FROM download_job_watchers WHERE job_id = $1",
+                job_id
+            )
+        return [row["chat_id"] for row in rows]
+
+    async def claim(self, worker_id: str) -> DownloadJob | None:
+        """
+        Atomically take the oldest queued job and mark it as running by `worker_id`.
+
+        Jobs deferred with defer() are skipped until their delay has passed.
+
+        Parameters:
+            worker_id (str): Identifier of the claiming worker, stored on the job for diagnostics.
+
+        Returns:
+            DownloadJob | None: The claimed job, or None if no queued job is ready to run.
+        """
+        async with self.get_connection() as conn:
+            row = await conn.fetchrow(
+                """
+                UPDATE download_jobs
+                SET state = 'running',
+                    attempts = attempts + 1,
+                    worker_id = $1,
+                    reserved_bytes = 0,
+                    started_at = CURRENT_TIMESTAMP,
+                    heartbeat_at = CURRENT_TIMESTAMP
+                WHERE job_id = (
+                    SELECT job_id
+                    FROM download_jobs
+                    WHERE state = 'queued'
+                      AND (not_before IS NULL OR not_before <= CURRENT_TIMESTAMP)
+                    ORDER BY job_id
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING job_id, url, video_id, chat_id, message_id, attempts, kind, parent_job_id,
+                    EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - disk_wait_since)::float8 AS disk_waited,
+                    title, expected_bytes
+                """,
+                worker_id
+            )
+        return DownloadJob(**dict(row)) if row else None
+
+    def _log_lost(self, job_id: int, worker_id: str) -> None:
+        self.logger.warning(f"Download job {job_id} is no longer owned by worker {worker_id}")
+
+    async def heartbeat(self, worker_id: str, job_ids: list[int]) -> set[int]:
+        """
+        Mark running jobs as still alive so requeue_stale() leaves them alone.
+
+        Parameters:
+            worker_id (str): Identifier of the calling worker.
+            job_ids (list[int]): IDs of the jobs the calling worker is running.
+
+        Returns:
+            set[int]: IDs of the jobs the worker still owns. The others were requeued or finished
+            by someone else, and their work must be abandoned.
+        """
+        if not job_ids:
+            return set()
+        async with self.get_connection() as conn:
+            rows = await conn.fetch(
+                """
+                UPDATE download_jobs
+                SET heartbeat_at = CURRENT_TIMESTAMP
+                WHERE job_id = ANY($2::bigint[]) AND worker_id = $1 AND state = 'running'
+                RETURNING job_id
+                """,
+                worker_id, job_ids
+            )
+        return {row["job_id"] for row in rows}
+
+    async def complete(self, job_id: int, worker_id: str, title: str | None = None) -> bool:
+        """
+        Mark a job as successfully finished.
+
+        Parameters:
+            job_id (int): ID of the finished job.
+            worker_id (str): Identifier of the worker running the job.
+            title (str | None): Title of the downloaded video.
+
+        Returns:
+            bool: False if the worker no longer owns the job, which is then left unchanged.
+        """
+        async with self.get_connection() as conn:
+            owned = await conn.fetchval(
+                """
+                UPDATE download_jobs
+                SET state = 'done', title = $3, error = NULL, finished_at = CURRENT_TIMESTAMP
+                WHERE job_id = $1 AND worker_id = $2 AND state = 'running'
+                RETURNING TRUE
+                """,
+                job_id, worker_id, title
+            )
+        if not owned:
+            self._log_lost(job_id, worker_id)
+            return False
+        DOWNLOAD_JOBS.labels("done").inc()
+        return True
+
+    async def fail(self, job_id: int, worker_id: str, error: str, title: str | None = None) -> bool:
+        """
+        Mark a job as failed.
+
+        Parameters:
+            job_id (int): ID of the failed job.
+            worker_id (str): Identifier of the worker running the job.
+            error (str): Description of the failure.
+            title (str | None): Title of the video, if it was already known.
+
+        Returns:
+            bool: False if the worker no longer owns the job, which is then left unchanged.
+        """
+        async with self.get_connection() as conn:
+            owned = await conn.fetchval(
+                """
+                UPDATE download_jobs
+                SET state = 'failed', title = COALESCE($4, title), error = $3,
+                    finished_at = CURRENT_TIMESTAMP
+                WHERE job_id = $1 AND worker_id = $2 AND state = 'running'
+                RETURNING TRUE
+                """,
+                job_id, worker_id, error, title
+            )
+        if not owned:
+            self._log_lost(job_id, worker_id)
+            return False
+        DOWNLOAD_JOBS.labels("failed").inc()
+        return True
+
+    async def release(self, job_id: int, worker_id: str) -> None:
+        """
+        Put a running job back in the queue, e.g. when its worker shuts down.
+
+        Parameters:
+            job_id (int): ID of the job to release.
+            worker_id (str): Identifier of the worker running the job; jobs owned by others are left alone.
+        """
+        async with self.get_connection() as conn:
+            await conn.execute(
+                """
+                WITH job AS (
+                    UPDATE download_jobs
+                    SET state = 'queued', worker_id = NULL, heartbeat_at = NULL
+                    WHERE job_id = $1 AND worker_id = $2 AND state = 'running'
+                    RETURNING job_id
+                )
+                SELECT pg_notify($3, job_id::text) FROM job
+                """,
+                job_id, worker_id, JOBS_CHANNEL
+            )
+
+    async def defer(
+        self, job_id: int, worker_id: str, delay: float, expected_bytes: int, title: str | None = None
+    ) -> bool:
+        """
+        Put a running job back in the queue until `delay` seconds have passed, while there is not
+        enough disk space for it.
+
+        The claim does not count as an attempt. The time of the first deferral is kept, so the
+        worker can tell how long the job has been waiting in total (see DownloadJob.disk_waited).
+        The expected size and the title are stored with the job and returned by the next claim(),
+        so the worker can check the disk space again without extracting the video info.
+
+        Parameters:
+            job_id (int): ID of the job to defer.
+            worker_id (str): Identifier of the worker running the job.
+            delay (float): Seconds before the job may be claimed again.
+            expected_bytes (int): Disk space the job waits for.
+            title (str | None): Title of the video, if it is known.
+
+        Returns:
+            bool: False if the worker no longer owns the job, which is then left unchanged.
+        """
+        async with self.get_connection() as conn:
+            owned = await conn.fetchval(
+                """
+                UPDATE download_jobs
+                SET state = 'queued',
+                    attempts = attempts - 1,
+                    worker_id = NULL,
+                    heartbeat_at = NULL,
+                    reserved_bytes = 0,
+                    not_before = CURRENT_TIMESTAMP + make_interval(secs => $3),
+                    disk_wait_since = COALESCE(disk_wait_since, CURRENT_TIMESTAMP),
+                    expected_bytes = $4,
+                    title = COALESCE($5, title)
+                WHERE job_id = $1 AND worker_id = $2 AND state = 'running'
+                RETURNING TRUE
+                """,
+                job_id, worker_id, delay, expected_bytes, title
+            )
+        if not owned:
+            self._log_lost(job_id, worker_id)
+            return False
+        return True
+
+    async def requeue_stale(self, stale_timeout: float, max_attempts: int) -> int:
+        """
+        Recover jobs whose worker stopped sending heartbeats.
+
+        Jobs that have been attempted fewer than `max_attempts` times go back to the queue; the others fail.
+
+        Parameters:
+            stale_timeout (float): Seconds without heartbeat after which a running job is considered lost.
+            max_attempts (int): Maximum number of times a job may be claimed.
+
+        Returns:
+            int: Number of recovered jobs.
+        """
+        async with self.get_connection() as conn:
+            rows = await conn.fetch(
+                """
+                UPDATE download_jobs
+                SET state = CASE WHEN attempts < $2 THEN 'queued' ELSE 'failed' END,
+                    error = CASE WHEN attempts < $2 THEN error ELSE 'Worker lost' END,
+                    finished_at = CASE WHEN attempts < $2 THEN NULL ELSE CURRENT_TIMESTAMP END,
+                    worker_id = NULL,
+                    heartbeat_at = NULL
+                WHERE state = 'running'
+                  AND heartbeat_at < CURRENT_TIMESTAMP - make_interval(secs => $1)
+                RETURNING job_id, state
+                """,
+                stale_timeout, max_attempts
+            )
+            if any(row["state"] == "queued" for row in rows):
+                await conn.execute("SELECT pg_notify($1, '')", JOBS_CHANNEL)
+        for row in rows:
+            self.logger.warning(f"Recovered stale download job {row['job_id']} as {row['state']}")
+            if row["state"] == "failed":
+                DOWNLOAD_JOBS.labels("failed").inc()
+        return len(rows)
+
+    async def reserve_space(
+        self, job_id: int, worker_id: str, size: int, free_bytes: int, floor_bytes: int
+    ) -> bool:
+        """
+        Reserve disk space for a running job if it fits next to the reservations of other running jobs.
+
+        The check and the reservation happen atomically across all workers, under an advisory lock
+        in the 'reserve_disk_space' database function. Reservations count while the job is running.
+
+        Parameters:
+            job_id (int): ID of the running job.
+            worker_id (str): Identifier of the worker running the job.
+            size (int): Bytes the download is expected to need.
+            free_bytes (int): Free space currently reported for the download directory.
+            floor_bytes (int): Free space that must remain after all reservations.
+
+        Returns:
+            bool: True if the space was reserved, False if it does not fit right now or the worker
+            no longer owns the job.
+        """
+        async with self.get_connection() as conn:
+            return await conn.fetchval(
+                "SELECT reserve_disk_space($1, $2, $3, $4, $5)",
+                job_id, worker_id, size, free_bytes, floor_bytes
+            )
+
+    async def get_reservations(self) -> list[DiskReservation]:
+        """
+        Return the disk space reservations of running jobs.
+
+        Returns:
+            list[DiskReservation]: Running jobs that hold a reservation, largest first.
+        """
+        async with self.get_connection() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT job_id, url, title, worker_id, reserved_bytes
+                FROM download_jobs
+                WHERE state = 'running' AND reserved_bytes > 0
+                ORDER BY reserved_bytes DESC
+                """
+            )
+        return [DiskReservation(**dict(row)) for row in rows]
+
+    async def count_jobs(self) -> dict[str, int]:
+        """
+        Count queued and running jobs.
+
+        Returns:
+            dict[str, int]: Number of jobs per active state ('queued', 'running').
+        """
+        async with self.get_connection() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT 'queued' AS state, COUNT(*) AS jobs FROM download_jobs WHERE state = 'queued'
+                UNION ALL
+                SELECT 'running', COUNT(*) FROM download_jobs WHERE state = 'running'
+                """
+            )
+        return {row["state"]: row["jobs"] for row in rows}
+
+    async def start_listening(self) -> asyncio.Event:
+        """
+        Subscribe to new-job notifications on a dedicated pooled connection.
+
+        Returns:
+            asyncio.Event: Event that is set whenever a job is enqueued or released.
+        """
+        event = asyncio.Event()
+        self._listener = lambda *_: event.set()
+        self._listen_conn = await (await self.pool.get_pool()).acquire()
+        await self._listen_conn.add_listener(JOBS_CHANNEL, self._listener)
+        return event
+
+    async def stop_listening(self) -> None:
+        """
+        Unsubscribe from new-job notifications and return the listening connection to the pool.
+        """
+        if self._listen_conn is None:
+            return
+        try:
+            await self._listen_conn.remove_listener(JOBS_CHANNEL, self._listener)
+        finally:
+            await (await self.pool.get_pool()).release(self._listen_conn)
+            self._listen_conn = None
+            self._listener = None
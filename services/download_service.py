@@ -0,0 +1,447 @@
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from dataclasses import dataclass, field
+
+import yt_dlp
+from telegram import Bot
+from telegram.error import BadRequest
+from yt_dlp.utils import DownloadCancelled, format_bytes
+
+from services.direct_play import DirectPlayProfile, format_selector, needs_remux, remux
+from services.download_job_service import DownloadJob, DownloadJobService
+from services.jellyfin_service import JellyfinService
+from services.metrics import DOWNLOAD_ACTIVE, DOWNLOAD_BYTES, DOWNLOAD_QUEUE
+from services.youtube_listing import list_collection
+
+
+@dataclass
+class DownloadConfig:
+    videos_dir: str
+    max_workers: int = 2
+    video_format: str | None = None
+    direct_play: DirectPlayProfile = field(default_factory=DirectPlayProfile)
+    remux_workers: int = 1
+    poll_interval: float = 30.0
+    heartbeat_interval: float = 30.0
+    stale_timeout: float = 300.0
+    max_attempts: int = 3
+    progress_interval: float = 3.0
+    collection_max_entries: int = 1000
+    min_free_space: int = 10 * 1024 ** 3
+    disk_wait_timeout: float = 3600.0
+    disk_check_interval: float = 60.0
+    unknown_size: int = 2 * 1024 ** 3
+
+
+class DownloadService:
+    def __init__(self, config: DownloadConfig, job_service: DownloadJobService,
+                 jellyfin_service: JellyfinService,
+                 source_url: Callable[[DownloadJob], str] | None = None):
+        """
+        Download worker that executes jobs from the durable queue with yt-dlp.
+
+        Up to `max_workers` jobs run concurrently, each claimed from DownloadJobService and executed
+        with yt-dlp as a library in a dedicated thread pool. Video info is extracted once per job, and
+        the same info dict serves the notifications, format selection and the download. Any number of
+        worker processes may run against the same queue. Idle slots wake up on queue notifications and
+        fall back to polling every `poll_interval` seconds. Running jobs send heartbeats, and jobs left
+        behind by crashed workers are requeued. A job whose heartbeat shows that it was requeued and
+        taken over by another worker is abandoned: its download stops and its result is not reported.
+
+        Download progress is shown by editing the status message the job was submitted from. Updates
+        are coalesced per chat: only the latest one is sent, at most once per `progress_interval`
+        seconds, and only if its text changed.
+
+        Before downloading, a job reserves the expected size of the selected formats on the videos
+        volume; at least `min_free_space` bytes must stay free after all reservations. Formats
+        without a known size (HLS, DASH) are estimated from their bitrate and the duration, or
+        assumed to need `unknown_size` bytes. A job that does not fit goes back to the queue and
+        is retried every `disk_check_interval` seconds, leaving its slot to other jobs, for up to
+        `disk_wait_timeout` seconds in total; it is rejected right away if it could never fit. The
+        retries reuse the size stored with the job and extract the video info only once the space
+        is reserved.
+
+        Unless `video_format` is set explicitly, formats are chosen so that Jellyfin clients can
+        direct-play them (see `direct_play`). Downloads with direct-playable codecs in another
+        container are remuxed by stream copy in ffmpeg subprocesses, at most `remux_workers` at a
+        time, so ffmpeg does not compete with the download threads.
+
+        Collection jobs (playlists and channels) are expanded into one child job per video, at most
+        `collection_max_entries`, which then run across all workers. Children report failures
+        individually and success once for the whole collection.
+
+        Parameters:
+            config (DownloadConfig): Target directory and worker tuning.
+            job_service (DownloadJobService): Queue the jobs are claimed from.
+            jellyfin_service (JellyfinService): Refreshes the library after finished downloads.
+            source_url (Callable[[DownloadJob], str] | None): Returns the URL a video job is
+                downloaded from; by default the job's own URL. The benchmarks use it to fetch
+                videos from a fake media server (see benchmarks/bench_worker.py).
+        """
+        self.config = config
+        self.job_service = job_service
+        self.jellyfin_service = jellyfin_service
+        self.source_url = source_url
+        self.logger = logging.getLogger(__name__)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._executor: ThreadPoolExecutor | None = None
+        self._remux_slots: asyncio.Semaphore | None = None
+        self._running: dict[int, DownloadJob] = {}
+        # Задания, которые requeue_stale() отдал другому воркеру; их загрузка прерывается
+        self._lost: set[int] = set()
+        self._wakeup: asyncio.Event | None = None
+        self._bot: Bot | None = None
+        self._progress: dict[int, tuple[int, str]] = {}
+        self._progress_sent: dict[int, str] = {}
+        self._stopping = threading.Event()
+        DOWNLOAD_ACTIVE.set_function(lambda: len(self._running))
+
+    @property
+    def active_jobs(self) -> int:
+        return len(self._running)
+
+    async def run(self, bot: Bot) -> None:
+        """
+        Process jobs until cancelled. On cancellation, unfinished jobs are released back to the queue.
+
+        A job is released only after its yt-dlp thread has finished, so no other worker starts the
+        same download while this one is still writing the file. Running downloads are stopped at
+        their next progress update.
+
+        Parameters:
+            bot (Bot): Bot used to notify users about their downloads.
+        """
+        self._bot = bot
+        self._stopping.clear()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.config.max_workers, thread_name_prefix="download")
+        self._remux_slots = asyncio.Semaphore(self.config.remux_workers)
+        self._wakeup = await self.job_service.start_listening()
+        tasks = [
+            asyncio.create_task(self._slot(), name=f"download-slot-{i}")
+            for i in range(self.config.max_workers)
+        ]
+        tasks.append(asyncio.create_task(self._heartbeat(), name="download-heartbeat"))
+        tasks.append(asyncio.create_task(self._progress_loop(), name="download-progress"))
+        self.logger.info(f"Download worker {self.worker_id} started with {self.config.max_workers} slots")
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            self._stopping.set()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.job_service.stop_listening()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _slot(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                job = await self.job_service.claim(self.worker_id)
+            except Exception as e:
+                self.logger.error(f"Failed to claim a download job: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.config.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._running[job.job_id] = job
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                await asyncio.shield(self.job_service.release(job.job_id, self.worker_id))
+                raise
+            except Exception as e:
+                self.logger.exception(f"Download job {job.job_id} for {job.url} failed")
+                try:
+                    await self.job_service.fail(job.job_id, self.worker_id, str(e))
+                except Exception as fail_error:
+                    # The job stays running and is requeued by requeue_stale once its heartbeats stop
+                    self.logger.error(f"Failed to mark download job {job.job_id} as failed: {fail_error}")
+            finally:
+                self._running.pop(job.job_id, None)
+                self._lost.discard(job.job_id)
+
+            if job.parent_job_id is not None:
+                await self._finish_collection(job.parent_job_id)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.heartbeat_interval)
+            try:
+                running = list(self._running)
+                owned = await self.job_service.heartbeat(self.worker_id, running)
+                for job_id in set(running) - owned:
+                    if job_id in self._running and job_id not in self._lost:
+                        self.logger.warning(f"Download job {job_id} was taken over by another worker, abandoning it")
+                        self._lost.add(job_id)
+                await self.job_service.requeue_stale(
+                    self.config.stale_timeout, self.config.max_attempts)
+                for state, jobs in (await self.job_service.count_jobs()).items():
+                    DOWNLOAD_QUEUE.labels(state).set(jobs)
+            except Exception as e:
+                self.logger.error(f"Download job heartbeat failed: {e}")
+
+    async def _progress_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.progress_interval)
+            pending, self._progress = self._progress, {}
+            for chat_id, (message_id, text) in pending.items():
+                if self._progress_sent.get(chat_id) == text:
+                    continue
+                self._progress_sent[chat_id] = text
+                try:
+                    await self._bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text)
+                except BadRequest as e:
+                    self.logger.debug(f"Progress message in chat {chat_id} was not edited: {e}")
+                except Exception as e:
+                    self.logger.error(f"Failed to edit progress message in chat {chat_id}: {e}")
+
+            active_chats = {job.chat_id for job in self._running.values()} | self._progress.keys()
+            for chat_id in self._progress_sent.keys() - active_chats:
+                del self._progress_sent[chat_id]
+
+    def _set_progress(self, job: DownloadJob, text: str) -> None:
+        if job.message_id is not None:
+            self._progress[job.chat_id] = (job.message_id, text)
+
+    def _progress_hook(self, job: DownloadJob, title: str, loop: asyncio.AbstractEventLoop):
+        counted = {}
+
+        def hook(status: dict) -> None:
+            # Called from the download thread; the update is handed over to the event loop
+            if self._stopping.is_set():
+                raise DownloadCancelled("Download worker is stopping")
+            if job.job_id in self._lost:
+                raise DownloadCancelled("Download job was taken over by another worker")
+            if status.get("status") != "downloading":
+                return
+            total = status.get("total_bytes") or status.get("total_bytes_estimate")
+            downloaded = status.get("downloaded_bytes") or 0
+            # Video and audio formats are downloaded one after another, each counting from zero
+            filename = status.get("filename")
+            DOWNLOAD_BYTES.inc(max(downloaded - counted.get(filename, 0), 0))
+            counted[filename] = downloaded
+            parts = [f"{downloaded * 100 // total}%" if total else format_bytes(downloaded)]
+            if status.get("speed"):
+                parts.append(f"{format_bytes(status['speed'])}/s")
+            if status.get("eta") is not None:
+                parts.append(f"осталось {int(status['eta'])} с")
+            text = f"Загрузка: {title}\n" + " · ".join(parts)
+            loop.call_soon_threadsafe(self._set_progress, job, text)
+        return hook
+
+    def _expected_size(self, info: dict) -> int:
+        formats = info.get("requested_formats") or [info]
+        # info carries ext and codecs of the selected formats, so the remux is known in advance
+        remuxed = needs_remux(info, self.config.direct_play)
+        duration = info.get("duration")
+        size = 0
+        for f in formats:
+            format_size = f.get("filesize") or f.get("filesize_approx")
+            if not format_size and f.get("tbr") and duration:
+                # HLS and DASH formats usually have no size, only a bitrate in kbit/s
+                format_size = int(f["tbr"] * 1000 / 8 * duration)
+            if not format_size:
+                return self.config.unknown_size
+            size += format_size
+        # Merging keeps the video and audio parts on disk until the merged file is written, and a
+        # remux keeps the download until its copy is written. The parts are deleted before the
+        # remux starts, so the two peaks do not add up.
+        return size * 2 if len(formats) > 1 or remuxed else size
+
+    async def _reserve_space(self, job: DownloadJob, title: str, size: int) -> bool:
+        usage = shutil.disk_usage(self.config.videos_dir)
+        if size + self.config.min_free_space > usage.total:
+            reason = f"needs {size} bytes, volume has {usage.total}"
+            message = f"Видео слишком большое для диска библиотеки: {title}."
+        elif await self.job_service.reserve_space(
+                job.job_id, self.worker_id, size, usage.free, self.config.min_free_space):
+            return True
+        elif job.disk_waited is None or job.disk_waited < self.config.disk_wait_timeout:
+            # The job waits in the queue rather than in this slot, which takes the next job meanwhile
+            if not await self.job_service.defer(
+                    job.job_id, self.worker_id, self.config.disk_check_interval, size, title):
+                return False
+            if job.disk_waited is None:
+                self.logger.info(f"Download job {job.job_id} waits for {size} bytes of disk space")
+                await self._notify(
+                    job, f"Недостаточно места на диске, загрузка ожидает освобождения места: {title}.")
+            self._set_progress(job, f"Ожидание места на диске: {title}")
+            return False
+        else:
+            reason = f"no disk space for {size} bytes after {self.config.disk_wait_timeout:.0f}s"
+            message = f"Загрузка отменена: на диске так и не освободилось место для {title}."
+
+        if await self.job_service.fail(job.job_id, self.worker_id, reason, title):
+            self._set_progress(job, message)
+            await self._notify(job, message)
+        return False
+
+    def _ydl_options(self) -> dict:
+        return {
+            "format": self.config.video_format or format_selector(self.config.direct_play),
+            "outtmpl": os.path.join(self.config.videos_dir, "%(title)s.%(ext)s"),
+            "noplaylist": True,
+            "quiet": True,
+            "no_warnings": True,
+            "noprogress": True,
+        }
+
+    async def _in_thread(self, fn, *args):
+        future = self._executor.submit(fn, *args)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # A running thread cannot be interrupted; wait for it before the job is released
+            if not future.done():
+                await asyncio.get_running_loop().run_in_executor(None, wait_futures, [future])
+            raise
+
+    def _extract_info(self, ydl: yt_dlp.YoutubeDL, url: str) -> dict:
+        return ydl.extract_info(url, download=False)
+
+    def _download(self, ydl: yt_dlp.YoutubeDL, info: dict) -> dict:
+        # Reuses the extracted info dict, so the page, player and formats are not fetched again
+        return ydl.process_ie_result(info, download=True)
+
+    async def _remux_if_needed(self, job: DownloadJob, title: str, info: dict) -> None:
+        # A format selector with several alternatives separated by commas downloads several files
+        downloads = [d for d in info.get("requested_downloads") or []
+                     if needs_remux(d, self.config.direct_play)]
+        if not downloads:
+            return
+        self._set_progress(job, f"Перепаковываю видео для Jellyfin: {title}")
+        for download in downloads:
+            path = download["filepath"]
+            try:
+                async with self._remux_slots:
+                    path = await remux(path, self.config.direct_play.container)
+                self.logger.info(f"Remuxed {job.url} to {path}")
+            except Exception as e:
+                # The original file stays in the library and is still playable with transcoding
+                self.logger.error(f"Failed to remux {path}: {e}")
+
+    async def _notify(self, job: DownloadJob, text: str) -> None:
+        chat_ids = [job.chat_id]
+        try:
+            chat_ids += await self.job_service.get_watchers(job.job_id)
+        except Exception as e:
+            self.logger.error(f"Failed to load watchers of download job {job.job_id}: {e}")
+
+        for chat_id in chat_ids:
+            try:
+                await self._bot.send_message(chat_id=chat_id, text=text)
+            except Exception as e:
+                self.logger.error(f"Failed to notify chat {chat_id}: {e}")
+
+    async def _run(self, job: DownloadJob) -> None:
+        if job.kind == "collection":
+            await self._expand_collection(job)
+            return
+        with yt_dlp.YoutubeDL(self._ydl_options()) as ydl:
+            await self._run_with(ydl, job)
+
+    async def _expand_collection(self, job: DownloadJob) -> None:
+        try:
+            listing = await self._in_thread(list_collection, job.url, self.config.collection_max_entries)
+        except Exception as e:
+            self.logger.error(f"Failed to list entries of {job.url}: {e}")
+            if await self.job_service.fail(job.job_id, self.worker_id, str(e)):
+                await self._notify(job, f"Ошибка: Не удалось получить список видео по ссылке {job.url}.")
+            return
+
+        title, video_ids = listing.title, listing.video_ids
+        queued = await self.job_service.expand_collection(job, self.worker_id, title, video_ids)
+        if queued is None:
+            return
+        self.logger.info(f"Expanded {job.url} into {queued} of {len(video_ids)} videos")
+
+        if queued:
+            await self._notify(
+                job, f"Плейлист «{title}»: поставлено в очередь новых видео: {queued}, "
+                     f"уже загружено или загружается: {len(video_ids) - queued}.")
+        else:
+            await self._notify(job, f"Плейлист «{title}»: все видео ({len(video_ids)}) уже загружены или загружаются.")
+            await self._finish_collection(job.job_id)
+
+    async def _finish_collection(self, parent_job_id: int) -> None:
+        try:
+            summary = await self.job_service.finish_collection(parent_job_id)
+        except Exception as e:
+            self.logger.error(f"Failed to check collection job {parent_job_id}: {e}")
+            return
+        if summary is None or not (summary.done or summary.failed):
+            return
+        text = f"Плейлист «{summary.title}» загружен: видео загружено: {summary.done}"
+        if summary.failed:
+            text += f", с ошибкой: {summary.failed}"
+        try:
+            await self._bot.send_message(chat_id=summary.chat_id, text=text + ".")
+        except Exception as e:
+            self.logger.error(f"Failed to notify chat {summary.chat_id}: {e}")
+
+    async def _run_with(self, ydl: yt_dlp.YoutubeDL, job: DownloadJob) -> None:
+        loop = asyncio.get_running_loop()
+
+        # A deferred job waits for the size stored at its first attempt, without extracting the info again
+        reserved = job.expected_bytes is not None
+        if reserved and not await self._reserve_space(job, job.title or job.url, job.expected_bytes):
+            return
+
+        try:
+            url = self.source_url(job) if self.source_url else job.url
+            info = await self._in_thread(self._extract_info, ydl, url)
+        except Exception as e:
+            self.logger.error(f"Failed to extract info for {job.url}: {e}")
+            if await self.job_service.fail(job.job_id, self.worker_id, str(e)):
+                await self._notify(
+                    job, f"Ошибка: Не удалось получить информацию о видео по ссылке {job.url}.")
+            return
+
+        title = info.get("title") or job.url
+        uploader = info.get("uploader") or "неизвестного автора"
+        if not reserved and not await self._reserve_space(job, title, self._expected_size(info)):
+            return
+        if job.parent_job_id is None:
+            # Videos of a playlist are reported once for the whole playlist
+            await self._notify(job, f"Начинаю загрузку: {title} от {uploader}.")
+        ydl.add_progress_hook(self._progress_hook(job, title, loop))
+
+        try:
+            info = await self._in_thread(self._download, ydl, info)
+        except Exception as e:
+            self.logger.error(f"Failed to download {job.url}: {e}")
+            if await self.job_service.fail(job.job_id, self.worker_id, str(e), title):
+                self._set_progress(job, f"Ошибка при загрузке видео: {title}.")
+                await self._notify(job, f"Ошибка при загрузке видео: {title}.")
+            return
+
+        if job.job_id in self._lost:
+            # The new owner downloads the video again and reports it
+            self.logger.warning(f"Discarding the download of {job.url}: the job was taken over")
+            return
+        await self._remux_if_needed(job, title, info)
+
+        if not await self.job_service.complete(job.job_id, self.worker_id, title):
+            return
+        self._set_progress(job, f"Загрузка завершена: {title}")
+        self.jellyfin_service.request_refresh()
+
+        if job.parent_job_id is None:
+            await self._notify(
+                job, f"Загрузка завершена: {title}. Видео скоро появится в библиотеке Jellyfin.")
@@ -0,0 +1,67 @@
+import logging
+from dataclasses import dataclass
+
+from telegram.ext import CallbackContext, JobQueue
+
+from services.async_user_service import AsyncUserService
+
+
+@dataclass
+class HistoryRetentionConfig:
+    retention_days: int = 0
+    archive_schema: str | None = None
+    premake_months: int = 2
+    interval: float = 86400.0
+    first_run: float = 60.0
+
+
+class HistoryRetention:
+    def __init__(self, config: HistoryRetentionConfig, user_service: AsyncUserService):
+        """
+        Periodic maintenance of the monthly 'users_hist' partitions, run on the Application's JobQueue.
+
+        Every `interval` seconds partitions are created for the next `premake_months` months, so
+        status changes never land in the default partition, and months older than `retention_days`
+        are dropped (or moved to `archive_schema`) as whole partitions. A retention of 0 days keeps
+        the whole history.
+
+        Parameters:
+            config (HistoryRetentionConfig): Retention period and job schedule.
+            user_service (AsyncUserService): Service owning the 'users_hist' table.
+        """
+        self.config = config
+        self.user_service = user_service
+        self.logger = logging.getLogger(__name__)
+
+    def start(self, job_queue: JobQueue) -> None:
+        """
+        Register the periodic maintenance run on the JobQueue.
+
+        Parameters:
+            job_queue (JobQueue): The Application's job queue.
+        """
+        job_queue.run_repeating(self._run, interval=self.config.interval,
+                                first=self.config.first_run, name="users_hist_retention")
+
+    async def _run(self, context: CallbackContext) -> None:
+        await self.run()
+
+    async def run(self) -> list[str]:
+        """
+        Run the maintenance once.
+
+        Returns:
+            list[str]: Names of the partitions dropped or archived.
+        """
+        try:
+            created, expired = await self.user_service.maintain_history(
+                self.config.premake_months, self.config.retention_days, self.config.archive_schema)
+        except Exception as e:
+            self.logger.error(f"Failed to maintain users_hist partitions: {e}")
+            return []
+        if created:
+            self.logger.info(f"Created {created} users_hist partitions")
+        if expired:
+            action = f"archived to schema {self.config.archive_schema}" if self.config.archive_schema else "dropped"
+            self.logger.info(f"Expired users_hist partitions {action}: {', '.join(expired)}")
+        return expired
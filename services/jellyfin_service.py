@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+
+import httpx
+
+
+@dataclass
+class JellyfinConfig:
+    api_url: str
+    api_key: str
+    media_id: str = ""
+    refresh_delay: float = 30.0
+    request_timeout: float = 30.0
+
+
+class JellyfinService:
+    # Key of Jellyfin's "Scan Media Library" scheduled task
+    LIBRARY_SCAN_TASK_KEY = "RefreshLibrary"
+
+    def __init__(self, config: JellyfinConfig):
+        """
+        Debounced Jellyfin library refresh.
+
+        Every finished download calls request_refresh(). Requests that arrive within `refresh_delay`
+        seconds of each other are coalesced into one refresh. The refresh targets the folder
+        `media_id` when it is configured and falls back to a full library scan otherwise. While
+        Jellyfin is already scanning the library, or the refresh fails, it is retried after another
+        `refresh_delay`.
+
+        Parameters:
+            config (JellyfinConfig): Jellyfin API endpoint, credentials, target folder and refresh delay.
+        """
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self._client: httpx.AsyncClient | None = None
+        self._task: asyncio.Task | None = None
+        self._dirty = False
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.config.api_url,
+                headers={"X-Emby-Token": self.config.api_key},
+                timeout=self.config.request_timeout,
+            )
+        return self._client
+
+    def request_refresh(self) -> None:
+        """
+        Schedule a library refresh; returns immediately.
+
+        Must be called from the event loop. A refresh already scheduled absorbs the request, and a
+        request that arrives during a running refresh schedules one more refresh after it.
+        """
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop(), name="jellyfin-refresh")
+
+    async def _refresh_loop(self) -> None:
+        while self._dirty:
+            await asyncio.sleep(self.config.refresh_delay)
+            try:
+                if await self._is_scan_running():
+                    self.logger.info("Jellyfin library scan is running, postponing refresh")
+                    continue
+                # Cleared before the request, so a request_refresh() during it schedules another one
+                self._dirty = False
+                await self._refresh()
+            except Exception as e:
+                # Retried after another refresh_delay
+                self._dirty = True
+                self.logger.error(f"Failed to refresh Jellyfin library: {e}")
+
+    async def _is_scan_running(self) -> bool:
+        response = await self._get_client().get("/ScheduledTasks", params={"isHidden": "false"})
+        response.raise_for_status()
+        return any(
+            task.get("Key") == self.LIBRARY_SCAN_TASK_KEY and task.get("State") == "Running"
+            for task in response.json()
+        )
+
+    async def _refresh(self) -> None:
+        if self.config.media_id:
+            response = await self._get_client().post(
+                f"/Items/{self.config.media_id}/Refresh",
+                params={
+                    "Recursive": "true",
+                    "MetadataRefreshMode": "Default",
+                    "ImageRefreshMode": "Default",
+                    "ReplaceAllMetadata": "false",
+                    "ReplaceAllImages": "false",
+                },
+            )
+        else:
+            response = await self._get_client().post("/Library/Refresh")
+        response.raise_for_status()
+        self.logger.info(f"Jellyfin refresh requested for {self.config.media_id or 'the whole library'}")
+
+    async def close(self) -> None:
+        """
+        Cancel the refresh timer, run a pending refresh right away and close the HTTP client.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._dirty:
+            self._dirty = False
+            try:
+                await self._refresh()
+            except Exception as e:
+                self.logger.error(f"Failed to refresh Jellyfin library: {e}")
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
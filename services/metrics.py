@@ -0,0 +1,188 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import REGISTRY, CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from services.db import PoolStats
+
+# Очереди к базе и Telegram — миллисекунды, загрузки и обработчики — до минут
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+HANDLER_LATENCY = Histogram(
+    "bot_handler_duration_seconds", "Time spent in a bot update handler", ["handler"],
+    buckets=LATENCY_BUCKETS)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors", "Bot update handlers that raised an exception", ["handler"])
+USER_QUERY_LATENCY = Histogram(
+    "user_service_query_duration_seconds",
+    "Time a user service query holds a database connection, including waiting for it", ["query"],
+    buckets=LATENCY_BUCKETS)
+TELEGRAM_LATENCY = Histogram(
+    "telegram_api_request_duration_seconds",
+    "Bot API request latency, excluding time spent waiting for the rate limiter", ["endpoint"],
+    buckets=LATENCY_BUCKETS)
+TELEGRAM_FLOOD_WAITS = Counter(
+    "telegram_api_flood_waits", "Bot API requests answered with 429 Too Many Requests", ["endpoint"])
+DOWNLOAD_QUEUE = Gauge(
+    "download_queue_jobs", "Download jobs in the shared queue, as last seen by this worker", ["state"])
+DOWNLOAD_ACTIVE = Gauge(
+    "download_active_jobs", "Download jobs being processed by this worker")
+DOWNLOAD_BYTES = Counter(
+    "download_bytes", "Bytes downloaded by this worker; rate() gives the download speed")
+DOWNLOAD_JOBS = Counter(
+    "download_jobs_finished", "Download jobs finished by this process", ["result"])
+
+
+class PoolCollector(Collector):
+    def __init__(self):
+        """
+        Reports the usage statistics of registered connection pools at scrape time.
+        """
+        self._pools: dict[str, object] = {}
+
+    def register(self, name: str, pool) -> None:
+        self._pools[name] = pool
+
+    def collect(self):
+        connections = GaugeMetricFamily(
+            "db_pool_connections", "Open database connections per pool", labels=["pool", "state"])
+        waiting = GaugeMetricFamily(
+            "db_pool_waiting", "Borrowers waiting for a database connection", labels=["pool"])
+        acquisitions = CounterMetricFamily(
+            "db_pool_acquisitions", "Database connections handed out", labels=["pool"])
+        wait_time = CounterMetricFamily(
+            "db_pool_wait_seconds", "Time spent waiting for database connections", labels=["pool"])
+        reconnects = CounterMetricFamily(
+            "db_pool_reconnects", "Broken pooled connections replaced", labels=["pool"])
+        for name, pool in list(self._pools.items()):
+            stats: PoolStats = pool.stats()
+            connections.add_metric([name, "in_use"], stats.in_use)
+            connections.add_metric([name, "idle"], stats.idle)
+            waiting.add_metric([name], stats.waiting)
+            acquisitions.add_metric([name], stats.acquisitions)
+            wait_time.add_metric([name], stats.total_wait_time)
+            reconnects.add_metric([name], stats.reconnects)
+        yield from (connections, waiting, acquisitions, wait_time, reconnects)
+
+
+POOLS = PoolCollector()
+REGISTRY.register(POOLS)
+
+
+def register_pool(name: str, pool) -> None:
+    """
+    Export the statistics of a connection pool as db_pool_* metrics.
+
+    Parameters:
+        name (str): Value of the 'pool' label.
+        pool (AsyncConnectionPool): Pool providing stats().
+    """
+    POOLS.register(name, pool)
+
+
+def timed_handler(handler):
+    """
+    Decorator that records the latency and errors of an async update handler.
+
+    The handler's function name is used as the 'handler' label.
+    """
+    name = handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.labels(name).inc()
+            raise
+        finally:
+            HANDLER_LATENCY.labels(name).observe(time.perf_counter() - started)
+    return wrapper
+
+
+@dataclass
+class MetricsConfig:
+    port: int = 9100
+    listen: str = "0.0.0.0"
+    heartbeat_interval: float = 5.0
+    liveness_timeout: float = 60.0
+
+
+class MetricsServer:
+    def __init__(self, config: MetricsConfig):
+        """
+        HTTP endpoint with Prometheus metrics on /metrics and a liveness probe on /healthz.
+
+        The server runs in a daemon thread, so scrapes keep working while the event loop is busy.
+        Liveness is judged by a heartbeat task on the event loop: /healthz answers 503 once the
+        heartbeat is older than `liveness_timeout` seconds, i.e. when the loop is blocked or dead,
+        which a process check cannot see.
+
+        Parameters:
+            config (MetricsConfig): Listen address, port and liveness thresholds.
+        """
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self._server: ThreadingHTTPServer | None = None
+        self._heartbeat: asyncio.Task | None = None
+        self._last_beat = time.monotonic()
+
+    @property
+    def is_alive(self) -> bool:
+        return time.monotonic() - self._last_beat < self.config.liveness_timeout
+
+    def start(self) -> None:
+        """
+        Start the HTTP server and the event loop heartbeat; must be called from the event loop.
+        """
+        metrics_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    status, content_type, body = 200, CONTENT_TYPE_LATEST, generate_latest(REGISTRY)
+                elif self.path == "/healthz":
+                    alive = metrics_server.is_alive
+                    status, content_type, body = (200 if alive else 503), "text/plain", (b"ok" if alive else b"stalled")
+                else:
+                    status, content_type, body = 404, "text/plain", b"not found"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._last_beat = time.monotonic()
+        self._heartbeat = asyncio.create_task(self._beat(), name="metrics-heartbeat")
+        self._server = ThreadingHTTPServer((self.config.listen, self.config.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        self.logger.info(f"Metrics endpoint listening on {self.config.listen}:{self.config.port}")
+
+    async def _beat(self) -> None:
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.config.heartbeat_interval)
+
+    async def stop(self) -> None:
+        """
+        Stop the heartbeat and the HTTP server.
+        """
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        if self._server is not None:
+            await asyncio.to_thread(self._server.shutdown)
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,595 @@
+import logging
+from dataclasses import dataclass
+
+import asyncpg
+
+from services.db import DBConfig
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки, под которой применяются миграции
+MIGRATIONS_LOCK_ID = 4_730_015_125
+
+SCHEMA_MIGRATIONS_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    sql: str
+
+
+# Миграции применяются по возрастанию версии, каждая в своей транзакции и ровно один раз.
+# Применённую миграцию не меняют: изменения схемы добавляются новой миграцией в конец списка.
+# Миграции 1-4 повторяют прежнюю DDL, выполнявшуюся при каждом запуске, и написаны
+# идемпотентно, чтобы базы, созданные до появления schema_migrations, принимали их без ошибок.
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(1, "users", """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id BIGINT PRIMARY KEY,
+            approved BOOLEAN DEFAULT FALSE,
+            pending BOOLEAN DEFAULT FALSE,
+            row_added_timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+        -- Несекционированная история из прежних версий переносится в секционированную таблицу ниже
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('users_hist') AND relkind = 'r') THEN
+                ALTER TABLE users_hist RENAME TO users_hist_legacy;
+                ALTER TABLE users_hist_legacy RENAME CONSTRAINT users_hist_pkey TO users_hist_legacy_pkey;
+                ALTER SEQUENCE IF EXISTS users_hist_row_id_seq RENAME TO users_hist_legacy_row_id_seq;
+            END IF;
+        END;
+        $$;
+        -- История статусов секционирована по месяцам (UTC) row_changed_timestamp:
+        -- старые месяцы удаляются или архивируются целиком, без массовых DELETE
+        CREATE TABLE IF NOT EXISTS users_hist (
+            row_id BIGSERIAL,
+            user_id BIGINT NOT NULL,
+            approved BOOLEAN,
+            pending BOOLEAN,
+            row_added_timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+            row_changed_timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+            PRIMARY KEY (row_id, row_changed_timestamp),
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        ) PARTITION BY RANGE (row_changed_timestamp);
+        -- Страховка на случай, если секция месяца не была создана заранее
+        CREATE TABLE IF NOT EXISTS users_hist_default PARTITION OF users_hist DEFAULT;
+        -- История пользователя и проверка внешнего ключа при удалении из users
+        CREATE INDEX IF NOT EXISTS users_hist_user_id_idx ON users_hist (user_id);
+        CREATE OR REPLACE FUNCTION users_hist_create_partitions(
+            from_ts TIMESTAMP WITH TIME ZONE,
+            to_ts TIMESTAMP WITH TIME ZONE
+        ) RETURNS INTEGER AS $$
+        DECLARE
+            month TIMESTAMP := date_trunc('month', from_ts AT TIME ZONE 'UTC');
+            lower_bound TIMESTAMP WITH TIME ZONE;
+            upper_bound TIMESTAMP WITH TIME ZONE;
+            part TEXT;
+            created INTEGER := 0;
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtext('users_hist_partitions'));
+            WHILE month <= to_ts AT TIME ZONE 'UTC' LOOP
+                part := 'users_hist_p' || to_char(month, 'YYYYMM');
+                lower_bound := month AT TIME ZONE 'UTC';
+                upper_bound := (month + INTERVAL '1 month') AT TIME ZONE 'UTC';
+                IF to_regclass(part) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I (LIKE users_hist INCLUDING DEFAULTS)', part);
+                    -- Строки этого месяца, попавшие в секцию по умолчанию, переезжают в новую секцию
+                    EXECUTE format(
+                        'WITH moved AS (DELETE FROM users_hist_default WHERE row_changed_timestamp >= %L '
+                        'AND row_changed_timestamp < %L RETURNING *) INSERT INTO %I SELECT * FROM moved',
+                        lower_bound, upper_bound, part);
+                    EXECUTE format('ALTER TABLE users_hist ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                                   part, lower_bound, upper_bound);
+                    created := created + 1;
+                END IF;
+                month := month + INTERVAL '1 month';
+            END LOOP;
+            RETURN created;
+        END;
+        $$ LANGUAGE plpgsql;
+        CREATE OR REPLACE FUNCTION users_hist_expire_partitions(
+            cutoff TIMESTAMP WITH TIME ZONE,
+            archive_schema TEXT
+        ) RETURNS SETOF TEXT AS $$
+        DECLARE
+            part TEXT;
+            fk TEXT;
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtext('users_hist_partitions'));
+            FOR part IN
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'users_hist'::regclass
+                  AND c.relname ~ '^users_hist_p[0-9]{6}$'
+                  AND (to_date(substr(c.relname, 13), 'YYYYMM') + INTERVAL '1 month') AT TIME ZONE 'UTC' <= cutoff
+                ORDER BY c.relname
+            LOOP
+                EXECUTE format('ALTER TABLE users_hist DETACH PARTITION %I', part);
+                IF archive_schema IS NULL THEN
+                    EXECUTE format('DROP TABLE %I', part);
+                ELSE
+                    -- Архивная копия не должна мешать удалению пользователей
+                    FOR fk IN SELECT conname FROM pg_constraint WHERE conrelid = part::regclass AND contype = 'f' LOOP
+                        EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', part, fk);
+                    END LOOP;
+                    EXECUTE format('CREATE SCHEMA IF NOT EXISTS %I', archive_schema);
+                    EXECUTE format('ALTER TABLE %I SET SCHEMA %I', part, archive_schema);
+                END IF;
+                RETURN NEXT part;
+            END LOOP;
+            IF archive_schema IS NULL THEN
+                DELETE FROM users_hist_default WHERE row_changed_timestamp < cutoff;
+            END IF;
+        END;
+        $$ LANGUAGE plpgsql;
+        DO $$
+        BEGIN
+            IF to_regclass('users_hist_legacy') IS NOT NULL THEN
+                PERFORM users_hist_create_partitions(
+                    (SELECT min(row_changed_timestamp) FROM users_hist_legacy), CURRENT_TIMESTAMP);
+                INSERT INTO users_hist (row_id, user_id, approved, pending, row_added_timestamp, row_changed_timestamp)
+                SELECT row_id, user_id, approved, pending, row_added_timestamp, row_changed_timestamp
+                FROM users_hist_legacy;
+                PERFORM setval(pg_get_serial_sequence('users_hist', 'row_id'),
+                               (SELECT COALESCE(max(row_id), 0) + 1 FROM users_hist), FALSE);
+                DROP TABLE users_hist_legacy;
+            END IF;
+        END;
+        $$;
+        SELECT users_hist_create_partitions(CURRENT_TIMESTAMP, CURRENT_TIMESTAMP + INTERVAL '2 months');
+        DROP FUNCTION IF EXISTS update_user_status(bigint, boolean, boolean);
+        CREATE OR REPLACE FUNCTION update_user_status(
+            new_user_id BIGINT,
+            new_approved BOOLEAN,
+            new_pending BOOLEAN
+        ) RETURNS VOID AS $$
+        DECLARE
+            current_timestamp_val TIMESTAMP WITH TIME ZONE := CURRENT_TIMESTAMP;
+        BEGIN
+            -- Добавление строки в историческую таблицу
+            INSERT INTO users_hist (user_id, approved, pending, row_added_timestamp, row_changed_timestamp)
+            SELECT user_id, approved, pending, row_added_timestamp, current_timestamp_val
+            FROM users
+            WHERE user_id = new_user_id;
+
+            -- Обновление статуса пользователя
+            UPDATE users
+            SET approved = new_approved,
+                pending = new_pending,
+                row_added_timestamp = current_timestamp_val
+            WHERE user_id = new_user_id;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP FUNCTION IF EXISTS update_user_status(bigint[], boolean, boolean);
+        CREATE OR REPLACE FUNCTION update_user_status(
+            new_user_ids BIGINT[],
+            new_approved BOOLEAN,
+            new_pending BOOLEAN
+        ) RETURNS SETOF BIGINT AS $$
+            -- Массовый вариант: история и обновление одним оператором
+            WITH hist AS (
+                INSERT INTO users_hist (user_id, approved, pending, row_added_timestamp, row_changed_timestamp)
+                SELECT user_id, approved, pending, row_added_timestamp, CURRENT_TIMESTAMP
+                FROM users
+                WHERE user_id = ANY(new_user_ids)
+            )
+            UPDATE users
+            SET approved = new_approved,
+                pending = new_pending,
+                row_added_timestamp = CURRENT_TIMESTAMP
+            WHERE user_id = ANY(new_user_ids)
+            RETURNING user_id;
+        $$ LANGUAGE sql;
+        DROP FUNCTION IF EXISTS get_or_register_user(bigint);
+        CREATE OR REPLACE FUNCTION get_or_register_user(
+            new_user_id BIGINT
+        ) RETURNS TABLE (approved BOOLEAN, pending BOOLEAN, was_created BOOLEAN) AS $$
+        #variable_conflict use_column
+        DECLARE
+            cur_approved BOOLEAN;
+            cur_pending BOOLEAN;
+        BEGIN
+            -- Новый пользователь сразу попадает в список заявок
+            INSERT INTO users (user_id, approved, pending)
+            VALUES (new_user_id, FALSE, TRUE)
+            ON CONFLICT (user_id) DO NOTHING;
+            IF FOUND THEN
+                RETURN QUERY SELECT FALSE, TRUE, TRUE;
+                RETURN;
+            END IF;
+
+            SELECT u.approved, u.pending INTO cur_approved, cur_pending
+            FROM users u
+            WHERE u.user_id = new_user_id
+            FOR UPDATE;
+
+            -- Ранее отклонённый пользователь подаёт заявку повторно
+            IF NOT cur_approved AND NOT cur_pending THEN
+                PERFORM update_user_status(new_user_id, FALSE, TRUE);
+                RETURN QUERY SELECT FALSE, TRUE, TRUE;
+                RETURN;
+            END IF;
+
+            RETURN QUERY SELECT cur_approved, cur_pending, FALSE;
+        END;
+        $$ LANGUAGE plpgsql;
+        -- Частичный индекс для постраничного списка заявок
+        CREATE INDEX IF NOT EXISTS users_pending_idx
+            ON users (row_added_timestamp, user_id)
+            WHERE pending;
+        -- Счётчик заявок, поддерживаемый триггером, вместо COUNT(*) на каждой странице
+        CREATE TABLE IF NOT EXISTS users_counters (
+            name TEXT PRIMARY KEY,
+            value BIGINT NOT NULL
+        );
+        INSERT INTO users_counters (name, value)
+        SELECT 'pending', COUNT(*) FROM users WHERE pending
+        ON CONFLICT (name) DO NOTHING;
+        CREATE OR REPLACE FUNCTION users_pending_counter() RETURNS TRIGGER AS $$
+        DECLARE
+            delta BIGINT := 0;
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                IF OLD.pending THEN
+                    delta := delta - 1;
+                END IF;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                IF NEW.pending THEN
+                    delta := delta + 1;
+                END IF;
+            END IF;
+            IF delta <> 0 THEN
+                UPDATE users_counters SET value = value + delta WHERE name = 'pending';
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS users_pending_counter ON users;
+        CREATE TRIGGER users_pending_counter
+            AFTER INSERT OR UPDATE OF pending OR DELETE ON users
+            FOR EACH ROW EXECUTE FUNCTION users_pending_counter();
+    """),
+    Migration(2, "download_jobs", """
+        CREATE TABLE IF NOT EXISTS download_jobs (
+            job_id BIGSERIAL PRIMARY KEY,
+            url TEXT NOT NULL,
+            video_id TEXT,
+            chat_id BIGINT NOT NULL,
+            message_id BIGINT,
+            state TEXT NOT NULL DEFAULT 'queued'
+                CHECK (state IN ('queued', 'running', 'done', 'failed')),
+            attempts INT NOT NULL DEFAULT 0,
+            worker_id TEXT,
+            title TEXT,
+            error TEXT,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP WITH TIME ZONE,
+            heartbeat_at TIMESTAMP WITH TIME ZONE,
+            finished_at TIMESTAMP WITH TIME ZONE
+        );
+        -- Очередь выбирается по частичным индексам, завершённые задания их не раздувают
+        CREATE INDEX IF NOT EXISTS download_jobs_queued_idx
+            ON download_jobs (job_id)
+            WHERE state = 'queued';
+        CREATE INDEX IF NOT EXISTS download_jobs_running_idx
+            ON download_jobs (heartbeat_at)
+            WHERE state = 'running';
+        -- Индекс загруженных и загружаемых видео: одно видео — не более одного живого задания
+        CREATE UNIQUE INDEX IF NOT EXISTS download_jobs_video_idx
+            ON download_jobs (video_id)
+            WHERE state <> 'failed';
+        -- Пользователи, присоединившиеся к уже идущей загрузке
+        CREATE TABLE IF NOT EXISTS download_job_watchers (
+            job_id BIGINT NOT NULL REFERENCES download_jobs (job_id) ON DELETE CASCADE,
+            chat_id BIGINT NOT NULL,
+            PRIMARY KEY (job_id, chat_id)
+        );
+        DROP FUNCTION IF EXISTS enqueue_download(text, text, bigint, bigint);
+        CREATE OR REPLACE FUNCTION enqueue_download(
+            new_url TEXT,
+            new_video_id TEXT,
+            new_chat_id BIGINT,
+            new_message_id BIGINT
+        ) RETURNS TABLE (job_id BIGINT, state TEXT, title TEXT, created BOOLEAN) AS $$
+        #variable_conflict use_column
+        DECLARE
+            existing RECORD;
+        BEGIN
+            LOOP
+                INSERT INTO download_jobs (url, video_id, chat_id, message_id)
+                VALUES (new_url, new_video_id, new_chat_id, new_message_id)
+                ON CONFLICT (video_id) WHERE state <> 'failed' DO NOTHING
+                RETURNING download_jobs.job_id INTO existing;
+                IF FOUND THEN
+                    PERFORM pg_notify('download_jobs', existing.job_id::text);
+                    RETURN QUERY SELECT existing.job_id, 'queued'::TEXT, NULL::TEXT, TRUE;
+                    RETURN;
+                END IF;
+
+                SELECT d.job_id, d.state, d.title, d.chat_id INTO existing
+                FROM download_jobs d
+                WHERE d.video_id = new_video_id AND d.state <> 'failed'
+                FOR SHARE;
+                -- Задание могло завершиться ошибкой между вставкой и чтением — пробуем снова
+                CONTINUE WHEN NOT FOUND;
+
+                IF existing.state IN ('queued', 'running') AND existing.chat_id <> new_chat_id THEN
+                    INSERT INTO download_job_watchers (job_id, chat_id)
+                    VALUES (existing.job_id, new_chat_id)
+                    ON CONFLICT DO NOTHING;
+                END IF;
+                RETURN QUERY SELECT existing.job_id, existing.state, existing.title, FALSE;
+                RETURN;
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql;
+        -- Место на диске, зарезервированное выполняющимся заданием
+        ALTER TABLE download_jobs ADD COLUMN IF NOT EXISTS reserved_bytes BIGINT NOT NULL DEFAULT 0;
+        CREATE OR REPLACE FUNCTION reserve_disk_space(
+            res_job_id BIGINT,
+            res_bytes BIGINT,
+            free_bytes BIGINT,
+            floor_bytes BIGINT
+        ) RETURNS BOOLEAN AS $$
+        DECLARE
+            reserved BIGINT;
+        BEGIN
+            -- Резервирования всех воркеров проверяются по очереди
+            PERFORM pg_advisory_xact_lock(hashtext('reserve_disk_space'));
+            SELECT COALESCE(SUM(reserved_bytes), 0) INTO reserved
+            FROM download_jobs
+            WHERE state = 'running' AND job_id <> res_job_id;
+            IF free_bytes - reserved - res_bytes < floor_bytes THEN
+                RETURN FALSE;
+            END IF;
+            UPDATE download_jobs SET reserved_bytes = res_bytes WHERE job_id = res_job_id;
+            RETURN TRUE;
+        END;
+        $$ LANGUAGE plpgsql;
+        -- Плейлисты и каналы: задание-коллекция разворачивается в дочерние задания по видео
+        ALTER TABLE download_jobs ADD COLUMN IF NOT EXISTS kind TEXT NOT NULL DEFAULT 'video'
+            CHECK (kind IN ('video', 'collection'));
+        ALTER TABLE download_jobs ADD COLUMN IF NOT EXISTS parent_job_id BIGINT;
+        ALTER TABLE download_jobs ADD COLUMN IF NOT EXISTS children_finished_at TIMESTAMP WITH TIME ZONE;
+        CREATE INDEX IF NOT EXISTS download_jobs_parent_idx
+            ON download_jobs (parent_job_id)
+            WHERE parent_job_id IS NOT NULL;
+    """),
+    Migration(3, "subscriptions", """
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            subscription_id BIGSERIAL PRIMARY KEY,
+            chat_id BIGINT NOT NULL,
+            url TEXT NOT NULL,
+            title TEXT,
+            -- Секунды между проверками канала
+            check_interval INT NOT NULL CHECK (check_interval > 0),
+            -- Сколько видео канала может одновременно стоять в очереди или загружаться
+            max_downloads INT NOT NULL CHECK (max_downloads > 0),
+            next_check_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            last_checked_at TIMESTAMP WITH TIME ZONE,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (chat_id, url)
+        );
+        CREATE INDEX IF NOT EXISTS subscriptions_next_check_idx
+            ON subscriptions (next_check_at);
+        -- Видео канала, которые подписка уже видела: поставленные в очередь и бывшие на канале при подписке
+        CREATE TABLE IF NOT EXISTS subscription_videos (
+            subscription_id BIGINT NOT NULL REFERENCES subscriptions (subscription_id) ON DELETE CASCADE,
+            video_id TEXT NOT NULL,
+            seen_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (subscription_id, video_id)
+        );
+    """),
+    Migration(4, "bot_persistence", """
+        CREATE TABLE IF NOT EXISTS bot_user_data (
+            user_id BIGINT PRIMARY KEY,
+            data BYTEA NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+
+        CREATE TABLE IF NOT EXISTS bot_conversations (
+            name TEXT NOT NULL,
+            key BIGINT[] NOT NULL,
+            state BYTEA NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (name, key)
+        );
+    """),
+    Migration(5, "bulk_status_pending_only", """
+        -- Массовое одобрение и отклонение меняют только ожидающие заявки: устаревший список
+        -- страницы или /reject не должны пересматривать уже одобренных или отклонённых
+        CREATE OR REPLACE FUNCTION update_user_status(
+            new_user_ids BIGINT[],
+            new_approved BOOLEAN,
+            new_pending BOOLEAN
+        ) RETURNS SETOF BIGINT AS $$
+            WITH hist AS (
+                INSERT INTO users_hist (user_id, approved, pending, row_added_timestamp, row_changed_timestamp)
+                SELECT user_id, approved, pending, row_added_timestamp, CURRENT_TIMESTAMP
+                FROM users
+                WHERE user_id = ANY(new_user_ids) AND pending
+            )
+            UPDATE users
+            SET approved = new_approved,
+                pending = new_pending,
+                row_added_timestamp = CURRENT_TIMESTAMP
+            WHERE user_id = ANY(new_user_ids) AND pending
+            RETURNING user_id;
+        $$ LANGUAGE sql;
+    """),
+    Migration(6, "download_jobs_deferral", """
+        -- Задание, которому не хватило места на диске, возвращается в очередь до not_before,
+        -- а не держит слот воркера; disk_wait_since отсчитывает общее время ожидания места
+        ALTER TABLE download_jobs ADD COLUMN IF NOT EXISTS not_before TIMESTAMP WITH TIME ZONE;
+        ALTER TABLE download_jobs ADD COLUMN IF NOT EXISTS disk_wait_since TIMESTAMP WITH TIME ZONE;
+        CREATE OR REPLACE FUNCTION reserve_disk_space(
+            res_job_id BIGINT,
+            res_bytes BIGINT,
+            free_bytes BIGINT,
+            floor_bytes BIGINT
+        ) RETURNS BOOLEAN AS $$
+        DECLARE
+            reserved BIGINT;
+        BEGIN
+            -- Резервирования всех воркеров проверяются по очереди
+            PERFORM pg_advisory_xact_lock(hashtext('reserve_disk_space'));
+            SELECT COALESCE(SUM(reserved_bytes), 0) INTO reserved
+            FROM download_jobs
+            WHERE state = 'running' AND job_id <> res_job_id;
+            IF free_bytes - reserved - res_bytes < floor_bytes THEN
+                RETURN FALSE;
+            END IF;
+            -- Место получено: ожидание закончено
+            UPDATE download_jobs
+            SET reserved_bytes = res_bytes, not_before = NULL, disk_wait_since = NULL
+            WHERE job_id = res_job_id;
+            RETURN TRUE;
+        END;
+        $$ LANGUAGE plpgsql;
+    """),
+    Migration(7, "update_users_status", """
+        -- Массовый вариант получает своё имя: перегрузка по BIGINT[] делала неоднозначным
+        -- вызов update_user_status с нетипизированными параметрами
+        DROP FUNCTION IF EXISTS update_user_status(BIGINT[], BOOLEAN, BOOLEAN);
+        CREATE OR REPLACE FUNCTION update_users_status(
+            new_user_ids BIGINT[],
+            new_approved BOOLEAN,
+            new_pending BOOLEAN
+        ) RETURNS SETOF BIGINT AS $$
+            -- Меняются только ожидающие заявки
+            WITH hist AS (
+                INSERT INTO users_hist (user_id, approved, pending, row_added_timestamp, row_changed_timestamp)
+                SELECT user_id, approved, pending, row_added_timestamp, CURRENT_TIMESTAMP
+                FROM users
+                WHERE user_id = ANY(new_user_ids) AND pending
+            )
+            UPDATE users
+            SET approved = new_approved,
+                pending = new_pending,
+                row_added_timestamp = CURRENT_TIMESTAMP
+            WHERE user_id = ANY(new_user_ids) AND pending
+            RETURNING user_id;
+        $$ LANGUAGE sql;
+    """),
+    Migration(8, "reserve_disk_space_owner", """
+        -- Резервирует место только воркер, который владеет заданием: задание, переданное
+        -- requeue_stale() другому воркеру, не должно затирать его резервирование
+        DROP FUNCTION IF EXISTS reserve_disk_space(BIGINT, BIGINT, BIGINT, BIGINT);
+        CREATE OR REPLACE FUNCTION reserve_disk_space(
+            res_job_id BIGINT,
+            res_worker_id TEXT,
+            res_bytes BIGINT,
+            free_bytes BIGINT,
+            floor_bytes BIGINT
+        ) RETURNS BOOLEAN AS $$
+        DECLARE
+            reserved BIGINT;
+        BEGIN
+            -- Резервирования всех воркеров проверяются по очереди
+            PERFORM pg_advisory_xact_lock(hashtext('reserve_disk_space'));
+            SELECT COALESCE(SUM(reserved_bytes), 0) INTO reserved
+            FROM download_jobs
+            WHERE state = 'running' AND job_id <> res_job_id;
+            IF free_bytes - reserved - res_bytes < floor_bytes THEN
+                RETURN FALSE;
+            END IF;
+            -- Место получено: ожидание закончено
+            UPDATE download_jobs
+            SET reserved_bytes = res_bytes, not_before = NULL, disk_wait_since = NULL
+            WHERE job_id = res_job_id AND worker_id = res_worker_id AND state = 'running';
+            RETURN FOUND;
+        END;
+        $$ LANGUAGE plpgsql;
+    """),
+    Migration(9, "download_jobs_expected_bytes", """
+        -- Размер, которого отложенное задание ждёт на диске: при повторной попытке место
+        -- проверяется по нему, без повторного извлечения информации о видео
+        ALTER TABLE download_jobs ADD COLUMN IF NOT EXISTS expected_bytes BIGINT;
+    """),
+)
+
+
+def _pending(applied: set[int]) -> list[Migration]:
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+
+async def _applied(conn: asyncpg.Connection) -> set[int]:
+    if not await conn.fetchval("SELECT to_regclass('schema_migrations') IS NOT NULL"):
+        return set()
+    return {row["version"] for row in await conn.fetch("SELECT version FROM schema_migrations")}
+
+
+async def migrate(conn: asyncpg.Connection) -> list[Migration]:
+    """
+    Bring the database schema up to date by applying the pending migrations.
+
+    When every migration is already recorded in 'schema_migrations' this costs two catalog reads
+    and takes no locks, so starting more bot or worker replicas does not block the running ones.
+    Otherwise the migrations are applied under a session advisory lock: concurrently starting
+    processes wait for the first one and then find nothing left to do.
+
+    Parameters:
+        conn (asyncpg.Connection): Connection to run the migrations on; the advisory lock is
+            released before returning.
+
+    Returns:
+        list[Migration]: Migrations applied by this call.
+
+    Raises:
+        asyncpg.PostgresError: If a migration fails; it is rolled back and the later ones are not applied.
+    """
+    if not _pending(await _applied(conn)):
+        return []
+
+    await conn.execute("SELECT pg_advisory_lock($1)", MIGRATIONS_LOCK_ID)
+    try:
+        await conn.execute(SCHEMA_MIGRATIONS_SQL)
+        applied = []
+        for migration in _pending(await _applied(conn)):
+            async with conn.transaction():
+                await conn.execute(migration.sql)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)",
+                    migration.version, migration.name
+                )
+            logger.info(f"Applied schema migration {migration.version} ({migration.name})")
+            applied.append(migration)
+        return applied
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATIONS_LOCK_ID)
+
+
+async def migrate_database(config: DBConfig) -> list[Migration]:
+    """
+    Apply the pending migrations over a dedicated connection, closed afterwards.
+
+    Meant to be awaited once at process startup, before the services open their pools.
+
+    Parameters:
+        config (DBConfig): Database connection parameters.
+
+    Returns:
+        list[Migration]: Migrations applied by this call.
+    """
+    conn = await asyncpg.connect(
+        host=config.host,
+        port=config.port,
+        database=config.database,
+        user=config.user,
+        password=config.password,
+    )
+    try:
+        return await migrate(conn)
+    finally:
+        await conn.close()
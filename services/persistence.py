@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import pickle
+from typing import Any
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from services.db import AsyncConnectionPool, DBConfig
+from services.metrics import register_pool
+
+# Conversation keys are (chat_id, user_id) tuples; the handlers do not use per_message
+ConversationKey = tuple[int, ...]
+
+
+class PostgresPersistence(BasePersistence[dict, dict, dict]):
+    def __init__(self, config: DBConfig, update_interval: float = 30):
+        """
+        Application persistence for user_data and ConversationHandler states, stored in Postgres.
+
+        The Application hands over changed state every `update_interval` seconds; all changes of one
+        such run are written in a single transaction instead of one round trip per user. user_data
+        is loaded lazily, the first time an update of a given user is processed after a restart;
+        conversation states are loaded at startup. Values are stored pickled. chat_data, bot_data
+        and callback data are not persisted. The tables are created by the schema migrations
+        (services.migrations), which must have run before the Application is initialized.
+
+        Parameters:
+            config (DBConfig): Database configuration parameters, including pool sizing.
+            update_interval (float): Seconds between writes of the changed state.
+        """
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.logger = logging.getLogger(__name__)
+        self.pool = AsyncConnectionPool(config)
+        register_pool("persistence", self.pool)
+        self._loaded_users: set[int] = set()
+        self._pending_users: dict[int, bytes | None] = {}
+        self._pending_conversations: dict[tuple[str, ConversationKey], bytes | None] = {}
+        self._write_task: asyncio.Task | None = None
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        if user_id in self._loaded_users:
+            return
+        async with self.pool.connection() as conn:
+            data = await conn.fetchval("SELECT data FROM bot_user_data WHERE user_id = $1", user_id)
+        self._loaded_users.add(user_id)
+        if data is not None:
+            # Keys written since the restart win over the stored ones
+            user_data.update({k: v for k, v in pickle.loads(data).items() if k not in user_data})
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._loaded_users.add(user_id)
+        self._pending_users[user_id] = pickle.dumps(data)
+        await self._write_soon()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._pending_users[user_id] = None
+        await self._write_soon()
+
+    async def get_conversations(self, name: str) -> dict[ConversationKey, object]:
+        async with self.pool.connection() as conn:
+            rows = await conn.fetch("SELECT key, state FROM bot_conversations WHERE name = $1", name)
+        return {tuple(row["key"]): pickle.loads(row["state"]) for row in rows}
+
+    async def update_conversation(self, name: str, key: ConversationKey, new_state: object | None) -> None:
+        self._pending_conversations[(name, key)] = None if new_state is None else pickle.dumps(new_state)
+        await self._write_soon()
+
+    async def _write_soon(self) -> None:
+        # The Application submits all changes of one persistence run concurrently; the first one
+        # starts a write that every other change of the run joins
+        if self._write_task is None:
+            self._write_task = asyncio.create_task(self._write_pending())
+        await asyncio.shield(self._write_task)
+
+    async def _write_pending(self) -> None:
+        await asyncio.sleep(0)
+        self._write_task = None
+        users, self._pending_users = self._pending_users, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+        if not users and not conversations:
+            return
+
+        try:
+            async with self.pool.connection() as conn:
+                async with conn.transaction():
+                    await self._write_users(conn, users)
+                    await self._write_conversations(conn, conversations)
+        except Exception:
+            # Keep the changes for the next run unless newer ones arrived meanwhile
+            self._pending_users = {**users, **self._pending_users}
+            self._pending_conversations = {**conversations, **self._pending_conversations}
+            raise
+        self.logger.debug(f"Persisted {len(users)} user_data and {len(conversations)} conversation changes")
+
+    @staticmethod
+    async def _write_users(conn, users: dict[int, bytes | None]) -> None:
+        upserts = [(user_id, data) for user_id, data in users.items() if data is not None]
+        deletes = [user_id for user_id, data in users.items() if data is None]
+        if upserts:
+            await conn.executemany(
+                """
+                INSERT INTO bot_user_data (user_id, data)
+                VALUES ($1, $2)
+                ON CONFLICT (user_id) DO UPDATE SET data = EXCLUDED.data, updated_at = now();
+                """,
+                upserts
+            )
+        if deletes:
+            await conn.execute("DELETE FROM bot_user_data WHERE user_id = ANY($1::bigint[])", deletes)
+
+    @staticmethod
+    async def _write_conversations(conn, conversations: dict[tuple[str, ConversationKey], bytes | None]) -> None:
+        upserts = [(name, list(key), state) for (name, key), state in conversations.items() if state is not None]
+        deletes = [(name, list(key)) for (name, key), state in conversations.items() if state is None]
+        if upserts:
+            await conn.executemany(
+                """
+                INSERT INTO bot_conversations (name, key, state)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (name, key) DO UPDATE SET state = EXCLUDED.state, updated_at = now();
+                """,
+                upserts
+            )
+        if deletes:
+            await conn.executemany("DELETE FROM bot_conversations WHERE name = $1 AND key = $2", deletes)
+
+    async def flush(self) -> None:
+        """
+        Write the remaining changes and close the connection pool; called when the Application stops.
+        """
+        try:
+            if self._write_task is not None:
+                await self._write_task
+            await self._write_pending()
+        finally:
+            await self.pool.close()
+
+    # chat_data, bot_data and callback data are not stored (see PersistenceInput above)
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self) -> Any:
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
@@ -1,24 +1,155 @@
+from collections.abc import Callable
+
+from services.async_user_service import AsyncUserService
 from services.db import DBConfig
-from services.user_service import UserService
+from services.download_job_service import DownloadJob, DownloadJobService
+from services.download_service import DownloadConfig, DownloadService
+from services.history_retention import HistoryRetention, HistoryRetentionConfig
+from services.jellyfin_service import JellyfinConfig, JellyfinService
+from services.subscription_scheduler import SubscriptionConfig, SubscriptionScheduler
+from services.subscription_service import SubscriptionService
 
 
 class ServiceFactory:
-    _user_service = None
+    _async_user_service = None
+    _download_job_service = None
+    _download_service = None
+    _jellyfin_service = None
+    _subscription_service = None
+    _subscription_scheduler = None
+    _history_retention = None
+
+    @classmethod
+    def get_async_user_service(cls, db_config: DBConfig, admin_chat_id: int) -> AsyncUserService:
+        """
+        Create and manage a singleton instance of AsyncUserService.
+        
+        Handlers should use this non-blocking variant so that database round trips do not stall the
+        bot's event loop. The instance's connection pool is opened lazily on the first awaited call.
+        
+        Args:
+            db_config (DBConfig): Database configuration settings for AsyncUserService.
+            admin_chat_id (int): Unique identifier for the administrator's chat.
+        
+        Returns:
+            AsyncUserService: A singleton instance of AsyncUserService, either newly created or previously instantiated.
+        """
+        if cls._async_user_service is None:
+            cls._async_user_service = AsyncUserService(db_config, admin_chat_id)
+        return cls._async_user_service
+
+    @classmethod
+    def get_download_job_service(cls, db_config: DBConfig) -> DownloadJobService:
+        """
+        Create and manage a singleton instance of DownloadJobService.
+        
+        Args:
+            db_config (DBConfig): Database configuration settings for the job queue.
+        
+        Returns:
+            DownloadJobService: A singleton instance of DownloadJobService, either newly created or previously instantiated.
+        """
+        if cls._download_job_service is None:
+            cls._download_job_service = DownloadJobService(db_config)
+        return cls._download_job_service
+
+    @classmethod
+    def get_jellyfin_service(cls, config: JellyfinConfig) -> JellyfinService:
+        """
+        Create and manage a singleton instance of JellyfinService.
+        
+        Sharing one instance per process lets library refreshes requested by concurrent downloads
+        be coalesced.
+        
+        Args:
+            config (JellyfinConfig): Jellyfin API settings and refresh delay.
+        
+        Returns:
+            JellyfinService: A singleton instance of JellyfinService, either newly created or previously instantiated.
+        """
+        if cls._jellyfin_service is None:
+            cls._jellyfin_service = JellyfinService(config)
+        return cls._jellyfin_service
+
+    @classmethod
+    def get_download_service(cls, config: DownloadConfig, db_config: DBConfig,
+                             jellyfin_config: JellyfinConfig,
+                             source_url: Callable[[DownloadJob], str] | None = None) -> DownloadService:
+        """
+        Create and manage a singleton instance of DownloadService.
+        
+        The download service is the worker side of the job queue and is only used by the worker
+        process; the bot itself only enqueues jobs through DownloadJobService.
+        
+        Args:
+            config (DownloadConfig): Download directory and worker tuning.
+            db_config (DBConfig): Database configuration settings for the job queue.
+            jellyfin_config (JellyfinConfig): Jellyfin settings for library refreshes.
+            source_url (Callable[[DownloadJob], str] | None): URL a video job is downloaded from,
+                used only when the instance is created; see DownloadService.
+        
+        Returns:
+            DownloadService: A singleton instance of DownloadService, either newly created or previously instantiated.
+        """
+        if cls._download_service is None:
+            cls._download_service = DownloadService(
+                config, cls.get_download_job_service(db_config),
+                cls.get_jellyfin_service(jellyfin_config), source_url)
+        return cls._download_service
+
+    @classmethod
+    def get_subscription_service(cls, db_config: DBConfig) -> SubscriptionService:
+        """
+        Create and manage a singleton instance of SubscriptionService.
+        
+        Args:
+            db_config (DBConfig): Database configuration settings for the subscriptions.
+        
+        Returns:
+            SubscriptionService: A singleton instance of SubscriptionService, either newly created or previously instantiated.
+        """
+        if cls._subscription_service is None:
+            cls._subscription_service = SubscriptionService(db_config)
+        return cls._subscription_service
+
+    @classmethod
+    def get_subscription_scheduler(cls, config: SubscriptionConfig, db_config: DBConfig) -> SubscriptionScheduler:
+        """
+        Create and manage a singleton instance of SubscriptionScheduler.
+        
+        The scheduler runs in the bot process on the Application's JobQueue and enqueues new
+        uploads of subscribed channels for the download workers.
+        
+        Args:
+            config (SubscriptionConfig): Subscription defaults and scheduler tuning.
+            db_config (DBConfig): Database configuration settings for subscriptions and the job queue.
+        
+        Returns:
+            SubscriptionScheduler: A singleton instance of SubscriptionScheduler, either newly created or previously instantiated.
+        """
+        if cls._subscription_scheduler is None:
+            cls._subscription_scheduler = SubscriptionScheduler(
+                config, cls.get_subscription_service(db_config), cls.get_download_job_service(db_config))
+        return cls._subscription_scheduler
 
     @classmethod
-    def get_user_service(cls, db_config: DBConfig, admin_chat_id: int) -> UserService:
+    def get_history_retention(cls, config: HistoryRetentionConfig, db_config: DBConfig,
+                              admin_chat_id: int) -> HistoryRetention:
         """
-        Create and manage a singleton instance of UserService.
+        Create and manage a singleton instance of HistoryRetention.
         
-        This class method ensures that only one instance of UserService is created and reused across the application. If no instance exists, it initializes a new UserService with the provided database configuration and admin chat ID.
+        The maintenance of the 'users_hist' partitions runs in the bot process on the
+        Application's JobQueue.
         
         Args:
-            db_config (DBConfig): Database configuration settings for UserService.
+            config (HistoryRetentionConfig): Retention period and job schedule.
+            db_config (DBConfig): Database configuration settings for AsyncUserService.
             admin_chat_id (int): Unique identifier for the administrator's chat.
         
         Returns:
-            UserService: A singleton instance of UserService, either newly created or previously instantiated.
+            HistoryRetention: A singleton instance of HistoryRetention, either newly created or previously instantiated.
         """
-        if cls._user_service is None:
-            cls._user_service = UserService(db_config, admin_chat_id)
-        return cls._user_service
+        if cls._history_retention is None:
+            cls._history_retention = HistoryRetention(
+                config, cls.get_async_user_service(db_config, admin_chat_id))
+        return cls._history_retention
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+
+from telegram import Bot
+from telegram.ext import CallbackContext, JobQueue
+
+from services.download_job_service import DownloadJobService
+from services.subscription_service import Subscription, SubscriptionService
+from services.youtube_listing import list_collection
+from services.youtube_urls import canonical_video_url
+
+
+@dataclass
+class SubscriptionConfig:
+    check_interval: float = 3600.0
+    min_check_interval: float = 600.0
+    max_downloads: int = 2
+    scheduler_interval: float = 60.0
+    max_checks_per_run: int = 20
+    stagger: float = 5.0
+    check_concurrency: int = 2
+    jitter: float = 0.1
+    max_entries: int = 50
+    backlog_check_interval: float = 600.0
+
+
+class SubscriptionScheduler:
+    def __init__(self, config: SubscriptionConfig, subscription_service: SubscriptionService,
+                 job_service: DownloadJobService):
+        """
+        Periodic check of channel subscriptions for new uploads, run on the Application's JobQueue.
+
+        Every `scheduler_interval` seconds up to `max_checks_per_run` due subscriptions are taken
+        from the database. Their checks are started `stagger` seconds apart, at most
+        `check_concurrency` at a time, and every next check is pushed back by a random `jitter`
+        fraction of its interval, so subscriptions created together do not stay in lockstep.
+
+        A check lists the newest `max_entries` uploads with a flat extraction (no per-video
+        metadata requests) and enqueues the ones the subscription has not seen yet. The first check
+        of a new subscription only records the channel's existing videos. At most `max_downloads`
+        videos of a subscription are queued or downloading at once; the remaining new videos are
+        picked up by a check after `backlog_check_interval` seconds.
+
+        Parameters:
+            config (SubscriptionConfig): Defaults for new subscriptions and scheduler tuning.
+            subscription_service (SubscriptionService): Stored subscriptions and seen videos.
+            job_service (DownloadJobService): Download queue new videos are added to.
+        """
+        self.config = config
+        self.subscription_service = subscription_service
+        self.job_service = job_service
+        self.logger = logging.getLogger(__name__)
+        self._checks = asyncio.Semaphore(config.check_concurrency)
+
+    def start(self, job_queue: JobQueue) -> None:
+        """
+        Register the periodic scheduler run on the JobQueue.
+
+        Parameters:
+            job_queue (JobQueue): The Application's job queue.
+        """
+        job_queue.run_repeating(self._run_due, interval=self.config.scheduler_interval,
+                                first=self.config.stagger, name="subscriptions")
+
+    def check_soon(self, job_queue: JobQueue, subscription: Subscription) -> None:
+        """
+        Schedule a check of one subscription right away, e.g. after it was created.
+
+        Parameters:
+            job_queue (JobQueue): The Application's job queue.
+            subscription (Subscription): Subscription to check.
+        """
+        job_queue.run_once(self._run_check, when=0, data=subscription,
+                           name=f"subscription-{subscription.subscription_id}")
+
+    async def _run_due(self, context: CallbackContext) -> None:
+        try:
+            due = await self.subscription_service.claim_due(self.config.max_checks_per_run)
+        except Exception as e:
+            self.logger.error(f"Failed to load due subscriptions: {e}")
+            return
+        for i, subscription in enumerate(due):
+            context.job_queue.run_once(self._run_check, when=i * self.config.stagger, data=subscription,
+                                       name=f"subscription-{subscription.subscription_id}")
+
+    async def _run_check(self, context: CallbackContext) -> None:
+        await self.check(context.bot, context.job.data)
+
+    def _next_check_in(self, interval: float) -> float:
+        return interval * random.uniform(1, 1 + self.config.jitter)
+
+    async def check(self, bot: Bot, subscription: Subscription) -> int:
+        """
+        Look for new uploads of a subscribed channel and enqueue them.
+
+        Parameters:
+            bot (Bot): Bot used to notify the subscriber.
+            subscription (Subscription): Subscription to check.
+
+        Returns:
+            int: Number of videos enqueued.
+        """
+        first_check = subscription.last_checked_at is None
+        async with self._checks:
+            try:
+                listing = await asyncio.to_thread(list_collection, subscription.url, self.config.max_entries)
+            except Exception as e:
+                self.logger.error(f"Failed to list uploads of {subscription.url}: {e}")
+                if first_check:
+                    await self._notify(bot, subscription.chat_id,
+                                       f"Ошибка: Не удалось получить список видео канала {subscription.url}. "
+                                       f"Попробую ещё раз позже.")
+                return 0
+
+        service = self.subscription_service
+        if first_check:
+            await service.mark_seen(subscription.subscription_id, listing.video_ids)
+            await service.finish_check(subscription.subscription_id, listing.title,
+                                       self._next_check_in(subscription.check_interval))
+            await self._notify(bot, subscription.chat_id,
+                               f"Подписка на «{listing.title}» оформлена. Новые видео будут загружаться "
+                               f"автоматически, проверка каждые {subscription.check_interval // 60} мин.")
+            return 0
+
+        # Листинг канала начинается с новых видео; загружаем от старых к новым
+        unseen = list(reversed(await service.get_unseen(subscription.subscription_id, listing.video_ids)))
+        free = subscription.max_downloads - await service.count_active_downloads(subscription.subscription_id)
+        batch, deferred = unseen[:max(free, 0)], unseen[max(free, 0):]
+
+        queued = 0
+        for video_id in batch:
+            result = await self.job_service.enqueue(canonical_video_url(video_id), video_id, subscription.chat_id)
+            queued += result.created
+        await service.mark_seen(subscription.subscription_id, batch)
+
+        interval = subscription.check_interval
+        if deferred:
+            interval = min(interval, self.config.backlog_check_interval)
+        await service.finish_check(subscription.subscription_id, listing.title, self._next_check_in(interval))
+        self.logger.info(f"Subscription {subscription.subscription_id}: {len(unseen)} new videos, "
+                         f"{queued} queued, {len(deferred)} deferred")
+
+        if queued:
+            text = f"Новые видео на канале «{listing.title}»: {queued} поставлено в очередь загрузки."
+            if deferred:
+                text += f" Ещё {len(deferred)} будут загружены позже."
+            await self._notify(bot, subscription.chat_id, text)
+        return queued
+
+    async def _notify(self, bot: Bot, chat_id: int, text: str) -> None:
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+        except Exception as e:
+            self.logger.error(f"Failed to notify chat {chat_id}: {e}")
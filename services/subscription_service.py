@@ -0,0 +1,249 @@
+import logging
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime
+
+from services.db import AsyncConnectionPool, DBConfig, PoolStats
+from services.metrics import register_pool
+
+SUBSCRIPTION_COLUMNS = "subscription_id, chat_id, url, title, check_interval, max_downloads, last_checked_at"
+
+
+@dataclass
+class Subscription:
+    subscription_id: int
+    chat_id: int
+    url: str
+    title: str | None
+    check_interval: int
+    max_downloads: int
+    last_checked_at: datetime | None = None
+
+
+class SubscriptionService:
+    def __init__(self, config: DBConfig):
+        """
+        Channel subscriptions stored in the 'subscriptions' table.
+
+        Each subscription remembers the videos of its channel it has already seen in
+        'subscription_videos', so a check only enqueues uploads that appeared since. Checks are
+        scheduled through `next_check_at`: claim_due() hands out due subscriptions and pushes their
+        next check forward in the same statement, so a check that crashes is retried one interval
+        later instead of right away. The downloads themselves go through DownloadJobService.
+
+        Parameters:
+            config (DBConfig): Database configuration parameters, including pool sizing.
+        """
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self.pool = AsyncConnectionPool(config)
+        register_pool("subscriptions", self.pool)
+
+    @asynccontextmanager
+    async def get_connection(self):
+        """
+        Provides an async context manager that borrows a connection from the pool.
+
+        Yields:
+            asyncpg.Connection: A pooled connection, released back to the pool on exit.
+        """
+        async with self.pool.connection() as conn:
+            yield conn
+
+    def get_pool_stats(self) -> PoolStats:
+        """
+        Return usage statistics of the service's connection pool.
+        """
+        return self.pool.stats()
+
+    async def close(self) -> None:
+        """
+        Gracefully close the service's connection pool.
+        """
+        await self.pool.close()
+
+    async def subscribe(
+        self, chat_id: int, url: str, check_interval: int, max_downloads: int
+    ) -> tuple[Subscription, bool]:
+        """
+        Subscribe a chat to a channel, or update the settings of an existing subscription.
+
+        The first check of a new subscription is left to the caller (see SubscriptionScheduler.check_soon);
+        the periodic checks start one interval later.
+
+        Parameters:
+            chat_id (int): Chat that gets the channel's new videos.
+            url (str): Canonical URL of the channel (see extract_collection_url).
+            check_interval (int): Seconds between checks for new uploads.
+            max_downloads (int): Maximum number of the channel's videos queued or downloading at once.
+
+        Returns:
+            tuple[Subscription, bool]: The subscription and whether it was created by this call.
+        """
+        async with self.get_connection() as conn:
+            row = await conn.fetchrow(
+                f"""
+                INSERT INTO subscriptions (chat_id, url, check_interval, max_downloads, next_check_at)
+                VALUES ($1, $2, $3::int, $4, CURRENT_TIMESTAMP + make_interval(secs => $3::int))
+                ON CONFLICT (chat_id, url) DO UPDATE
+                SET check_interval = EXCLUDED.check_interval,
+                    max_downloads = EXCLUDED.max_downloads
+                RETURNING {SUBSCRIPTION_COLUMNS}, (xmax = 0) AS created
+                """,
+                chat_id, url, check_interval, max_downloads
+            )
+        row = dict(row)
+        created = row.pop("created")
+        return Subscription(**row), created
+
+    async def unsubscribe(self, chat_id: int, subscription_id: int) -> bool:
+        """
+        Delete a subscription of a chat.
+
+        Parameters:
+            chat_id (int): Chat that owns the subscription.
+            subscription_id (int): ID of the subscription.
+
+        Returns:
+            bool: True if the subscription existed and was deleted.
+        """
+        async with self.get_connection() as conn:
+            status = await conn.execute(
+                "DELETE FROM subscriptions WHERE subscription_id = $1 AND chat_id = $2",
+                subscription_id, chat_id
+            )
+        return status != "DELETE 0"
+
+    async def get_subscriptions(self, chat_id: int) -> list[Subscription]:
+        """
+        Return the subscriptions of a chat, oldest first.
+
+        Parameters:
+            chat_id (int): Chat whose subscriptions are listed.
+
+        Returns:
+            list[Subscription]: The chat's subscriptions.
+        """
+        async with self.get_connection() as conn:
+            rows = await conn.fetch(
+                f"SELECT {SUBSCRIPTION_COLUMNS} FROM subscriptions WHERE chat_id = $1 ORDER BY subscription_id",
+                chat_id
+            )
+        return [Subscription(**dict(row)) for row in rows]
+
+    async def claim_due(self, limit: int) -> list[Subscription]:
+        """
+        Take the subscriptions whose check is due and postpone their next check by their interval.
+
+        Parameters:
+            limit (int): Maximum number of subscriptions to take; the longest overdue come first.
+
+        Returns:
+            list[Subscription]: Subscriptions to check now.
+        """
+        async with self.get_connection() as conn:
+            rows = await conn.fetch(
+                f"""
+                UPDATE subscriptions
+                SET next_check_at = CURRENT_TIMESTAMP + make_interval(secs => check_interval)
+                WHERE subscription_id IN (
+                    SELECT subscription_id
+                    FROM subscriptions
+                    WHERE next_check_at <= CURRENT_TIMESTAMP
+                    ORDER BY next_check_at
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT $1
+                )
+                RETURNING {SUBSCRIPTION_COLUMNS}
+                """,
+                limit
+            )
+        return [Subscription(**dict(row)) for row in rows]
+
+    async def get_unseen(self, subscription_id: int, video_ids: list[str]) -> list[str]:
+        """
+        Filter a channel listing down to the videos the subscription has not seen yet.
+
+        Parameters:
+            subscription_id (int): ID of the subscription.
+            video_ids (list[str]): Video IDs of the channel listing.
+
+        Returns:
+            list[str]: Unseen video IDs in listing order.
+        """
+        async with self.get_connection() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT v.video_id
+                FROM unnest($2::text[]) WITH ORDINALITY AS v (video_id, n)
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM subscription_videos s
+                    WHERE s.subscription_id = $1 AND s.video_id = v.video_id
+                )
+                ORDER BY v.n
+                """,
+                subscription_id, video_ids
+            )
+        return [row["video_id"] for row in rows]
+
+    async def count_active_downloads(self, subscription_id: int) -> int:
+        """
+        Count the subscription's videos that are queued or downloading.
+
+        Parameters:
+            subscription_id (int): ID of the subscription.
+
+        Returns:
+            int: Number of active download jobs for videos seen by the subscription.
+        """
+        async with self.get_connection() as conn:
+            return await conn.fetchval(
+                """
+                SELECT COUNT(*)
+                FROM subscription_videos s
+                JOIN download_jobs d ON d.video_id = s.video_id AND d.state IN ('queued', 'running')
+                WHERE s.subscription_id = $1
+                """,
+                subscription_id
+            )
+
+    async def mark_seen(self, subscription_id: int, video_ids: list[str]) -> None:
+        """
+        Remember videos as seen, so later checks do not enqueue them again.
+
+        Parameters:
+            subscription_id (int): ID of the subscription.
+            video_ids (list[str]): Video IDs that were enqueued or should be skipped.
+        """
+        if not video_ids:
+            return
+        async with self.get_connection() as conn:
+            await conn.execute(
+                """
+                INSERT INTO subscription_videos (subscription_id, video_id)
+                SELECT $1, unnest($2::text[])
+                ON CONFLICT DO NOTHING
+                """,
+                subscription_id, video_ids
+            )
+
+    async def finish_check(self, subscription_id: int, title: str, next_check_in: float) -> None:
+        """
+        Record a successful check and schedule the next one.
+
+        Parameters:
+            subscription_id (int): ID of the subscription.
+            title (str): Current title of the channel.
+            next_check_in (float): Seconds until the next check.
+        """
+        async with self.get_connection() as conn:
+            await conn.execute(
+                """
+                UPDATE subscriptions
+                SET title = $2,
+                    last_checked_at = CURRENT_TIMESTAMP,
+                    next_check_at = CURRENT_TIMESTAMP + make_interval(secs => $3)
+                WHERE subscription_id = $1
+                """,
+                subscription_id, title, next_check_in
+            )
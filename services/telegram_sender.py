@@ -0,0 +1,172 @@
+import asyncio
+import contextlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Coroutine
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter, ExtBot
+from telegram.request import HTTPXRequest
+
+from services.metrics import TELEGRAM_FLOOD_WAITS, TELEGRAM_LATENCY
+
+
+@dataclass
+class TelegramConfig:
+    base_url: str = "https://api.telegram.org/bot"
+    connection_pool_size: int = 16
+    pool_timeout: float = 10.0
+    global_rate: float = 30.0
+    chat_rate: float = 1.0
+    chat_burst: int = 3
+    group_rate: float = 20 / 60
+    max_retries: int = 3
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        """
+        Token bucket for a single event loop: `rate` tokens per second, at most `capacity` stored.
+
+        Parameters:
+            rate (float): Tokens added per second.
+            capacity (float): Maximum number of tokens, i.e. the allowed burst.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def is_full(self) -> bool:
+        self._refill()
+        return self._tokens >= self.capacity
+
+    async def acquire(self) -> None:
+        """
+        Wait until a token is available and take it. Waiters are served roughly in arrival order.
+        """
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class TelegramRateLimiter(BaseRateLimiter[int]):
+    # Idle per-chat buckets are dropped once this many are tracked
+    MAX_IDLE_CHAT_BUCKETS = 1024
+
+    def __init__(self, config: TelegramConfig):
+        """
+        Flood control for all Bot API calls of one process.
+
+        Every request takes a token from a global bucket, and requests addressed to a chat also take
+        one from that chat's bucket (`chat_rate` for private chats, `group_rate` for groups and
+        channels). A 429 response pauses all requests for the `retry_after` period given by Telegram,
+        then the request is retried up to `max_retries` times; `rate_limit_args` overrides the retry
+        count per call.
+
+        Parameters:
+            config (TelegramConfig): Rates, burst size and retry limit.
+        """
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self._global = TokenBucket(config.global_rate, config.global_rate)
+        self._chats: dict[int | str, TokenBucket] = {}
+        self._resume_at = 0.0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._chats.clear()
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.MAX_IDLE_CHAT_BUCKETS:
+                for key in [key for key, idle in self._chats.items() if idle.is_full]:
+                    del self._chats[key]
+            # Negative IDs and @usernames are groups and channels
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            bucket = (TokenBucket(self.config.group_rate, 1) if is_group
+                      else TokenBucket(self.config.chat_rate, self.config.chat_burst))
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _wait_for_flood_wait(self) -> None:
+        while (delay := self._resume_at - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, bool | dict | list[dict]]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: int | None,
+    ) -> bool | dict | list[dict]:
+        max_retries = self.config.max_retries if rate_limit_args is None else rate_limit_args
+
+        chat_id = data.get("chat_id")
+        with contextlib.suppress(ValueError, TypeError):
+            chat_id = int(chat_id)
+
+        for attempt in range(max_retries + 1):
+            await self._wait_for_flood_wait()
+            if chat_id is not None:
+                await self._chat_bucket(chat_id).acquire()
+            await self._global.acquire()
+            try:
+                with TELEGRAM_LATENCY.labels(endpoint).time():
+                    return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                TELEGRAM_FLOOD_WAITS.labels(endpoint).inc()
+                if attempt == max_retries:
+                    self.logger.error(f"{endpoint} to chat {chat_id} hit flood control after {attempt} retries")
+                    raise
+                retry_after = (e.retry_after if isinstance(e.retry_after, (int, float))
+                               else e.retry_after.total_seconds())
+                self.logger.warning(f"{endpoint} to chat {chat_id} hit flood control, retrying in {retry_after}s")
+                self._resume_at = max(self._resume_at, time.monotonic() + retry_after + 0.1)
+
+
+def build_request(config: TelegramConfig) -> HTTPXRequest:
+    """
+    HTTP transport for Bot API calls with a pool of keep-alive connections.
+
+    Parameters:
+        config (TelegramConfig): Connection pool size and pool timeout.
+
+    Returns:
+        HTTPXRequest: Request object for ApplicationBuilder.request or ExtBot.
+    """
+    return HTTPXRequest(
+        connection_pool_size=config.connection_pool_size,
+        pool_timeout=config.pool_timeout,
+    )
+
+
+def build_bot(token: str, config: TelegramConfig) -> ExtBot:
+    """
+    Bot for processes without an Application, such as the download worker, that shares the
+    connection pooling and flood control of the bot application.
+
+    Parameters:
+        token (str): Bot token.
+        config (TelegramConfig): Bot API base URL, connection pool and rate limits.
+
+    Returns:
+        ExtBot: Bot to be used as an async context manager.
+    """
+    return ExtBot(token, base_url=config.base_url, request=build_request(config),
+                  rate_limiter=TelegramRateLimiter(config))
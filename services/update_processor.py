@@ -0,0 +1,69 @@
+import asyncio
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int = 1024):
+        """
+        Update processor that runs updates of different users concurrently while processing the
+        updates of each user strictly one after another, in the order they were received.
+
+        Ordering is what ConversationHandler and the per-user `user_data` rely on, so conversations
+        stay consistent while one slow user no longer delays everyone else. Updates without a user
+        or chat are not ordered. An update waiting for an earlier update of the same user does not
+        occupy one of the `max_concurrent_updates` slots.
+
+        Parameters:
+            max_concurrent_updates (int): Maximum number of updates being processed at the same time.
+            max_pending_updates (int): Maximum number of updates accepted for processing, including
+                those waiting for their user's earlier updates; further updates wait in the update queue.
+        """
+        # The base class semaphore bounds the accepted updates; `_running` bounds the processed ones
+        super().__init__(max_pending_updates)
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` must be a positive integer!")
+        self.max_running_updates = max_concurrent_updates
+        self._running = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._user_locks: dict[int, tuple[asyncio.Lock, int]] = {}
+
+    @staticmethod
+    def _ordering_key(update: object) -> int | None:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._ordering_key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            return
+
+        # Locks are reference-counted so that users without queued updates do not keep one
+        lock, waiters = self._user_locks.get(key, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._user_locks[key] = (lock, waiters + 1)
+        try:
+            async with lock:
+                async with self._running:
+                    await coroutine
+        finally:
+            lock, waiters = self._user_locks[key]
+            if waiters == 1:
+                del self._user_locks[key]
+            else:
+                self._user_locks[key] = (lock, waiters - 1)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
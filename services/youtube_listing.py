@@ -0,0 +1,43 @@
+from dataclasses import dataclass
+
+import yt_dlp
+
+from services.youtube_urls import VIDEO_ID_RE
+
+
+@dataclass
+class CollectionListing:
+    title: str
+    video_ids: list[str]
+
+
+def list_collection(url: str, max_entries: int) -> CollectionListing:
+    """
+    List the videos of a playlist or channel without extracting each video.
+
+    Uses a flat extraction: a few requests for the listing pages instead of one full metadata
+    request per video. Blocking; run it in an executor. Nested playlists and channel tabs are
+    skipped, duplicates are removed.
+
+    Parameters:
+        url (str): Canonical URL of the playlist or channel (see extract_collection_url).
+        max_entries (int): Maximum number of entries to list, starting with the first one
+            (the newest upload for channels).
+
+    Returns:
+        CollectionListing: Title of the collection and the IDs of its videos in listing order.
+    """
+    options = {
+        "extract_flat": "in_playlist",
+        "playlistend": max_entries,
+        "quiet": True,
+        "no_warnings": True,
+    }
+    with yt_dlp.YoutubeDL(options) as ydl:
+        info = ydl.extract_info(url, download=False)
+
+    video_ids = list(dict.fromkeys(
+        entry["id"] for entry in info.get("entries") or []
+        if entry and entry.get("ie_key", "Youtube") == "Youtube" and VIDEO_ID_RE.match(entry.get("id") or "")
+    ))
+    return CollectionListing(title=info.get("title") or url, video_ids=video_ids)
@@ -0,0 +1,103 @@
+import re
+from urllib.parse import parse_qs, urlparse
+
+VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+YOUTUBE_HOSTS = {
+    "youtube.com",
+    "www.youtube.com",
+    "m.youtube.com",
+    "music.youtube.com",
+    "youtube-nocookie.com",
+    "www.youtube-nocookie.com",
+}
+SHORT_HOSTS = {"youtu.be", "www.youtu.be"}
+PATH_PREFIXES = ("shorts", "embed", "live", "v", "e")
+CHANNEL_PREFIXES = ("channel", "c", "user")
+PLAYLIST_ID_RE = re.compile(r"^[A-Za-z0-9_-]{10,}$")
+CHANNEL_NAME_RE = re.compile(r"^[A-Za-z0-9_.\-]+$")
+
+
+def _parse(url: str):
+    url = url.strip()
+    if "://" not in url:
+        url = "https://" + url
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        return None, "", []
+    return parsed, (parsed.hostname or "").lower(), [part for part in parsed.path.split("/") if part]
+
+
+def extract_video_id(url: str) -> str | None:
+    """
+    Extract the YouTube video ID from any of the common link forms.
+
+    Supports youtu.be/<id>, youtube.com/watch?v=<id>, /shorts/<id>, /embed/<id>, /live/<id> and /v/<id>
+    on the desktop, mobile, music and no-cookie hosts. Extra query parameters such as `t`, `list`
+    or `si` are ignored.
+
+    Parameters:
+        url (str): Link sent by the user; the scheme may be omitted.
+
+    Returns:
+        str | None: The 11-character video ID, or None if the link does not point to a single video.
+    """
+    parsed, host, parts = _parse(url)
+
+    candidate = None
+    if host in SHORT_HOSTS:
+        candidate = parts[0] if parts else None
+    elif host in YOUTUBE_HOSTS:
+        if parts[:1] == ["watch"]:
+            candidate = parse_qs(parsed.query).get("v", [None])[0]
+        elif len(parts) >= 2 and parts[0] in PATH_PREFIXES:
+            candidate = parts[1]
+
+    return candidate if candidate and VIDEO_ID_RE.match(candidate) else None
+
+
+def canonical_video_url(video_id: str) -> str:
+    """
+    Build the canonical watch URL for a video ID.
+
+    Parameters:
+        video_id (str): YouTube video ID.
+
+    Returns:
+        str: https://www.youtube.com/watch?v=<video_id>
+    """
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+def extract_collection_url(url: str) -> str | None:
+    """
+    Recognize links to a playlist or a channel and return their canonical URL.
+
+    Supports youtube.com/playlist?list=<id>, /@handle, /channel/<id>, /c/<name> and /user/<name>.
+    Links to a single video that also carry a `list` parameter are videos, not playlists.
+
+    Parameters:
+        url (str): Link sent by the user; the scheme may be omitted.
+
+    Returns:
+        str | None: https://www.youtube.com/playlist?list=<id> for playlists, the channel's videos
+        tab for channels, or None if the link is neither.
+    """
+    parsed, host, parts = _parse(url)
+    if host not in YOUTUBE_HOSTS or not parts:
+        return None
+
+    if parts == ["playlist"]:
+        playlist_id = parse_qs(parsed.query).get("list", [None])[0]
+        if playlist_id and PLAYLIST_ID_RE.match(playlist_id):
+            return f"https://www.youtube.com/playlist?list={playlist_id}"
+        return None
+
+    if parts[0].startswith("@") and CHANNEL_NAME_RE.match(parts[0][1:]):
+        channel = parts[0]
+    elif len(parts) >= 2 and parts[0] in CHANNEL_PREFIXES and CHANNEL_NAME_RE.match(parts[1]):
+        channel = f"{parts[0]}/{parts[1]}"
+    else:
+        return None
+    return f"https://www.youtube.com/{channel}/videos"
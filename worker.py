@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import signal
+
+from config import (BOT_TOKEN, DOWNLOAD_CONFIG, JELLYFIN_CONFIG, METRICS_CONFIG,
+                    TELEGRAM_CONFIG, USER_DB_CONFIG)
+from services.metrics import MetricsServer
+from services.migrations import migrate_database
+from services.service_factory import ServiceFactory
+from services.telegram_sender import build_bot
+
+# Настраиваем логирование
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+
+async def run_worker() -> None:
+    """
+    Runs a download worker until SIGINT/SIGTERM.
+
+    The worker claims jobs from the durable download queue that the bot fills and processes up to
+    DOWNLOAD_WORKERS of them concurrently. On shutdown, unfinished jobs are released back to the
+    queue for other workers. Metrics and the liveness probe are served on METRICS_PORT.
+    """
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, task.cancel)
+
+    job_service = ServiceFactory.get_download_job_service(USER_DB_CONFIG)
+    jellyfin_service = ServiceFactory.get_jellyfin_service(JELLYFIN_CONFIG)
+    download_service = ServiceFactory.get_download_service(
+        DOWNLOAD_CONFIG, USER_DB_CONFIG, JELLYFIN_CONFIG)
+
+    metrics_server = MetricsServer(METRICS_CONFIG)
+    metrics_server.start()
+
+    await migrate_database(USER_DB_CONFIG)
+    try:
+        async with build_bot(BOT_TOKEN, TELEGRAM_CONFIG) as bot:
+            await download_service.run(bot)
+    finally:
+        await jellyfin_service.close()
+        await job_service.close()
+        await metrics_server.stop()
+
+
+def main() -> None:
+    """
+    Entry point of the download worker process.
+    """
+    try:
+        asyncio.run(run_worker())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logging.getLogger(__name__).info("Download worker stopped")
+
+
+if __name__ == "__main__":
+    main()